@@ -8,11 +8,23 @@ from pathlib import Path
 import duckdb
 import pandas as pd
 
+from option_flow.services.contract_rollups import CONTRACT_ROLLUP_TABLE, rebuild_contract_rollups
+from option_flow.services.flow_rollups import FLOW_ROLLUP_TABLE, rebuild_flow_rollups
+from option_flow.services.rollup_levels import ROLLUP_TABLES, cascade_refresh
+from option_flow.storage.payloads import payload_frame
+from option_flow.vendors.polygon.contracts import contract_key, occ_symbol
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 DB_PATH = DATA_DIR / "optionflow.duckdb"
 SCHEMA_PATH = BASE_DIR / "storage" / "schema.sql"
 DEMO_PARQUET = DATA_DIR / "demo_trades.parquet"
+LEGACY_TABLES = ("trades_raw", "trades_labeled", "sweeps", "open_interest_eod")
+CONTRACT_JOIN = """
+    LEFT JOIN contracts AS c
+        ON c.symbol = t.symbol AND c.expiry = t.expiry
+        AND c.strike = t.strike AND c.call_put = t.call_put
+"""
 
 
 def ensure_dirs() -> None:
@@ -28,6 +40,113 @@ def apply_schema(con: duckdb.DuckDBPyConnection) -> None:
     con.execute(schema_sql)
 
 
+def table_columns(con: duckdb.DuckDBPyConnection, table: str) -> set[str]:
+    rows = con.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = ? AND schema_name = 'main'",
+        [table],
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def is_legacy(con: duckdb.DuckDBPyConnection) -> bool:
+    """True for databases still on the VARCHAR/raw_payload trade format."""
+
+    return "raw_payload" in table_columns(con, "trades_raw")
+
+
+def migrate_legacy(con: duckdb.DuckDBPyConnection) -> bool:
+    """Convert a legacy database to the compact format in one transaction.
+
+    Side and call/put become ENUMs, trades reference ``contracts`` by
+    ``contract_id``, raw payloads move to ``raw_payloads`` (one compressed block
+    per trade date) and the NBBO copies on ``trades_labeled`` are folded into
+    ``nbbo_at_trade``. Returns False if there was nothing to migrate.
+    """
+
+    if not is_legacy(con):
+        return False
+    con.execute("BEGIN TRANSACTION")
+    try:
+        legacy = [table for table in LEGACY_TABLES if table_columns(con, table)]
+        for table in legacy:
+            con.execute(f"ALTER TABLE {table} RENAME TO {table}_v1")
+        apply_schema(con)
+
+        sources = [table for table in ("trades_raw", "trades_labeled", "sweeps") if table in legacy]
+        contracts_df = con.execute(
+            " UNION ".join(
+                f"SELECT symbol, expiry, strike, call_put FROM {table}_v1" for table in sources
+            )
+        ).df().dropna()
+        contracts_df["occ_symbol"] = [
+            occ_symbol(row.symbol, row.expiry, row.call_put, row.strike)
+            for row in contracts_df.itertuples(index=False)
+        ]
+        contracts_df["contract_id"] = [contract_key(item) for item in contracts_df["occ_symbol"]]
+        con.register("legacy_contracts", contracts_df)
+        con.execute("INSERT OR IGNORE INTO contracts BY NAME SELECT * FROM legacy_contracts")
+        con.unregister("legacy_contracts")
+
+        con.execute(
+            f"""
+            INSERT INTO trades_raw BY NAME
+            SELECT t.* EXCLUDE (expiry, strike, call_put, raw_payload), c.contract_id
+            FROM trades_raw_v1 AS t {CONTRACT_JOIN}
+            ORDER BY t.trade_ts_utc
+            """
+        )
+        days = con.execute(
+            "SELECT DISTINCT CAST(trade_ts_utc AS DATE) FROM trades_raw_v1 "
+            "WHERE raw_payload IS NOT NULL ORDER BY 1"
+        ).fetchall()
+        for (day,) in days:
+            rows = con.execute(
+                "SELECT trade_ts_utc, CAST(raw_payload AS VARCHAR) FROM trades_raw_v1 "
+                "WHERE raw_payload IS NOT NULL AND CAST(trade_ts_utc AS DATE) = ? "
+                "ORDER BY trade_ts_utc",
+                [day],
+            ).fetchall()
+            frame = payload_frame([row[1] for row in rows], pd.Series([row[0] for row in rows]))
+            con.register("legacy_payloads", frame)
+            con.execute("INSERT INTO raw_payloads SELECT * FROM legacy_payloads")
+            con.unregister("legacy_payloads")
+
+        if "trades_labeled" in legacy:
+            con.execute(
+                """
+                INSERT OR IGNORE INTO nbbo_at_trade (vendor_trade_id, bid, ask, mid)
+                SELECT vendor_trade_id, nbbo_bid, nbbo_ask, (nbbo_bid + nbbo_ask) / 2
+                FROM trades_labeled_v1
+                WHERE nbbo_bid IS NOT NULL AND nbbo_ask IS NOT NULL
+                """
+            )
+            con.execute(
+                f"""
+                INSERT INTO trades_labeled BY NAME
+                SELECT t.* EXCLUDE (nbbo_bid, nbbo_ask), c.contract_id
+                FROM trades_labeled_v1 AS t {CONTRACT_JOIN}
+                ORDER BY t.trade_ts_utc
+                """
+            )
+        if "sweeps" in legacy:
+            con.execute(
+                f"""
+                INSERT INTO sweeps BY NAME
+                SELECT t.*, c.contract_id FROM sweeps_v1 AS t {CONTRACT_JOIN}
+                """
+            )
+        if "open_interest_eod" in legacy:
+            con.execute("INSERT INTO open_interest_eod BY NAME SELECT * FROM open_interest_eod_v1")
+        for table in legacy:
+            con.execute(f"DROP TABLE {table}_v1")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("CHECKPOINT")
+    return True
+
+
 def compute_rollups(trades_df: pd.DataFrame) -> pd.DataFrame:
     enriched = trades_df.assign(
         minute_bucket=lambda df: df["trade_ts_utc"].dt.floor("min"),
@@ -60,7 +179,7 @@ def compute_rollups(trades_df: pd.DataFrame) -> pd.DataFrame:
         )
     )
     grouped["net_premium"] = grouped["buy_premium"] - grouped["sell_premium"]
-    grouped["updated_at"] = datetime.now(timezone.utc)
+    grouped["updated_at"] = datetime.now(timezone.utc).replace(tzinfo=None)
     return grouped[
         [
             "symbol",
@@ -101,6 +220,7 @@ def seed_demo(con: duckdb.DuckDBPyConnection) -> None:
             records.append(
                 {
                     "vendor_trade_id": f"demo-{trade_id}",
+                    "contract_id": contract_key(occ_symbol(symbol, expiry, call_put, strike)),
                     "symbol": symbol,
                     "expiry": expiry,
                     "strike": strike,
@@ -139,45 +259,56 @@ def seed_demo(con: duckdb.DuckDBPyConnection) -> None:
     nbbo_df = pd.DataFrame(nbbo_records)
     nbbo_df["nbbo_ts"] = pd.to_datetime(nbbo_df["nbbo_ts"])
 
-    raw_df = trades_df[
+    contracts_df = trades_df[
+        ["contract_id", "symbol", "expiry", "strike", "call_put"]
+    ].drop_duplicates("contract_id")
+    contracts_df.insert(
+        1,
+        "occ_symbol",
         [
-            "vendor_trade_id",
-            "symbol",
-            "expiry",
-            "strike",
-            "call_put",
-            "trade_ts_utc",
-            "price",
-            "size",
-            "notional",
-            "raw_payload",
-        ]
-    ].copy()
+            occ_symbol(row.symbol, row.expiry, row.call_put, row.strike)
+            for row in contracts_df.itertuples(index=False)
+        ],
+    )
+    payloads_df = payload_frame(list(trades_df["raw_payload"]), trades_df["trade_ts_utc"])
 
     rollup_df = compute_rollups(trades_df)
 
-    con.register("raw_df", raw_df)
     con.register("trades_df", trades_df)
+    con.register("contracts_df", contracts_df)
+    con.register("payloads_df", payloads_df)
     con.register("nbbo_df", nbbo_df)
     con.register("rollup_df", rollup_df)
 
     con.execute("DELETE FROM trades_raw")
     con.execute("DELETE FROM trades_labeled")
     con.execute("DELETE FROM nbbo_at_trade")
-    con.execute("DELETE FROM rollups_min")
+    for table in (*ROLLUP_TABLES, CONTRACT_ROLLUP_TABLE, FLOW_ROLLUP_TABLE):
+        con.execute(f"DELETE FROM {table}")
+    con.execute("DELETE FROM sweeps")
+    con.execute("DELETE FROM raw_payloads")
+    con.execute("DELETE FROM rollup_watermarks")
 
-    con.execute("""\n        INSERT INTO trades_raw (\n            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,\n            price, size, notional, raw_payload\n        )\n        SELECT\n            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,\n            price, size, notional, raw_payload\n        FROM raw_df\n        """)
+    con.execute("INSERT OR IGNORE INTO contracts SELECT * FROM contracts_df")
+    con.execute(
+        """
+        INSERT INTO trades_raw (
+            vendor_trade_id, contract_id, symbol, trade_ts_utc, price, size, notional
+        )
+        SELECT vendor_trade_id, contract_id, symbol, trade_ts_utc, price, size, notional
+        FROM trades_df
+        """
+    )
+    con.execute("INSERT INTO raw_payloads SELECT * FROM payloads_df")
     con.execute(
         """
         INSERT INTO trades_labeled (
-            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,
-            price, size, notional, premium, epsilon_used, side, is_0dte,
-            sweep_id, nbbo_bid, nbbo_ask
+            vendor_trade_id, contract_id, symbol, expiry, strike, call_put, trade_ts_utc,
+            price, size, notional, premium, epsilon_used, side, is_0dte, sweep_id
         )
         SELECT
-            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,
-            price, size, notional, premium, epsilon_used, side, is_0dte,
-            sweep_id, nbbo_bid, nbbo_ask
+            vendor_trade_id, contract_id, symbol, expiry, strike, call_put, trade_ts_utc,
+            price, size, notional, premium, epsilon_used, side, is_0dte, sweep_id
         FROM trades_df
         """
     )
@@ -193,6 +324,9 @@ def seed_demo(con: duckdb.DuckDBPyConnection) -> None:
         FROM rollup_df
         """
     )
+    cascade_refresh(con)
+    rebuild_contract_rollups(con)
+    rebuild_flow_rollups(con)
 
     trades_df.to_parquet(DEMO_PARQUET, index=False)
 
@@ -204,7 +338,22 @@ def main() -> None:
 
     ensure_dirs()
     con = duckdb.connect(str(DB_PATH))
+    if migrate_legacy(con):
+        print(
+            f"Migrated {DB_PATH} to the compact trade format; copy it to a fresh file "
+            "(EXPORT/IMPORT DATABASE) to release the space freed by the old columns"
+        )
     apply_schema(con)
+    (coarse,) = con.execute(f"SELECT COUNT(*) FROM {ROLLUP_TABLES[-1]}").fetchone()
+    if not coarse and cascade_refresh(con):
+        print("Built the coarser rollup levels from rollups_min")
+    for table, rebuild in (
+        (CONTRACT_ROLLUP_TABLE, rebuild_contract_rollups),
+        (FLOW_ROLLUP_TABLE, rebuild_flow_rollups),
+    ):
+        (rows,) = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        if not rows and rebuild(con):
+            print(f"Built {table} from trades_labeled")
 
     if args.demo:
         seed_demo(con)
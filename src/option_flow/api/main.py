@@ -1,20 +1,28 @@
 ﻿from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import UTC, datetime, timedelta, timezone
+from functools import lru_cache
 from io import StringIO
 
+import duckdb
 import pandas as pd
-from fastapi import Depends, FastAPI, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
+from option_flow.api.serialization import arrow_response
 from option_flow.config.settings import Settings, get_settings
-from option_flow.storage.duckdb_client import query_df
+from option_flow.services.contract_rollups import top_strikes
+from option_flow.services.top_flow import top_flows, top_flows_from_totals
+from option_flow.services.window_engine import WindowEngine
+from option_flow.storage.duckdb_client import get_pool, query_arrow, query_df
+from option_flow.storage.tiering import tiered_relation
 
 app = FastAPI(title="Option Flow API", version="0.1.0")
 
 WINDOW_OPTIONS: dict[str, int] = {"5m": 5, "15m": 15, "30m": 30, "60m": 60, "560m": 560}
 CALL_PUT_FILTER = {"both", "calls", "puts"}
+OPTION_LABEL_SQL = "printf('%s %s %.2f%s', symbol, expiry, strike, call_put)"
 
 
 class TableRow(BaseModel):
@@ -40,6 +48,21 @@ class PrintRow(BaseModel):
     sweep_id: str | None
 
 
+class SweepRow(BaseModel):
+    sweep_id: str
+    symbol: str
+    option: str
+    side: str
+    is_0dte: bool
+    first_ts_utc: datetime
+    last_ts_utc: datetime
+    duration_ms: float
+    legs: int
+    total_size: int
+    notional: float
+    vwap: float
+
+
 class MinuteBar(BaseModel):
     minute_bucket: datetime
     buy_premium: float
@@ -69,69 +92,37 @@ def parse_call_put_filter(value: str) -> str:
     return value
 
 
-def load_window_trades(minutes: int) -> pd.DataFrame:
-    cutoff_expr = f"now() - INTERVAL {minutes} MINUTE"
-    return query_df(
-        f"""
-        SELECT *
-        FROM trades_labeled
-        WHERE trade_ts_utc >= {cutoff_expr}
-        """
-    )
+def utc_now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
 
 
-def summarize_symbols(df: pd.DataFrame) -> list[TableRow]:
-    if df.empty:
-        return []
-
-    totals = df.groupby("symbol", as_index=False)["premium"].sum().rename(columns={"premium": "total_premium"})
-
-    def metric(mask: pd.Series) -> pd.Series:
-        return df[mask].groupby("symbol")["premium"].sum()
-
-    call_premium = metric(df["call_put"] == "C")
-    put_premium = metric(df["call_put"] == "P")
-    buy_premium = metric(df["side"] == "BUY")
-    sell_premium = metric(df["side"] == "SELL")
-    zero_dte_premium = metric(df["is_0dte"])
-
-    totals["call_premium"] = totals["symbol"].map(call_premium).fillna(0.0)
-    totals["put_premium"] = totals["symbol"].map(put_premium).fillna(0.0)
-    totals["buy_premium"] = totals["symbol"].map(buy_premium).fillna(0.0)
-    totals["sell_premium"] = totals["symbol"].map(sell_premium).fillna(0.0)
-    totals["zero_dte_premium"] = totals["symbol"].map(zero_dte_premium).fillna(0.0)
-    totals["net_premium"] = totals["buy_premium"] - totals["sell_premium"]
-    totals["zero_dte_percent"] = totals.apply(
-        lambda row: (row["zero_dte_premium"] / row["total_premium"] * 100.0) if row["total_premium"] else 0.0,
-        axis=1,
+def window_start(minutes: int) -> datetime:
+    return utc_now() - timedelta(minutes=minutes)
+
+
+@lru_cache(maxsize=1)
+def get_window_engine() -> WindowEngine:
+    """Process-wide ring buffers over ``rollups_min``; filled by the first sync."""
+
+    settings = get_settings()
+    return WindowEngine(
+        max(WINDOW_OPTIONS.values()),
+        sync_interval_ms=settings.window_engine_sync_ms,
+        grace_ms=settings.rollup_watermark_grace_ms,
     )
 
-    top_strikes_map: dict[str, list[str]] = {}
-    grouped_strikes = df.groupby(["symbol", "expiry", "strike", "call_put"], as_index=False)["premium"].sum()
-    for symbol, sub in grouped_strikes.groupby("symbol"):
-        ordered = sub.sort_values("premium", ascending=False).head(3)
-        top_strikes_map[symbol] = [
-            f"{row['strike']:.2f}{row['call_put']} ({row['expiry']})"
-            for _, row in ordered.iterrows()
-        ]
-
-    rows: list[TableRow] = []
-    for _, row in totals.iterrows():
-        symbol = row["symbol"]
-        rows.append(
-            TableRow(
-                symbol=symbol,
-                net_premium=float(row["net_premium"]),
-                total_premium=float(row["total_premium"]),
-                call_premium=float(row["call_premium"]),
-                put_premium=float(row["put_premium"]),
-                zero_dte_percent=float(row["zero_dte_percent"]),
-                top_strikes=top_strikes_map.get(symbol, []),
-            )
-        )
 
-    rows.sort(key=lambda r: abs(r.net_premium), reverse=True)
-    return rows
+def current_window_engine() -> WindowEngine | None:
+    """The window engine synced through the read pool, or ``None`` if the database is unreadable."""
+
+    engine = get_window_engine()
+    if engine.due:
+        try:
+            with get_pool().cursor() as cur:
+                engine.sync(cur)
+        except duckdb.Error:
+            return None
+    return engine
 
 
 @app.get("/health")
@@ -148,29 +139,48 @@ def top_flow(
 ) -> list[TableRow]:
     minutes = get_valid_window(window)
     call_put = parse_call_put_filter(call_put)
-
-    df = load_window_trades(minutes)
-    if df.empty:
-        return []
-
-    if min_notional > 0:
-        df = df[df["notional"] >= min_notional]
-    if call_put != "both":
-        df = df[df["call_put"] == ("C" if call_put == "calls" else "P")]
-    if zero_dte_only:
-        df = df[df["is_0dte"]]
-
-    return summarize_symbols(df)
+    side = None if call_put == "both" else ("C" if call_put == "calls" else "P")
+    engine = None
+    if side is None and not zero_dte_only and not min_notional:
+        engine = current_window_engine()
+    if engine is not None:
+        # Unfiltered totals come from the in-memory ring; DuckDB adds the
+        # partial first minute and ranks the strikes.
+        now = utc_now()
+        rows = top_flows_from_totals(
+            now - timedelta(minutes=minutes),
+            engine.totals(minutes, now=now),
+            engine.first_bucket(minutes, now=now),
+        )
+    else:
+        rows = top_flows(
+            window_start(minutes),
+            call_put=side,
+            zero_dte_only=zero_dte_only,
+            min_notional=min_notional,
+        )
+    return [TableRow(**row) for row in rows.to_dict("records")]
 
 
 @app.get("/prints", response_model=list[PrintRow])
 def prints_feed(
+    request: Request,
     min_notional: float = Query(250_000.0, ge=0.0),
     limit: int = Query(50, ge=1, le=500),
-) -> list[PrintRow]:
-    df = query_df(
-        """
-        SELECT *
+) -> Response:
+    table = query_arrow(
+        f"""
+        SELECT
+            vendor_trade_id AS trade_id,
+            trade_ts_utc,
+            symbol,
+            {OPTION_LABEL_SQL} AS option,
+            price,
+            size,
+            notional,
+            side,
+            is_0dte,
+            NULLIF(sweep_id, '') AS sweep_id
         FROM trades_labeled
         WHERE notional >= ?
         ORDER BY trade_ts_utc DESC
@@ -178,24 +188,39 @@ def prints_feed(
         """,
         [min_notional, limit],
     )
-    if df.empty:
-        return []
-
-    return [
-        PrintRow(
-            trade_id=row["vendor_trade_id"],
-            trade_ts_utc=row["trade_ts_utc"],
-            symbol=row["symbol"],
-            option=f"{row['symbol']} {row['expiry']} {row['strike']:.2f}{row['call_put']}",
-            price=float(row["price"]),
-            size=int(row["size"]),
-            notional=float(row["notional"]),
-            side=row["side"],
-            is_0dte=bool(row["is_0dte"]),
-            sweep_id=row["sweep_id"] if row["sweep_id"] else None,
-        )
-        for _, row in df.iterrows()
-    ]
+    return arrow_response(table, request)
+
+
+@app.get("/sweeps", response_model=list[SweepRow])
+def sweeps_feed(
+    request: Request,
+    min_notional: float = Query(250_000.0, ge=0.0),
+    min_legs: int = Query(2, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+) -> Response:
+    table = query_arrow(
+        f"""
+        SELECT
+            sweep_id,
+            symbol,
+            {OPTION_LABEL_SQL} AS option,
+            side,
+            is_0dte,
+            first_ts_utc,
+            last_ts_utc,
+            duration_ms,
+            legs,
+            total_size,
+            notional,
+            vwap
+        FROM sweeps
+        WHERE notional >= ? AND legs >= ?
+        ORDER BY last_ts_utc DESC
+        LIMIT ?
+        """,
+        [min_notional, min_legs, limit],
+    )
+    return arrow_response(table, request)
 
 
 @app.get("/ticker/{symbol}", response_model=TickerDetail)
@@ -209,7 +234,7 @@ def ticker_detail(
     df = query_df(
         f"""
         SELECT *
-        FROM trades_labeled
+        FROM {tiered_relation("trades_labeled", since=window_start(minutes))}
         WHERE symbol = ? AND trade_ts_utc >= {cutoff_expr}
         """,
         [symbol],
@@ -224,10 +249,10 @@ def ticker_detail(
     def minute_metric(mask: pd.Series) -> pd.Series:
         return df[mask].groupby("minute_bucket")["premium"].sum()
 
-    buy = minute_metric(df["side"] == "BUY").reindex(minute_totals.index, fillna(0.0))
-    sell = minute_metric(df["side"] == "SELL").reindex(minute_totals.index, fillna(0.0))
-    call = minute_metric(df["call_put"] == "C").reindex(minute_totals.index, fillna(0.0))
-    put = minute_metric(df["call_put"] == "P").reindex(minute_totals.index, fillna(0.0))
+    buy = minute_metric(df["side"] == "BUY").reindex(minute_totals.index, fill_value=0.0)
+    sell = minute_metric(df["side"] == "SELL").reindex(minute_totals.index, fill_value=0.0)
+    call = minute_metric(df["call_put"] == "C").reindex(minute_totals.index, fill_value=0.0)
+    put = minute_metric(df["call_put"] == "P").reindex(minute_totals.index, fill_value=0.0)
 
     by_minute = [
         MinuteBar(
@@ -262,11 +287,7 @@ def ticker_detail(
         .tolist()
     )
 
-    strike_summary = (
-        df.groupby(["strike", "expiry", "call_put"], as_index=False)["premium"].sum()
-        .sort_values("premium", ascending=False)
-        .head(5)
-    )
+    strike_summary = top_strikes(window_start(minutes), symbol=symbol, limit=5)
     strikes = [
         f"{row['strike']:.2f}{row['call_put']} ({row['expiry']}): ${row['premium']:.0f}"
         for _, row in strike_summary.iterrows()
@@ -0,0 +1,108 @@
+﻿from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from fastapi import Request
+from fastapi.responses import Response
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+_NULL = pa.scalar("null", pa.string())
+_CONTROL_CHARS = "[\\x00-\\x1f]"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_string(values: pa.Array) -> pa.Array:
+    escaped = pc.replace_substring(values, "\\", "\\\\")
+    escaped = pc.replace_substring(escaped, '"', '\\"')
+    if pc.any(pc.match_substring_regex(escaped, _CONTROL_CHARS)).as_py():
+        for code in range(0x20):
+            escaped = pc.replace_substring(escaped, chr(code), f"\\u{code:04x}")
+    return pc.binary_join_element_wise('"', escaped, '"', "")
+
+
+def _json_values(values: pa.Array) -> pa.Array:
+    """Each value as JSON text; nulls and non-finite floats become ``null``."""
+
+    kind = values.type
+    if pa.types.is_dictionary(kind):
+        return _json_values(values.cast(kind.value_type))
+    if pa.types.is_floating(kind):
+        text = pc.if_else(pc.is_finite(values), pc.cast(values, pa.string()), None)
+    elif pa.types.is_integer(kind) or pa.types.is_decimal(kind) or pa.types.is_boolean(kind):
+        text = pc.cast(values, pa.string())
+    elif pa.types.is_timestamp(kind):
+        suffix = "%z" if kind.tz else ""
+        text = _json_string(pc.strftime(values, format=f"%Y-%m-%dT%H:%M:%S{suffix}"))
+    elif pa.types.is_date(kind):
+        text = _json_string(pc.strftime(values, format="%Y-%m-%d"))
+    elif pa.types.is_string(kind) or pa.types.is_large_string(kind):
+        text = _json_string(values.cast(pa.string()))
+    else:
+        text = pa.array(
+            [json.dumps(value, default=_default) for value in values.to_pylist()], pa.string()
+        )
+    return pc.fill_null(text, _NULL)
+
+
+def arrow_to_json(table: pa.Table) -> bytes:
+    """Serialize an Arrow table as a JSON array of row objects, one column at a time.
+
+    Every column is rendered to JSON text with Arrow compute kernels and the
+    row objects are joined from those columns, so no per-row Python objects
+    are built. NaN and infinities are written as ``null``.
+    """
+
+    if table.num_rows == 0:
+        return b"[]"
+    table = table.combine_chunks()
+    fields = [
+        pc.binary_join_element_wise(
+            f"{json.dumps(name)}:", _json_values(column.combine_chunks()), ""
+        )
+        for name, column in zip(table.column_names, table.columns, strict=True)
+    ]
+    if fields:
+        body = pc.binary_join_element_wise(*fields, ",")
+    else:
+        body = pa.array([""] * table.num_rows, pa.string())
+    rows = pc.binary_join_element_wise("{", body, "}", "")
+    offsets = pa.array([0, len(rows)], pa.int32())
+    joined = pc.binary_join(pa.ListArray.from_arrays(offsets, rows), ",")[0].as_py()
+    return f"[{joined}]".encode()
+
+
+def arrow_to_ipc(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def wants_arrow(request: Request) -> bool:
+    return ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def arrow_response(table: pa.Table, request: Request) -> Response:
+    """JSON rows by default; an Arrow IPC stream when the client accepts it."""
+
+    if wants_arrow(request):
+        return Response(arrow_to_ipc(table), media_type=ARROW_STREAM_MEDIA_TYPE)
+    return Response(arrow_to_json(table), media_type="application/json")
+
+
+__all__ = [
+    "ARROW_STREAM_MEDIA_TYPE",
+    "arrow_response",
+    "arrow_to_ipc",
+    "arrow_to_json",
+    "wants_arrow",
+]
@@ -39,9 +39,38 @@ class Settings(BaseSettings):
     polygon_rest_base_url: str = 'https://api.polygon.io'
     duckdb_path: DuckDBPath = Path('data/optionflow.duckdb')
     default_symbols: DefaultSymbols = ['SPY', 'QQQ', 'AAPL']
+    symbols_file: Path | None = None
     window_minutes: int = 30
     min_notional_usd: int = 250_000
     nbbo_cache_ttl_seconds: int = 30
+    ingest_batch_max_rows: int = 5_000
+    ingest_batch_max_latency_ms: int = 250
+    stream_queue_max_frames: int = 10_000
+    stream_overflow_policy: str = 'block'
+    stream_spill_path: Path | None = None
+    stream_gap_threshold_ms: int = 10_000
+    backfill_max_contracts: int = 200
+    stream_decoder: str = 'auto'
+    ingest_shards: int = 1
+    writer_flush_interval_ms: int = 50
+    writer_queue_max: int = 1_000
+    rollup_watermark_grace_ms: int = 5_000
+    rollup_repair_interval_minutes: int = 15
+    window_engine_sync_ms: int = 1_000
+    read_pool_size: int = 4
+    read_pool_hold_open: bool = True
+    read_snapshot_path: Path | None = None
+    read_snapshot_interval_seconds: int = 5
+    cold_storage_path: Path = Path('data/cold')
+    cold_retention_days: int = 0
+    tiering_interval_minutes: int = 60
+    recluster_interval_minutes: int = 30
+    recluster_min_disorder: float = 0.01
+    filter_underlyings: DefaultSymbols = []
+    filter_min_dte: int | None = None
+    filter_max_dte: int | None = None
+    filter_min_strike: float | None = None
+    filter_max_strike: float | None = None
     demo_mode: bool = False
     log_level: str = 'INFO'
 
@@ -0,0 +1,83 @@
+﻿from __future__ import annotations
+
+from collections.abc import Hashable
+
+import numpy as np
+
+from option_flow.ingest.nbbo_cache import NBBOCache
+
+
+class QuoteConflator:
+    """Keeps only the newest pending quote per contract ahead of the NBBO cache.
+
+    Quotes are held until ``flush`` (a single contract, before one of its trades
+    is enriched) or ``flush_all`` (once per tick), which applies them with one
+    ``NBBOCache.upsert_many`` call. Updates overwritten in between never reach
+    the cache.
+    """
+
+    def __init__(self, cache: NBBOCache) -> None:
+        self._cache = cache
+        self._pending: dict[Hashable, tuple[float, float, int, int, int]] = {}
+        self.received = 0
+        self.applied = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, contract: object) -> bool:
+        return contract in self._pending
+
+    @property
+    def conflated(self) -> int:
+        return self.received - self.applied - len(self._pending)
+
+    def add(
+        self,
+        contract: Hashable,
+        bid: float,
+        ask: float,
+        timestamp_ns: int,
+        *,
+        bid_size: int = 0,
+        ask_size: int = 0,
+    ) -> None:
+        self.received += 1
+        pending = self._pending.get(contract)
+        if pending is None or timestamp_ns >= pending[4]:
+            self._pending[contract] = (bid, ask, bid_size, ask_size, timestamp_ns)
+
+    def flush(self, contract: Hashable) -> bool:
+        """Apply the pending quote for one contract; returns whether there was one."""
+
+        pending = self._pending.pop(contract, None)
+        if pending is None:
+            return False
+        bid, ask, bid_size, ask_size, timestamp_ns = pending
+        self._cache.upsert(
+            contract, bid, ask, timestamp_ns, bid_size=bid_size, ask_size=ask_size
+        )
+        self.applied += 1
+        return True
+
+    def flush_all(self) -> int:
+        """Apply every pending quote in one batch; returns the number applied."""
+
+        if not self._pending:
+            return 0
+        contracts = list(self._pending)
+        bid, ask, bid_size, ask_size, timestamp_ns = zip(*self._pending.values(), strict=True)
+        self._pending.clear()
+        self._cache.upsert_many(
+            contracts,
+            np.asarray(bid, dtype=np.float64),
+            np.asarray(ask, dtype=np.float64),
+            np.asarray(timestamp_ns, dtype=np.int64),
+            bid_size=np.asarray(bid_size, dtype=np.int64),
+            ask_size=np.asarray(ask_size, dtype=np.int64),
+        )
+        self.applied += len(contracts)
+        return len(contracts)
+
+
+__all__ = ["QuoteConflator"]
@@ -1,53 +1,282 @@
 ﻿from __future__ import annotations
 
-from collections import defaultdict
+import time
+from collections.abc import Callable, Hashable, Sequence
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
 
 from option_flow.config.settings import get_settings
 
+NS_PER_SECOND = 1_000_000_000
+_EPOCH = datetime(1970, 1, 1)
+_NAT = np.datetime64("NaT", "D")
+
+
+def to_ns(timestamp: datetime | int) -> int:
+    """Epoch nanoseconds for a naive-UTC datetime (ints pass through)."""
+
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()  # type: ignore[operator]
+        return (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+    return int(timestamp)
+
+
+def from_ns(timestamp_ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=timestamp_ns // 1000)
+
 
 @dataclass
 class NBBOQuote:
     bid: float
     ask: float
     timestamp: datetime
+    bid_size: int = 0
+    ask_size: int = 0
 
     @property
     def mid(self) -> float:
         return (self.bid + self.ask) / 2
 
 
+@dataclass
+class QuoteSnapshot:
+    """NBBO for a batch of slots as parallel arrays; ``valid`` masks missing or stale quotes."""
+
+    bid: np.ndarray
+    ask: np.ndarray
+    bid_size: np.ndarray
+    ask_size: np.ndarray
+    timestamp_ns: np.ndarray
+    valid: np.ndarray
+
+    @classmethod
+    def concat(cls, parts: list[QuoteSnapshot]) -> QuoteSnapshot:
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(
+                empty.astype(np.float64),
+                empty.astype(np.float64),
+                empty,
+                empty,
+                empty,
+                empty.astype(np.bool_),
+            )
+        return cls(
+            *(
+                np.concatenate([getattr(part, name) for part in parts])
+                for name in ("bid", "ask", "bid_size", "ask_size", "timestamp_ns", "valid")
+            )
+        )
+
+
 class NBBOCache:
-    """Simple in-memory NBBO cache keyed by option contract."""
+    """Struct-of-arrays NBBO store keyed by option contract symbol or registry id.
+
+    Each contract owns an integer slot into NumPy columns. Timestamps are epoch
+    nanoseconds; TTL expiry runs through a one-second timer wheel so
+    ``bulk_expire`` only touches slots updated in the seconds that just aged
+    out, and contracts past their expiry date release their slots.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        capacity: int = 4096,
+        expiry_lookup: Callable[[Hashable], date | np.datetime64 | None] | None = None,
+    ) -> None:
         self._settings = get_settings()
-        self._store: Dict[str, NBBOQuote] = {}
+        self._ttl_ns = self._settings.nbbo_cache_ttl_seconds * NS_PER_SECOND
+        self._expiry_lookup = expiry_lookup
+        self._slots: dict[Hashable, int] = {}
+        self._keys: list[Hashable | None] = []
+        self._free: list[int] = []
+        self._bid = np.zeros(capacity, dtype=np.float64)
+        self._ask = np.zeros(capacity, dtype=np.float64)
+        self._bid_size = np.zeros(capacity, dtype=np.int64)
+        self._ask_size = np.zeros(capacity, dtype=np.int64)
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._present = np.zeros(capacity, dtype=np.bool_)
+        self._expiry = np.full(capacity, _NAT, dtype="datetime64[D]")
+        self._wheel: list[set[int]] = [
+            set() for _ in range(self._settings.nbbo_cache_ttl_seconds + 2)
+        ]
+        self._wheel_second: int | None = None
 
-    def _ttl(self) -> timedelta:
-        return timedelta(seconds=self._settings.nbbo_cache_ttl_seconds)
+    def __len__(self) -> int:
+        return int(self._present[: len(self._keys)].sum())
 
-    def upsert(self, contract: str, bid: float, ask: float, timestamp: datetime) -> None:
-        self._store[contract] = NBBOQuote(bid=bid, ask=ask, timestamp=timestamp)
+    def slot(self, contract: Hashable) -> int:
+        """Return the contract's slot, allocating one on first sight."""
 
-    def get(self, contract: str, *, now: Optional[datetime] = None) -> Optional[NBBOQuote]:
-        quote = self._store.get(contract)
-        if not quote:
+        slot = self._slots.get(contract)
+        if slot is None:
+            slot = self._allocate(contract)
+        return slot
+
+    def upsert(
+        self,
+        contract: Hashable,
+        bid: float,
+        ask: float,
+        timestamp: datetime | int,
+        *,
+        bid_size: int = 0,
+        ask_size: int = 0,
+    ) -> None:
+        slot = self._slots.get(contract)
+        if slot is None:
+            slot = self._allocate(contract)
+        ts_ns = to_ns(timestamp)
+        self._bid[slot] = bid
+        self._ask[slot] = ask
+        self._bid_size[slot] = bid_size
+        self._ask_size[slot] = ask_size
+        self._ts[slot] = ts_ns
+        self._present[slot] = True
+        self._wheel[(ts_ns // NS_PER_SECOND) % len(self._wheel)].add(slot)
+
+    def upsert_many(
+        self,
+        contracts: Sequence[Hashable],
+        bid: np.ndarray,
+        ask: np.ndarray,
+        timestamp_ns: np.ndarray,
+        *,
+        bid_size: np.ndarray | None = None,
+        ask_size: np.ndarray | None = None,
+    ) -> None:
+        """Apply one quote per contract in a single vectorized write (contracts must be unique)."""
+
+        slots = np.fromiter(
+            (self.slot(contract) for contract in contracts), dtype=np.int64, count=len(contracts)
+        )
+        timestamp_ns = np.asarray(timestamp_ns, dtype=np.int64)
+        self._bid[slots] = bid
+        self._ask[slots] = ask
+        self._bid_size[slots] = 0 if bid_size is None else bid_size
+        self._ask_size[slots] = 0 if ask_size is None else ask_size
+        self._ts[slots] = timestamp_ns
+        self._present[slots] = True
+        buckets = (timestamp_ns // NS_PER_SECOND) % len(self._wheel)
+        for slot, bucket in zip(slots.tolist(), buckets.tolist(), strict=True):
+            self._wheel[bucket].add(slot)
+
+    def get(
+        self, contract: Hashable, *, now: Optional[datetime | int] = None
+    ) -> Optional[NBBOQuote]:
+        slot = self._slots.get(contract)
+        if slot is None or not self._present[slot]:
             return None
-        now = now or datetime.utcnow()
-        if now - quote.timestamp > self._ttl():
-            self._store.pop(contract, None)
+        now_ns = to_ns(now) if now is not None else time.time_ns()
+        ts_ns = int(self._ts[slot])
+        if now_ns - ts_ns > self._ttl_ns:
+            self._present[slot] = False
             return None
-        return quote
+        return NBBOQuote(
+            bid=float(self._bid[slot]),
+            ask=float(self._ask[slot]),
+            timestamp=from_ns(ts_ns),
+            bid_size=int(self._bid_size[slot]),
+            ask_size=int(self._ask_size[slot]),
+        )
+
+    def get_many(self, slots: np.ndarray, now_ns: np.ndarray | int) -> QuoteSnapshot:
+        """Look up a whole micro-batch; negative slots are treated as unknown contracts."""
+
+        slots = np.asarray(slots, dtype=np.int64)
+        known = slots >= 0
+        idx = np.where(known, slots, 0)
+        ts = self._ts[idx]
+        valid = known & self._present[idx] & ((np.asarray(now_ns) - ts) <= self._ttl_ns)
+        return QuoteSnapshot(
+            bid=self._bid[idx],
+            ask=self._ask[idx],
+            bid_size=self._bid_size[idx],
+            ask_size=self._ask_size[idx],
+            timestamp_ns=ts,
+            valid=valid,
+        )
+
+    def bulk_expire(self, *, now: Optional[datetime | int] = None) -> int:
+        """Drop quotes older than the TTL by advancing the timer wheel; returns evictions."""
+
+        now_ns = to_ns(now) if now is not None else time.time_ns()
+        cutoff_second = (now_ns - self._ttl_ns) // NS_PER_SECOND
+        size = len(self._wheel)
+        start = cutoff_second - size
+        if self._wheel_second is not None:
+            start = max(start, self._wheel_second + 1)
+        evicted = 0
+        for second in range(start, cutoff_second):
+            bucket_idx = second % size
+            survivors: set[int] = set()
+            for slot in self._wheel[bucket_idx]:
+                if not self._present[slot]:
+                    continue
+                slot_second = int(self._ts[slot]) // NS_PER_SECOND
+                if slot_second < cutoff_second:
+                    self._present[slot] = False
+                    evicted += 1
+                elif slot_second % size == bucket_idx:
+                    survivors.add(slot)
+            self._wheel[bucket_idx] = survivors
+        if self._wheel_second is None or cutoff_second - 1 > self._wheel_second:
+            self._wheel_second = cutoff_second - 1
+        return evicted
+
+    def evict_expired(self, today: date) -> int:
+        """Release slots of contracts whose expiry date is before ``today``."""
+
+        count = len(self._keys)
+        expired = np.flatnonzero(self._expiry[:count] < np.datetime64(today, "D"))
+        for slot in expired.tolist():
+            key = self._keys[slot]
+            if key is None:
+                continue
+            del self._slots[key]
+            self._keys[slot] = None
+            self._present[slot] = False
+            self._expiry[slot] = _NAT
+            self._free.append(slot)
+        return len(expired)
+
+    def _allocate(self, contract: Hashable) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = contract
+        else:
+            slot = len(self._keys)
+            if slot == len(self._bid):
+                self._grow()
+            self._keys.append(contract)
+        self._slots[contract] = slot
+        if self._expiry_lookup is not None:
+            expiry = self._expiry_lookup(contract)
+            if expiry is None:
+                self._expiry[slot] = _NAT
+            elif isinstance(expiry, np.datetime64):
+                self._expiry[slot] = expiry.astype("datetime64[D]")
+            else:
+                self._expiry[slot] = np.datetime64(expiry, "D")
+        return slot
+
+    def _grow(self) -> None:
+        def doubled(values: np.ndarray, fill: object) -> np.ndarray:
+            return np.concatenate([values, np.full(max(len(values), 1), fill, dtype=values.dtype)])
 
-    def bulk_expire(self, *, now: Optional[datetime] = None) -> None:
-        now = now or datetime.utcnow()
-        ttl = self._ttl()
-        stale_keys = [key for key, quote in self._store.items() if now - quote.timestamp > ttl]
-        for key in stale_keys:
-            self._store.pop(key, None)
+        self._bid = doubled(self._bid, 0.0)
+        self._ask = doubled(self._ask, 0.0)
+        self._bid_size = doubled(self._bid_size, 0)
+        self._ask_size = doubled(self._ask_size, 0)
+        self._ts = doubled(self._ts, 0)
+        self._present = doubled(self._present, False)
+        self._expiry = doubled(self._expiry, _NAT)
 
 
-__all__ = ["NBBOCache", "NBBOQuote"]
+__all__ = ["NBBOCache", "NBBOQuote", "QuoteSnapshot", "from_ns", "to_ns"]
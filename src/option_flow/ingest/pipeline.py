@@ -0,0 +1,584 @@
+﻿from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterable, Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from option_flow.config.settings import get_settings
+from option_flow.ingest.conflation import QuoteConflator
+from option_flow.ingest.nbbo_cache import NBBOCache, QuoteSnapshot
+from option_flow.services.contract_rollups import (
+    CONTRACT_ROLLUP_KEYS,
+    CONTRACT_ROLLUP_TABLE,
+    contract_deltas,
+)
+from option_flow.services.flow_rollups import FLOW_ROLLUP_KEYS, FLOW_ROLLUP_TABLE, flow_deltas
+from option_flow.services.minute_rollups import ROLLUP_KEYS, MinuteRollupAccumulator
+from option_flow.services.rollup_levels import ROLLUP_TABLES, cascade_deltas
+from option_flow.services.side_classifier import infer_sides, side_labels
+from option_flow.services.sweep_cluster import SweepAssignment, SweepClusterer, SweepState
+from option_flow.storage.payloads import PAYLOAD_TABLE, payload_frame
+from option_flow.storage.writer import DuckDBWriter, WriteOp, frames_op
+from option_flow.vendors.polygon import (
+    ContractFilter,
+    ContractRegistry,
+    Decoder,
+    Event,
+    FrameFilter,
+    PolygonClient,
+    QuoteEvent,
+    StreamGap,
+    TradeEvent,
+    events_from_dicts,
+    get_decoder,
+    occ_symbol,
+    rest_trade_event,
+    trade_payload,
+)
+
+MARKET_TZ = ZoneInfo("America/New_York")
+CONTRACT_MULTIPLIER = 100
+BATCH_QUEUE_SIZE = 4
+NS_PER_MS = 1_000_000
+UPSERT_TABLES = frozenset({"sweeps"})
+ACCUMULATE_TABLES = {
+    **dict.fromkeys(ROLLUP_TABLES, ROLLUP_KEYS),
+    CONTRACT_ROLLUP_TABLE: CONTRACT_ROLLUP_KEYS,
+    FLOW_ROLLUP_TABLE: FLOW_ROLLUP_KEYS,
+}
+RECENT_TRADE_IDS = 100_000
+
+
+def market_dates(timestamps: pd.Series) -> np.ndarray:
+    """Exchange-local (New York) calendar date of naive UTC timestamps as datetime64[D]."""
+
+    local = pd.DatetimeIndex(timestamps).tz_localize("UTC").tz_convert(MARKET_TZ)
+    return local.tz_localize(None).to_numpy(dtype="datetime64[D]")
+
+
+@dataclass
+class TradeBatch:
+    """Column buffers for trades enriched with the NBBO seen at trade time."""
+
+    trade_ids: list[str] = field(default_factory=list)
+    contract_ids: list[int] = field(default_factory=list)
+    timestamps_ns: list[int] = field(default_factory=list)
+    prices: list[float] = field(default_factory=list)
+    sizes: list[int] = field(default_factory=list)
+    quote_slots: list[int] = field(default_factory=list)
+    events: list[TradeEvent] = field(default_factory=list)
+    snapshots: list[QuoteSnapshot] = field(default_factory=list)
+    resolved: int = 0
+    opened_at: float = field(default_factory=time.monotonic)
+
+    def __len__(self) -> int:
+        return len(self.trade_ids)
+
+    def timestamps(self) -> pd.Series:
+        return pd.Series(np.asarray(self.timestamps_ns, dtype="datetime64[ns]"))
+
+    def nbbo(self) -> QuoteSnapshot:
+        return QuoteSnapshot.concat(self.snapshots)
+
+
+@dataclass
+class PipelineStats:
+    events: int = 0
+    trades: int = 0
+    quotes: int = 0
+    quotes_conflated: int = 0
+    skipped: int = 0
+    filtered: int = 0
+    backfilled: int = 0
+    duplicates: int = 0
+    batches_written: int = 0
+    rows_written: int = 0
+    last_commit_ms: float = 0.0
+    last_lag_ms: float = 0.0
+
+    def record_write(self, frames: dict[str, pd.DataFrame], commit_ms: float) -> None:
+        labeled = frames["trades_labeled"]
+        self.batches_written += 1
+        self.rows_written += len(labeled)
+        self.last_commit_ms = commit_ms
+        if labeled.empty:
+            return
+        newest = labeled["trade_ts_utc"].max().to_pydatetime()
+        lag = datetime.now(UTC).replace(tzinfo=None) - newest
+        self.last_lag_ms = lag.total_seconds() * 1000
+
+
+FrameSink = Callable[[dict[str, pd.DataFrame]], object]
+
+
+def batch_op(frames: dict[str, pd.DataFrame]) -> WriteOp:
+    """Writer op for one batch's frames: sweeps replace, rollup deltas add up."""
+
+    return frames_op(frames, upsert=UPSERT_TABLES, accumulate=ACCUMULATE_TABLES)
+
+
+def write_frames(con: duckdb.DuckDBPyConnection, frames: dict[str, pd.DataFrame]) -> float:
+    """Write one batch's frames in a single transaction; returns the commit time in ms."""
+
+    started = time.perf_counter()
+    con.execute("BEGIN TRANSACTION")
+    try:
+        batch_op(frames)(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return (time.perf_counter() - started) * 1000
+
+
+class IngestPipeline:
+    """Decode, enrich, label, cluster and write Polygon events in DuckDB micro-batches.
+
+    Built frames go to the shared ``writer`` when one is given, to ``sink``
+    (how ingest shards feed the single writer process), or otherwise to a
+    connection the pipeline opens itself.
+    """
+
+    def __init__(
+        self,
+        *,
+        nbbo_cache: NBBOCache | None = None,
+        clusterer: SweepClusterer | None = None,
+        max_batch_rows: int | None = None,
+        max_batch_latency_ms: int | None = None,
+        database: Path | str | None = None,
+        decoder: Decoder | None = None,
+        registry: ContractRegistry | None = None,
+        sink: FrameSink | None = None,
+        writer: DuckDBWriter | None = None,
+        frame_filter: FrameFilter | None = None,
+        contract_filter: ContractFilter | None = None,
+    ) -> None:
+        settings = get_settings()
+        self.registry = registry or ContractRegistry()
+        self._decoder = decoder or get_decoder(settings.stream_decoder)
+        self._database = str(database or settings.duckdb_path)
+        self._nbbo = nbbo_cache or NBBOCache(expiry_lookup=self.registry.expiry_of)
+        self._quotes = QuoteConflator(self._nbbo)
+        self._clusterer = clusterer or SweepClusterer()
+        self._max_rows = max_batch_rows or settings.ingest_batch_max_rows
+        latency_ms = max_batch_latency_ms or settings.ingest_batch_max_latency_ms
+        self._max_latency = latency_ms / 1000
+        self._backfill_max_contracts = settings.backfill_max_contracts
+        self._traded_contracts: set[int] = set()
+        self._stored_contracts: set[int] = set()
+        self._recent_ids: set[str] = set()
+        self._recent_order: deque[str] = deque()
+        self._rollups = MinuteRollupAccumulator()
+        self._awaiting_quote: set[int] = set()
+        self._clock_ns = 0
+        self._expiry_checked: np.datetime64 | None = None
+        self._batch = TradeBatch()
+        self._sink = sink
+        self._shared_writer = writer
+        self._frame_filter = frame_filter or FrameFilter(settings.filter_underlyings)
+        self._contract_filter = contract_filter or ContractFilter(
+            min_dte=settings.filter_min_dte,
+            max_dte=settings.filter_max_dte,
+            min_strike=settings.filter_min_strike,
+            max_strike=settings.filter_max_strike,
+        )
+        self._accepted: dict[int, bool] = {}
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._writer: asyncio.Task[None] | None = None
+        self.stats = PipelineStats()
+
+    async def run(self, source: AsyncIterable[Any]) -> None:
+        batches: asyncio.Queue[TradeBatch | None] = asyncio.Queue(maxsize=BATCH_QUEUE_SIZE)
+        self._writer = asyncio.create_task(self._write_loop(batches))
+        timer = asyncio.create_task(self._flush_timer(batches))
+        try:
+            async for payload in source:
+                for event in self.decode(payload):
+                    self.enrich(event)
+                self.end_tick()
+                if len(self._batch) >= self._max_rows:
+                    await self._seal(batches)
+        finally:
+            timer.cancel()
+            try:
+                await self._seal(batches)
+                if not self._writer.done():
+                    await batches.put(None)
+                await self._writer
+            finally:
+                self.close()
+
+    def decode(self, payload: Any) -> list[Event]:
+        """Decode raw frames (or already-parsed payloads) into typed events, in feed order."""
+
+        if isinstance(payload, (bytes, str)):
+            if self._frame_filter:
+                dropped = self._frame_filter.dropped
+                payload = self._frame_filter.filter(payload)
+                self.stats.filtered += self._frame_filter.dropped - dropped
+                if payload is None:
+                    return []
+            events = self._decoder.decode(payload)
+        else:
+            events = events_from_dicts(payload if isinstance(payload, list) else [payload])
+        self.stats.events += len(events)
+        return events
+
+    def enrich(self, event: Event, *, with_quote: bool = True) -> None:
+        try:
+            contract_id = self.registry.intern(event.sym)
+        except ValueError:
+            self.stats.skipped += 1
+            return
+        timestamp_ns = event.timestamp_ms * NS_PER_MS
+        if self._contract_filter and not self._accepts(contract_id, timestamp_ns):
+            self.stats.filtered += 1
+            return
+        if timestamp_ns > self._clock_ns:
+            self._clock_ns = timestamp_ns
+        if event.kind == "Q":
+            quote: QuoteEvent = event  # type: ignore[assignment]
+            self.stats.quotes += 1
+            self._quotes.add(
+                contract_id,
+                float(quote.bid),
+                float(quote.ask),
+                timestamp_ns,
+                bid_size=quote.bid_size,
+                ask_size=quote.ask_size,
+            )
+            return
+        trade: TradeEvent = event  # type: ignore[assignment]
+        if with_quote and contract_id in self._quotes:
+            if contract_id in self._awaiting_quote:
+                self.resolve_quotes()
+            self._quotes.flush(contract_id)
+
+        trade_id = f"{trade.sym}-{trade.timestamp_ms}-{trade.sequence}"
+        if not self._remember(trade_id):
+            self.stats.duplicates += 1
+            return
+        batch = self._batch
+        if not batch:
+            batch.opened_at = time.monotonic()
+        batch.trade_ids.append(trade_id)
+        batch.contract_ids.append(contract_id)
+        batch.timestamps_ns.append(timestamp_ns)
+        batch.prices.append(float(trade.price))
+        batch.sizes.append(trade.size)
+        if with_quote:
+            batch.quote_slots.append(self._nbbo.slot(contract_id))
+            self._awaiting_quote.add(contract_id)
+        else:
+            batch.quote_slots.append(-1)
+        batch.events.append(trade)
+        self._traded_contracts.add(contract_id)
+        self.stats.trades += 1
+
+    def _remember(self, trade_id: str) -> bool:
+        """Track recently seen trade ids; False for a repeat.
+
+        The primary key already drops repeated trades, but minute rollup deltas
+        are additive and would count them twice (backfill ranges overlap the
+        trades received on either side of a gap).
+        """
+
+        if trade_id in self._recent_ids:
+            return False
+        self._recent_ids.add(trade_id)
+        self._recent_order.append(trade_id)
+        if len(self._recent_order) > RECENT_TRADE_IDS:
+            self._recent_ids.discard(self._recent_order.popleft())
+        return True
+
+    def resolve_quotes(self) -> None:
+        """Snapshot the NBBO for trades enriched since the last call in one ``get_many``.
+
+        Runs at the end of every tick and before a pending quote is flushed
+        for a contract that still has trades waiting for their quote-at-trade.
+        """
+
+        batch = self._batch
+        start = batch.resolved
+        if start < len(batch):
+            batch.snapshots.append(
+                self._nbbo.get_many(
+                    np.asarray(batch.quote_slots[start:], dtype=np.int64),
+                    np.asarray(batch.timestamps_ns[start:], dtype=np.int64),
+                )
+            )
+            batch.resolved = len(batch)
+        self._awaiting_quote.clear()
+
+    def end_tick(self) -> None:
+        """Resolve this tick's trades, then apply the conflated quotes in one batch."""
+
+        self.resolve_quotes()
+        self._quotes.flush_all()
+        self.stats.quotes_conflated = self._quotes.conflated
+
+    def maintain(self) -> None:
+        """Age quotes out of the NBBO cache and release expired contracts."""
+
+        if not self._clock_ns:
+            return
+        self._nbbo.bulk_expire(now=self._clock_ns)
+        today = market_dates(pd.Series([self._clock_ns], dtype="datetime64[ns]"))[0]
+        if today != self._expiry_checked:
+            self._nbbo.evict_expired(today.astype(object))
+            self._accepted.clear()
+            self._expiry_checked = today
+
+    def _accepts(self, contract_id: int, timestamp_ns: int) -> bool:
+        """Contract filter verdict, computed once per contract and market day."""
+
+        accepted = self._accepted.get(contract_id)
+        if accepted is None:
+            ids = np.array([contract_id])
+            today = market_dates(pd.Series([timestamp_ns], dtype="datetime64[ns]"))[0]
+            accepted = bool(
+                self._contract_filter.accepts(
+                    self.registry.expiry(ids), self.registry.strike(ids), today
+                )[0]
+            )
+            self._accepted[contract_id] = accepted
+        return accepted
+
+    async def backfill(self, gap: StreamGap, client: PolygonClient) -> int:
+        """Replay REST trades for recently traded contracts across a stream gap.
+
+        The NBBO at those trade times is unknown, so backfilled trades are
+        labelled without a quote; trades already seen are skipped.
+        """
+
+        contract_ids = sorted(self._traded_contracts)[: self._backfill_max_contracts]
+        filled = 0
+        for contract in (self.registry.symbols[cid] for cid in contract_ids):
+            trades = await client.fetch_trades(contract, start_ms=gap.start_ms, end_ms=gap.end_ms)
+            for trade in trades:
+                self.enrich(rest_trade_event(contract, trade), with_quote=False)
+            filled += len(trades)
+        self.resolve_quotes()
+        self.stats.backfilled += filled
+        return filled
+
+    def label(self, prices: np.ndarray, nbbo: QuoteSnapshot) -> tuple[np.ndarray, np.ndarray]:
+        """Side codes and epsilons for a batch; trades without a valid quote are MID."""
+
+        return infer_sides(prices, nbbo.bid, nbbo.ask, ~nbbo.valid)
+
+    def cluster(
+        self, batch: TradeBatch, side_codes: np.ndarray, notional: np.ndarray
+    ) -> SweepAssignment:
+        return self._clusterer.assign_batch(
+            np.asarray(batch.contract_ids, dtype=np.int64),
+            side_codes,
+            np.asarray(batch.timestamps_ns, dtype=np.int64),
+            sizes=np.asarray(batch.sizes, dtype=np.int64),
+            notional=notional,
+        )
+
+    def build_frames(self, batch: TradeBatch) -> dict[str, pd.DataFrame]:
+        ids = np.asarray(batch.contract_ids, dtype=np.int64)
+        prices = np.asarray(batch.prices, dtype=np.float64)
+        sizes = np.asarray(batch.sizes, dtype=np.int64)
+        timestamps = batch.timestamps()
+        nbbo = batch.nbbo()
+        side_codes, epsilons = self.label(prices, nbbo)
+        expiries = self.registry.expiry(ids)
+        notional = prices * sizes * CONTRACT_MULTIPLIER
+        sweeps = self.cluster(batch, side_codes, notional)
+        keys = self.registry.key(ids)
+        symbols = self.registry.underlying(ids)
+        call_put = self.registry.call_put(ids)
+        is_0dte = expiries == market_dates(timestamps)
+        timestamps_ns = np.asarray(batch.timestamps_ns, dtype=np.int64)
+        self._rollups.add(symbols, timestamps_ns, notional, side_codes, call_put == "C", is_0dte)
+        raw = pd.DataFrame(
+            {
+                "vendor_trade_id": batch.trade_ids,
+                "contract_id": keys,
+                "symbol": symbols,
+                "trade_ts_utc": timestamps,
+                "price": prices,
+                "size": sizes,
+                "notional": notional,
+            }
+        )
+        labeled = pd.DataFrame(
+            {
+                "vendor_trade_id": batch.trade_ids,
+                "contract_id": keys,
+                "symbol": symbols,
+                "expiry": expiries,
+                "strike": self.registry.strike(ids),
+                "call_put": call_put,
+                "trade_ts_utc": timestamps,
+                "price": prices,
+                "size": sizes,
+                "notional": notional,
+                "premium": notional,
+                "epsilon_used": epsilons,
+                "side": side_labels(side_codes),
+                "is_0dte": is_0dte,
+                "sweep_id": sweeps.sweep_ids,
+            }
+        )
+        valid = nbbo.valid
+        quotes = pd.DataFrame(
+            {
+                "vendor_trade_id": np.asarray(batch.trade_ids, dtype=object)[valid],
+                "bid": nbbo.bid[valid],
+                "ask": nbbo.ask[valid],
+                "mid": (nbbo.bid[valid] + nbbo.ask[valid]) / 2,
+                "bid_size": nbbo.bid_size[valid],
+                "ask_size": nbbo.ask_size[valid],
+                "nbbo_ts": nbbo.timestamp_ns[valid].astype("datetime64[ns]"),
+            }
+        )
+        rollups = self._rollups.flush()
+        return {
+            "contracts": self.contract_frame(ids),
+            "trades_raw": raw,
+            PAYLOAD_TABLE: payload_frame(
+                [trade_payload(event) for event in batch.events], timestamps
+            ),
+            "nbbo_at_trade": quotes,
+            "trades_labeled": labeled,
+            "sweeps": self.sweep_frame(sweeps.sweeps),
+            "rollups_min": rollups,
+            **cascade_deltas(rollups),
+            CONTRACT_ROLLUP_TABLE: contract_deltas(
+                symbols, keys, timestamps_ns, notional, notional, side_codes, is_0dte
+            ),
+            FLOW_ROLLUP_TABLE: flow_deltas(
+                symbols, timestamps_ns, notional, side_codes, call_put, is_0dte
+            ),
+        }
+
+    def contract_frame(self, ids: np.ndarray) -> pd.DataFrame:
+        """``contracts`` rows for contracts this pipeline has not written yet."""
+
+        new = np.array(
+            [cid for cid in np.unique(ids) if cid not in self._stored_contracts], dtype=np.int64
+        )
+        self._stored_contracts.update(new.tolist())
+        expiries = self.registry.expiry(new)
+        strikes = self.registry.strike(new)
+        call_put = self.registry.call_put(new)
+        underlyings = self.registry.underlying(new)
+        return pd.DataFrame(
+            {
+                "contract_id": self.registry.key(new),
+                "occ_symbol": [
+                    occ_symbol(*fields)
+                    for fields in zip(
+                        underlyings, expiries.astype(object), call_put, strikes, strict=True
+                    )
+                ],
+                "symbol": underlyings,
+                "expiry": expiries,
+                "strike": strikes,
+                "call_put": call_put,
+            }
+        )
+
+    def sweep_frame(self, sweeps: list[SweepState]) -> pd.DataFrame:
+        """Current running totals of the sweeps a batch touched, one row per sweep."""
+
+        ids = np.fromiter((sweep.contract for sweep in sweeps), np.int64, len(sweeps))
+        codes = np.fromiter((sweep.side for sweep in sweeps), np.int8, len(sweeps))
+        first_ns = np.fromiter((sweep.first_ns for sweep in sweeps), np.int64, len(sweeps))
+        last_ns = np.fromiter((sweep.last_ns for sweep in sweeps), np.int64, len(sweeps))
+        sizes = np.fromiter((sweep.contracts for sweep in sweeps), np.int64, len(sweeps))
+        notional = np.fromiter((sweep.notional for sweep in sweeps), np.float64, len(sweeps))
+        first_ts = pd.Series(first_ns.astype("datetime64[ns]"))
+        expiries = self.registry.expiry(ids)
+        shares = sizes * CONTRACT_MULTIPLIER
+        return pd.DataFrame(
+            {
+                "sweep_id": [sweep.sweep_id for sweep in sweeps],
+                "contract_id": self.registry.key(ids),
+                "symbol": self.registry.underlying(ids),
+                "expiry": expiries,
+                "strike": self.registry.strike(ids),
+                "call_put": self.registry.call_put(ids),
+                "side": side_labels(codes),
+                "is_0dte": expiries == market_dates(first_ts),
+                "first_ts_utc": first_ts,
+                "last_ts_utc": last_ns.astype("datetime64[ns]"),
+                "duration_ms": (last_ns - first_ns) / NS_PER_MS,
+                "legs": [sweep.fills for sweep in sweeps],
+                "total_size": sizes,
+                "notional": notional,
+                "vwap": np.divide(
+                    notional, shares, out=np.full(len(sweeps), np.nan), where=shares > 0
+                ),
+                "updated_at": datetime.now(UTC).replace(tzinfo=None),
+            }
+        )
+
+    def write(self, frames: dict[str, pd.DataFrame]) -> None:
+        commit_ms = write_frames(self._connection(), frames)
+        self.stats.record_write(frames, commit_ms)
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _connection(self) -> duckdb.DuckDBPyConnection:
+        if self._con is None:
+            self._con = duckdb.connect(self._database, read_only=False)
+        return self._con
+
+    async def _seal(self, batches: asyncio.Queue[TradeBatch | None]) -> None:
+        self.resolve_quotes()
+        if not self._batch:
+            return
+        if self._writer is not None and self._writer.done():
+            self._writer.result()
+        batch, self._batch = self._batch, TradeBatch()
+        await batches.put(batch)
+
+    async def _flush_timer(self, batches: asyncio.Queue[TradeBatch | None]) -> None:
+        while True:
+            await asyncio.sleep(self._max_latency / 2)
+            self.maintain()
+            if self._batch and time.monotonic() - self._batch.opened_at >= self._max_latency:
+                await self._seal(batches)
+
+    async def _write_loop(self, batches: asyncio.Queue[TradeBatch | None]) -> None:
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                return
+            frames = self.build_frames(batch)
+            if self._shared_writer is not None and self._sink is None:
+                writer = self._shared_writer
+                await asyncio.wrap_future(writer.submit(batch_op(frames), label="trades"))
+                self.stats.record_write(frames, writer.stats.last_commit_ms)
+            else:
+                await asyncio.to_thread(self._sink or self.write, frames)
+
+
+__all__ = [
+    "FrameSink",
+    "IngestPipeline",
+    "PipelineStats",
+    "TradeBatch",
+    "batch_op",
+    "market_dates",
+    "write_frames",
+]
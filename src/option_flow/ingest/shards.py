@@ -0,0 +1,202 @@
+﻿from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import queue
+import time
+import zlib
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import Any
+
+import duckdb
+import pandas as pd
+
+from option_flow.config.settings import get_settings
+from option_flow.ingest.pipeline import (
+    BATCH_QUEUE_SIZE,
+    PipelineStats,
+    batch_op,
+    write_frames,
+)
+from option_flow.storage.writer import DuckDBWriter
+from option_flow.vendors.polygon import Backoff
+
+SUPERVISE_INTERVAL_SECONDS = 1.0
+
+ShardTarget = Callable[[int, list[str], Any], None]
+
+
+def underlying_of(symbol: str) -> str:
+    """Underlying root of an underlying ticker or an OCC option symbol (``O:SPY2412...``)."""
+
+    symbol = symbol.upper().removeprefix("O:")
+    end = 0
+    while end < len(symbol) and symbol[end].isalpha():
+        end += 1
+    return symbol[:end] or symbol
+
+
+def shard_for(symbol: str, shards: int) -> int:
+    """Stable shard index for a symbol; every contract of an underlying lands together."""
+
+    return zlib.crc32(underlying_of(symbol).encode("utf-8")) % shards
+
+
+def partition_symbols(symbols: Sequence[str], shards: int) -> list[list[str]]:
+    if shards <= 0:
+        raise ValueError("shards must be positive")
+    parts: list[list[str]] = [[] for _ in range(shards)]
+    for symbol in symbols:
+        parts[shard_for(symbol, shards)].append(symbol)
+    return parts
+
+
+def load_symbols(path: Path) -> list[str]:
+    """Read a symbol list file: one or more comma-separated symbols per line, ``#`` comments."""
+
+    symbols: list[str] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.split("#", 1)[0]
+        symbols.extend(item.strip().upper() for item in line.split(",") if item.strip())
+    return list(dict.fromkeys(symbols))
+
+
+@dataclass
+class ShardProcess:
+    index: int
+    symbols: list[str]
+    process: BaseProcess | None = None
+    restarts: int = 0
+    restart_at: float = 0.0
+
+
+class ShardSupervisor:
+    """Run one ingest process per shard and write all their batches from this process.
+
+    Each shard process owns its Polygon connection, NBBO cache and sweep state
+    and hands built frames over a bounded queue; the supervisor writes them (via
+    the shared ``writer`` when given, so batches from several shards share a
+    group commit) and restarts shard processes that exit, with backoff. Shards
+    are always spawned: a fork would copy this process's DuckDB handles and
+    event loop.
+    """
+
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        shards: int,
+        *,
+        target: ShardTarget,
+        database: Path | str | None = None,
+        writer: DuckDBWriter | None = None,
+        backoff: Backoff | None = None,
+    ) -> None:
+        if not symbols and shards > 1:
+            raise ValueError("sharded ingest needs an explicit symbol list")
+        self._ctx = multiprocessing.get_context("spawn")
+        self._target = target
+        self._database = str(database or get_settings().duckdb_path)
+        self._backoff = backoff or Backoff()
+        self.shards = [
+            ShardProcess(index, part)
+            for index, part in enumerate(partition_symbols(symbols, shards))
+            if part
+        ]
+        self._queue: Any = self._ctx.Queue(maxsize=BATCH_QUEUE_SIZE * max(len(self.shards), 1))
+        self._writer = writer
+        self._in_flight: list[Future[int]] = []
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._stopped = False
+        self.stats = PipelineStats()
+
+    async def run(self) -> None:
+        try:
+            self.supervise()
+            while not self._stopped:
+                wrote = await asyncio.to_thread(self.drain_once, SUPERVISE_INTERVAL_SECONDS)
+                if not wrote:
+                    self.supervise()
+        finally:
+            self.stop()
+
+    def supervise(self) -> None:
+        """Start shards that are not running, honouring each shard's restart backoff."""
+
+        now = time.monotonic()
+        for shard in self.shards:
+            process = shard.process
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                if shard.restart_at == 0.0:
+                    shard.restart_at = now + self._backoff.delay(shard.restarts)
+                    shard.restarts += 1
+                if now < shard.restart_at:
+                    continue
+            shard.restart_at = 0.0
+            shard.process = self._ctx.Process(
+                target=self._target,
+                args=(shard.index, shard.symbols, self._queue),
+                name=f"ingest-shard-{shard.index}",
+                daemon=True,
+            )
+            shard.process.start()
+
+    def drain_once(self, timeout: float) -> bool:
+        """Write the next batch any shard produced; returns False if none arrived in time."""
+
+        try:
+            frames = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if self._writer is not None:
+            self._check_in_flight()
+            future = self._writer.submit(batch_op(frames), label="trades")
+            future.add_done_callback(partial(self._record_write, frames))
+            self._in_flight.append(future)
+            return True
+        if self._con is None:
+            self._con = duckdb.connect(self._database, read_only=False)
+        self.stats.record_write(frames, write_frames(self._con, frames))
+        return True
+
+    def _record_write(self, frames: dict[str, pd.DataFrame], future: Future[int]) -> None:
+        if future.exception() is None and self._writer is not None:
+            self.stats.record_write(frames, self._writer.stats.last_commit_ms)
+
+    def _check_in_flight(self) -> None:
+        """Drop finished writes, re-raising the first failure."""
+
+        pending = []
+        for future in self._in_flight:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                raise future.exception()  # type: ignore[misc]
+        self._in_flight = pending
+
+    def stop(self) -> None:
+        self._stopped = True
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                shard.process.terminate()
+            if shard.process is not None:
+                shard.process.join(timeout=5)
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+
+__all__ = [
+    "ShardProcess",
+    "ShardSupervisor",
+    "load_symbols",
+    "partition_symbols",
+    "shard_for",
+    "underlying_of",
+]
@@ -1,21 +1,119 @@
 ﻿from __future__ import annotations
 
 import asyncio
+import logging
+from typing import Any
 
+from option_flow.config.settings import get_settings
+from option_flow.ingest.pipeline import FrameSink, IngestPipeline
+from option_flow.ingest.shards import ShardSupervisor, load_symbols
 from option_flow.services.rollups import RollupService
+from option_flow.storage.layout import ReclusterJob
+from option_flow.storage.snapshot import SnapshotJob
+from option_flow.storage.tiering import TieringJob
+from option_flow.storage.writer import DuckDBWriter, WriteOp
+from option_flow.vendors.polygon import PolygonClient
 
-ROLLUP_INTERVAL_SECONDS = 5
+logger = logging.getLogger(__name__)
 
 
-async def rollup_loop() -> None:
-    service = RollupService()
+async def maintenance_loop(
+    writer: DuckDBWriter,
+    *ops: WriteOp,
+    label: str,
+    minutes: float,
+    immediately: bool = True,
+    transaction: bool = True,
+) -> None:
+    """Run storage maintenance ops through the writer every ``minutes``.
+
+    Each op is submitted once the previous one has committed. A failure is
+    logged and the ops are retried on the next interval instead of stopping
+    the worker. ``immediately=False`` waits one interval before the first run;
+    ``transaction`` is passed on to :meth:`DuckDBWriter.submit`.
+    """
+
+    if not immediately:
+        await asyncio.sleep(minutes * 60)
     while True:
-        service.refresh_recent_minutes(60)
-        await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+        try:
+            for op in ops:
+                await asyncio.wrap_future(writer.submit(op, label=label, transaction=transaction))
+        except Exception:
+            logger.exception("%s maintenance failed; retrying in %g minute(s)", label, minutes)
+        await asyncio.sleep(minutes * 60)
+
+
+async def ingest_loop(
+    symbols: list[str],
+    *,
+    sink: FrameSink | None = None,
+    writer: DuckDBWriter | None = None,
+) -> None:
+    pipeline = IngestPipeline(sink=sink, writer=writer)
+    client = PolygonClient(backfill=lambda gap: pipeline.backfill(gap, client))
+    await pipeline.run(client.stream_frames(symbols))
+
+
+def run_shard(index: int, symbols: list[str], frames: Any) -> None:
+    """Entry point of one shard process: stream its symbols and ship batches to the writer."""
+
+    asyncio.run(ingest_loop(symbols, sink=frames.put))
 
 
 async def main() -> None:
-    await rollup_loop()
+    settings = get_settings()
+    writer = DuckDBWriter().start()
+    tiering = TieringJob()
+    tasks = [
+        maintenance_loop(
+            writer,
+            tiering.write_op,
+            tiering.publish,
+            label="tiering",
+            minutes=settings.tiering_interval_minutes,
+        ),
+        maintenance_loop(
+            writer,
+            ReclusterJob().write_op,
+            label="recluster",
+            minutes=settings.recluster_interval_minutes,
+            immediately=False,
+        ),
+        maintenance_loop(
+            writer,
+            RollupService().write_op,
+            label="rollups",
+            minutes=settings.rollup_repair_interval_minutes,
+        ),
+    ]
+    if settings.read_snapshot_path is not None:
+        tasks.append(
+            maintenance_loop(
+                writer,
+                SnapshotJob().write_op,
+                label="snapshot",
+                minutes=settings.read_snapshot_interval_seconds / 60,
+                transaction=False,
+            )
+        )
+    if not settings.demo_mode and settings.polygon_api_key:
+        symbols = (
+            load_symbols(settings.symbols_file)
+            if settings.symbols_file
+            else settings.default_symbols
+        )
+        if settings.ingest_shards > 1:
+            supervisor = ShardSupervisor(
+                symbols, settings.ingest_shards, target=run_shard, writer=writer
+            )
+            tasks.append(supervisor.run())
+        else:
+            tasks.append(ingest_loop(symbols, writer=writer))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        writer.stop()
 
 
 def run() -> None:
@@ -0,0 +1,157 @@
+﻿from __future__ import annotations
+
+from datetime import UTC, datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from option_flow.services.flow_rollups import notional_bucket_sql, notional_buckets, plan_window
+from option_flow.services.minute_rollups import NS_PER_MINUTE
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_SELL
+from option_flow.storage.duckdb_client import UTC_NOW_SQL, query_df
+from option_flow.storage.tiering import tiered_relation
+
+CONTRACT_ROLLUP_TABLE = "contract_rollups_min"
+CONTRACT_ROLLUP_KEYS = ("symbol", "contract_id", "minute_bucket", "notional_bucket")
+CONTRACT_ROLLUP_SUMS = (
+    "total_premium",
+    "buy_premium",
+    "sell_premium",
+    "zero_dte_premium",
+    "trades_count",
+)
+
+
+def contract_deltas(
+    symbols: np.ndarray,
+    contract_ids: np.ndarray,
+    timestamps_ns: np.ndarray,
+    premium: np.ndarray,
+    notional: np.ndarray,
+    side_codes: np.ndarray,
+    is_0dte: np.ndarray,
+) -> pd.DataFrame:
+    """Per-(contract, minute, notional bucket) delta rows for one batch of labeled trades."""
+
+    minutes = np.asarray(timestamps_ns, dtype=np.int64) // NS_PER_MINUTE * NS_PER_MINUTE
+    frame = pd.DataFrame(
+        {
+            "symbol": symbols,
+            "contract_id": contract_ids,
+            "minute_bucket": minutes.astype("datetime64[ns]"),
+            "notional_bucket": notional_buckets(notional),
+            "total_premium": premium,
+            "buy_premium": np.where(side_codes == SIDE_BUY, premium, 0.0),
+            "sell_premium": np.where(side_codes == SIDE_SELL, premium, 0.0),
+            "zero_dte_premium": np.where(is_0dte, premium, 0.0),
+            "trades_count": np.ones(len(premium), dtype=np.int64),
+        }
+    )
+    deltas = frame.groupby(list(CONTRACT_ROLLUP_KEYS), as_index=False, sort=False).sum()
+    deltas["updated_at"] = datetime.now(UTC).replace(tzinfo=None)
+    return deltas
+
+
+def rebuild_contract_rollups(
+    con: duckdb.DuckDBPyConnection, since: datetime | None = None
+) -> int:
+    """Re-aggregate contract buckets from ``trades_labeled``; returns the buckets written.
+
+    Only minutes from the one containing ``since`` onwards are rebuilt (all of
+    them without ``since``).
+    """
+
+    where, params = "WHERE contract_id IS NOT NULL", []
+    if since is not None:
+        where += " AND trade_ts_utc >= date_trunc('minute', CAST(? AS TIMESTAMP))"
+        params = [since]
+    rows = con.execute(
+        f"""
+        INSERT INTO {CONTRACT_ROLLUP_TABLE} (
+            {", ".join(CONTRACT_ROLLUP_KEYS)}, {", ".join(CONTRACT_ROLLUP_SUMS)}, updated_at
+        )
+        SELECT
+            symbol,
+            contract_id,
+            date_trunc('minute', trade_ts_utc),
+            {notional_bucket_sql()},
+            SUM(premium),
+            SUM(CASE WHEN side = 'BUY' THEN premium ELSE 0 END),
+            SUM(CASE WHEN side = 'SELL' THEN premium ELSE 0 END),
+            SUM(CASE WHEN is_0dte THEN premium ELSE 0 END),
+            COUNT(*),
+            {UTC_NOW_SQL}
+        FROM trades_labeled
+        {where}
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT ({", ".join(CONTRACT_ROLLUP_KEYS)}) DO UPDATE SET
+            {", ".join(f"{name} = excluded.{name}" for name in CONTRACT_ROLLUP_SUMS)},
+            updated_at = excluded.updated_at
+        RETURNING symbol
+        """,
+        params,
+    ).fetchall()
+    return len(rows)
+
+
+def top_strikes(
+    start: datetime,
+    *,
+    symbol: str | None = None,
+    call_put: str | None = None,
+    zero_dte_only: bool = False,
+    min_notional: float = 0.0,
+    limit: int = 3,
+) -> pd.DataFrame:
+    """The ``limit`` contracts with the most premium per underlying since ``start``.
+
+    Whole minutes come from ``contract_rollups_min``; the part of the first
+    minute after ``start`` is summed from the trades themselves, so the ranking
+    matches one computed from every print in the window. A ``min_notional``
+    that is not a notional bucket edge is answered from the trades alone.
+    """
+
+    rolled = "zero_dte_premium" if zero_dte_only else "total_premium"
+    raw_premium = "CASE WHEN is_0dte THEN premium ELSE 0 END" if zero_dte_only else "premium"
+    rows, params = plan_window(start, min_notional).parts(
+        f"SELECT symbol, contract_id, {rolled} AS premium FROM {CONTRACT_ROLLUP_TABLE}",
+        f"""
+        SELECT symbol, contract_id, {raw_premium} AS premium
+        FROM {tiered_relation("trades_labeled", since=start)}
+        """,
+    )
+    filters = []
+    if symbol is not None:
+        filters.append("s.symbol = ?")
+        params.append(symbol)
+    if call_put is not None:
+        filters.append("c.call_put = ?")
+        params.append(call_put)
+    params.append(limit)
+    return query_df(
+        f"""
+        WITH window_premium AS ({rows})
+        SELECT s.symbol, c.expiry, c.strike, c.call_put, SUM(s.premium) AS premium
+        FROM window_premium AS s
+        JOIN contracts AS c USING (contract_id)
+        {"WHERE " + " AND ".join(filters) if filters else ""}
+        GROUP BY s.symbol, c.expiry, c.strike, c.call_put
+        HAVING SUM(s.premium) > 0
+        QUALIFY row_number() OVER (
+            PARTITION BY s.symbol ORDER BY SUM(s.premium) DESC, c.strike, c.expiry
+        ) <= ?
+        ORDER BY s.symbol, premium DESC, c.strike, c.expiry
+        """,
+        params,
+    )
+
+
+__all__ = [
+    "CONTRACT_ROLLUP_KEYS",
+    "CONTRACT_ROLLUP_SUMS",
+    "CONTRACT_ROLLUP_TABLE",
+    "contract_deltas",
+    "rebuild_contract_rollups",
+    "top_strikes",
+]
@@ -0,0 +1,167 @@
+﻿from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from option_flow.services.minute_rollups import NS_PER_MINUTE
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_SELL
+from option_flow.storage.duckdb_client import UTC_NOW_SQL
+
+NOTIONAL_BUCKETS = (
+    0.0,
+    10_000.0,
+    25_000.0,
+    50_000.0,
+    100_000.0,
+    250_000.0,
+    500_000.0,
+    1_000_000.0,
+)
+FLOW_ROLLUP_TABLE = "flow_rollups_min"
+FLOW_ROLLUP_KEYS = ("symbol", "minute_bucket", "call_put", "is_0dte", "notional_bucket")
+FLOW_ROLLUP_SUMS = ("total_premium", "buy_premium", "sell_premium", "trades_count")
+
+
+def notional_buckets(notional: np.ndarray) -> np.ndarray:
+    """Lower edge of the ``NOTIONAL_BUCKETS`` step each notional falls in."""
+
+    ladder = np.asarray(NOTIONAL_BUCKETS)
+    index = np.searchsorted(ladder, np.asarray(notional, dtype=np.float64), side="right") - 1
+    return ladder[np.maximum(index, 0)]
+
+
+def notional_bucket_sql(column: str = "notional") -> str:
+    cases = " ".join(
+        f"WHEN {column} >= {edge!r} THEN {edge!r}" for edge in reversed(NOTIONAL_BUCKETS[1:])
+    )
+    return f"CASE {cases} ELSE {NOTIONAL_BUCKETS[0]!r} END"
+
+
+@dataclass(frozen=True)
+class WindowPlan:
+    """How a filtered window is read: trades from ``start``, rollups from ``rollup_from``.
+
+    Trades are read up to ``rollup_from``, or to the end of the window when no
+    rollup covers the filters.
+    """
+
+    start: datetime
+    min_notional: float
+    rollup_from: datetime | None
+
+    @property
+    def source(self) -> str:
+        return "trades" if self.rollup_from is None else "rollups"
+
+    def parts(self, rollup_sql: str, trades_sql: str) -> tuple[str, list[object]]:
+        """UNION ALL of the two sources; each SQL gets its own window predicate appended."""
+
+        trades = f"{trades_sql} WHERE trade_ts_utc >= ? AND notional >= ?"
+        params: list[object] = [self.start, self.min_notional]
+        if self.rollup_from is None:
+            return trades, params
+        rollups = f"{rollup_sql} WHERE minute_bucket >= ? AND notional_bucket >= ?"
+        return (
+            f"{rollups} UNION ALL {trades} AND trade_ts_utc < ?",
+            [self.rollup_from, self.min_notional, *params, self.rollup_from],
+        )
+
+
+def plan_window(start: datetime, min_notional: float = 0.0) -> WindowPlan:
+    """Read whole minutes from rollups whenever ``min_notional`` is a bucket edge.
+
+    Only the partial first minute of the window then comes from trades;
+    any other threshold needs the individual prints of the whole window.
+    """
+
+    if min_notional not in NOTIONAL_BUCKETS:
+        return WindowPlan(start, min_notional, None)
+    edge = start.replace(second=0, microsecond=0)
+    return WindowPlan(start, min_notional, edge + timedelta(minutes=1) if edge < start else edge)
+
+
+def flow_deltas(
+    symbols: np.ndarray,
+    timestamps_ns: np.ndarray,
+    notional: np.ndarray,
+    side_codes: np.ndarray,
+    call_put: np.ndarray,
+    is_0dte: np.ndarray,
+) -> pd.DataFrame:
+    """Per-(symbol, minute, call/put, 0DTE, notional bucket) delta rows for one batch."""
+
+    minutes = np.asarray(timestamps_ns, dtype=np.int64) // NS_PER_MINUTE * NS_PER_MINUTE
+    frame = pd.DataFrame(
+        {
+            "symbol": symbols,
+            "minute_bucket": minutes.astype("datetime64[ns]"),
+            "call_put": call_put,
+            "is_0dte": is_0dte,
+            "notional_bucket": notional_buckets(notional),
+            "total_premium": notional,
+            "buy_premium": np.where(side_codes == SIDE_BUY, notional, 0.0),
+            "sell_premium": np.where(side_codes == SIDE_SELL, notional, 0.0),
+            "trades_count": np.ones(len(notional), dtype=np.int64),
+        }
+    )
+    deltas = frame.groupby(list(FLOW_ROLLUP_KEYS), as_index=False, sort=False).sum()
+    deltas["updated_at"] = datetime.now(UTC).replace(tzinfo=None)
+    return deltas
+
+
+def rebuild_flow_rollups(con: duckdb.DuckDBPyConnection, since: datetime | None = None) -> int:
+    """Re-aggregate flow buckets from ``trades_labeled``; returns the buckets written.
+
+    Only minutes from the one containing ``since`` onwards are rebuilt (all of
+    them without ``since``).
+    """
+
+    where, params = "", []
+    if since is not None:
+        where = "WHERE trade_ts_utc >= date_trunc('minute', CAST(? AS TIMESTAMP))"
+        params = [since]
+    rows = con.execute(
+        f"""
+        INSERT INTO {FLOW_ROLLUP_TABLE} (
+            {", ".join(FLOW_ROLLUP_KEYS)}, {", ".join(FLOW_ROLLUP_SUMS)}, updated_at
+        )
+        SELECT
+            symbol,
+            date_trunc('minute', trade_ts_utc),
+            call_put,
+            is_0dte,
+            {notional_bucket_sql()},
+            SUM(premium),
+            SUM(CASE WHEN side = 'BUY' THEN premium ELSE 0 END),
+            SUM(CASE WHEN side = 'SELL' THEN premium ELSE 0 END),
+            COUNT(*),
+            {UTC_NOW_SQL}
+        FROM trades_labeled
+        {where}
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT ({", ".join(FLOW_ROLLUP_KEYS)}) DO UPDATE SET
+            {", ".join(f"{name} = excluded.{name}" for name in FLOW_ROLLUP_SUMS)},
+            updated_at = excluded.updated_at
+        RETURNING symbol
+        """,
+        params,
+    ).fetchall()
+    return len(rows)
+
+
+__all__ = [
+    "FLOW_ROLLUP_KEYS",
+    "FLOW_ROLLUP_SUMS",
+    "FLOW_ROLLUP_TABLE",
+    "NOTIONAL_BUCKETS",
+    "WindowPlan",
+    "flow_deltas",
+    "notional_bucket_sql",
+    "notional_buckets",
+    "plan_window",
+    "rebuild_flow_rollups",
+]
@@ -0,0 +1,125 @@
+﻿from __future__ import annotations
+
+from datetime import UTC, datetime
+
+import numpy as np
+import pandas as pd
+
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_SELL
+
+NS_PER_MINUTE = 60_000_000_000
+PREMIUM_METRICS = (
+    "total_premium",
+    "call_premium",
+    "put_premium",
+    "buy_premium",
+    "sell_premium",
+    "zero_dte_premium",
+)
+ROLLUP_KEYS = ("symbol", "minute_bucket")
+
+
+class MinuteRollupAccumulator:
+    """Per-(symbol, minute) premium deltas of the trades labeled since the last flush.
+
+    Buckets live in flat arrays indexed by slot. Flushed rows are deltas,
+    written with an additive upsert in the same transaction as the trades they
+    came from, so ``rollups_min`` stays exact across shards and restarts
+    without the accumulator keeping running totals of its own.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self._index: dict[tuple[str, int], int] = {}
+        self._symbols = np.empty(capacity, dtype=object)
+        self._minutes = np.zeros(capacity, dtype=np.int64)
+        self._pending = np.zeros((capacity, len(PREMIUM_METRICS)), dtype=np.float64)
+        self._pending_counts = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(
+        self,
+        symbols: np.ndarray,
+        timestamps_ns: np.ndarray,
+        premium: np.ndarray,
+        side_codes: np.ndarray,
+        is_call: np.ndarray,
+        is_0dte: np.ndarray,
+    ) -> None:
+        """Fold a batch of labeled trades into their buckets with one grouped pass."""
+
+        if not len(premium):
+            return
+        minutes = np.asarray(timestamps_ns, dtype=np.int64) // NS_PER_MINUTE
+        codes, _ = pd.factorize(np.asarray(symbols, dtype=object))
+        offsets = minutes - minutes.min()
+        combined = codes.astype(np.int64) * (int(offsets.max()) + 1) + offsets
+        keys, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+        premium = np.asarray(premium, dtype=np.float64)
+        is_call = np.asarray(is_call, dtype=np.bool_)
+        values = np.column_stack(
+            (
+                premium,
+                np.where(is_call, premium, 0.0),
+                np.where(is_call, 0.0, premium),
+                np.where(side_codes == SIDE_BUY, premium, 0.0),
+                np.where(side_codes == SIDE_SELL, premium, 0.0),
+                np.where(is_0dte, premium, 0.0),
+            )
+        )
+        sums = np.column_stack(
+            [
+                np.bincount(inverse, weights=values[:, column], minlength=len(keys))
+                for column in range(values.shape[1])
+            ]
+        )
+        counts = np.bincount(inverse, minlength=len(keys))
+        slots = np.fromiter(
+            (self._slot(symbols[i], int(minutes[i])) for i in first), np.int64, len(first)
+        )
+        self._pending[slots] += sums
+        self._pending_counts[slots] += counts
+
+    def flush(self) -> pd.DataFrame:
+        """``rollups_min`` delta rows for every bucket added to; clears the accumulator."""
+
+        used = len(self._index)
+        frame = pd.DataFrame(self._pending[:used], columns=list(PREMIUM_METRICS))
+        frame.insert(0, "symbol", self._symbols[:used])
+        buckets = (self._minutes[:used] * NS_PER_MINUTE).astype("datetime64[ns]")
+        frame.insert(1, "minute_bucket", buckets)
+        frame["net_premium"] = frame["buy_premium"] - frame["sell_premium"]
+        frame["trades_count"] = self._pending_counts[:used]
+        frame["updated_at"] = datetime.now(UTC).replace(tzinfo=None)
+        self._index.clear()
+        self._symbols[:used] = None
+        self._pending[:used] = 0.0
+        self._pending_counts[:used] = 0
+        return frame
+
+    def _slot(self, symbol: str, minute: int) -> int:
+        key = (symbol, minute)
+        slot = self._index.get(key)
+        if slot is not None:
+            return slot
+        slot = len(self._index)
+        if slot == len(self._minutes):
+            self._grow()
+        self._index[key] = slot
+        self._symbols[slot] = symbol
+        self._minutes[slot] = minute
+        return slot
+
+    def _grow(self) -> None:
+        size = len(self._minutes) * 2
+        self._symbols = np.resize(self._symbols, size)
+        self._minutes = np.resize(self._minutes, size)
+        self._pending = np.resize(self._pending, (size, len(PREMIUM_METRICS)))
+        self._pending_counts = np.resize(self._pending_counts, size)
+        half = size // 2
+        self._pending[half:] = 0.0
+        self._pending_counts[half:] = 0
+
+
+__all__ = ["NS_PER_MINUTE", "PREMIUM_METRICS", "ROLLUP_KEYS", "MinuteRollupAccumulator"]
@@ -0,0 +1,213 @@
+﻿from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+import duckdb
+import pandas as pd
+
+from option_flow.services.minute_rollups import NS_PER_MINUTE, PREMIUM_METRICS, ROLLUP_KEYS
+from option_flow.storage.duckdb_client import UTC_NOW_SQL
+
+ROLLUP_SUMS = (*PREMIUM_METRICS, "net_premium", "trades_count")
+EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class RollupLevel:
+    table: str
+    minutes: int
+
+    @property
+    def step(self) -> timedelta:
+        return timedelta(minutes=self.minutes)
+
+    def floor(self, value: datetime) -> datetime:
+        return value - (value - EPOCH) % self.step
+
+    def aligned(self, value: datetime) -> bool:
+        return not (value - EPOCH) % self.step
+
+
+ROLLUP_LEVELS = (
+    RollupLevel("rollups_min", 1),
+    RollupLevel("rollups_5m", 5),
+    RollupLevel("rollups_15m", 15),
+    RollupLevel("rollups_1h", 60),
+    RollupLevel("rollups_1d", 24 * 60),
+)
+ROLLUP_TABLES = tuple(level.table for level in ROLLUP_LEVELS)
+
+
+def cascade_deltas(minute_rows: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Delta rows for every coarser level, each folded from the level below it."""
+
+    frames: dict[str, pd.DataFrame] = {}
+    rows = minute_rows
+    for level in ROLLUP_LEVELS[1:]:
+        if not rows.empty:
+            step = level.minutes * NS_PER_MINUTE
+            buckets = pd.DatetimeIndex(rows["minute_bucket"]).as_unit("ns").asi8 // step * step
+            rows = (
+                rows.assign(minute_bucket=buckets.astype("datetime64[ns]"))
+                .groupby(list(ROLLUP_KEYS), as_index=False, sort=False)
+                .agg({**dict.fromkeys(ROLLUP_SUMS, "sum"), "updated_at": "max"})
+            )
+        frames[level.table] = rows
+    return frames
+
+
+def cascade_refresh(con: duckdb.DuckDBPyConnection, since: datetime | None = None) -> int:
+    """Re-aggregate each coarser level from the one below; returns the buckets written.
+
+    Only buckets from the one containing ``since`` onwards are rebuilt (all of
+    them without ``since``), which repairs the cascade after ``rollups_min``
+    rows were replaced rather than added to.
+    """
+
+    written = 0
+    for finer, level in zip(ROLLUP_LEVELS, ROLLUP_LEVELS[1:], strict=False):
+        where, params = "", []
+        if since is not None:
+            where, params = "WHERE minute_bucket >= ?", [level.floor(since)]
+        rows = con.execute(
+            f"""
+            INSERT INTO {level.table} (symbol, minute_bucket, {", ".join(ROLLUP_SUMS)}, updated_at)
+            SELECT
+                symbol,
+                time_bucket(INTERVAL {level.minutes} MINUTE, minute_bucket),
+                {", ".join(f"SUM({name})" for name in ROLLUP_SUMS)},
+                {UTC_NOW_SQL}
+            FROM {finer.table}
+            {where}
+            GROUP BY 1, 2
+            ON CONFLICT (symbol, minute_bucket) DO UPDATE SET
+                {", ".join(f"{name} = excluded.{name}" for name in ROLLUP_SUMS)},
+                updated_at = excluded.updated_at
+            RETURNING symbol
+            """,
+            params,
+        ).fetchall()
+        written += len(rows)
+    return written
+
+
+def cover(start: datetime, end: datetime) -> list[tuple[RollupLevel, datetime, datetime]]:
+    """Split ``[start, end)`` into runs of whole buckets from the coarsest level that fits.
+
+    A 560-minute window reads a handful of minute and 5m buckets at its edges
+    and hourly buckets in between; a month reads about thirty daily rows.
+    """
+
+    if not (ROLLUP_LEVELS[0].aligned(start) and ROLLUP_LEVELS[0].aligned(end)):
+        raise ValueError("Rollup ranges must start and end on a whole minute")
+    segments: list[tuple[RollupLevel, datetime, datetime]] = []
+    cursor = start
+    while cursor < end:
+        level = next(
+            level
+            for level in reversed(ROLLUP_LEVELS)
+            if level.aligned(cursor) and cursor + level.step <= end
+        )
+        if segments and segments[-1][0] is level:
+            segments[-1] = (level, segments[-1][1], cursor + level.step)
+        else:
+            segments.append((level, cursor, cursor + level.step))
+        cursor += level.step
+    return segments
+
+
+def coarsest_level(start: datetime, end: datetime) -> RollupLevel:
+    """Coarsest level whose buckets tile ``[start, end)`` exactly, for charting a range."""
+
+    for level in reversed(ROLLUP_LEVELS):
+        if level.aligned(start) and level.aligned(end):
+            return level
+    raise ValueError("Rollup ranges must start and end on a whole minute")
+
+
+def cover_rows(
+    start: datetime,
+    end: datetime | None = None,
+    columns: Sequence[str] = ROLLUP_SUMS,
+    symbols: Sequence[str] | None = None,
+) -> tuple[str, list[object]]:
+    """``UNION ALL`` of the rollup rows :func:`cover` picks for ``[start, end)``, and its params.
+
+    Without ``end`` the range stays open: whole buckets up to the current
+    minute, then every minute row from there on. Empty SQL for an empty range.
+    """
+
+    tail = None
+    if end is None:
+        tail = end = max(start, ROLLUP_LEVELS[0].floor(datetime.now(UTC).replace(tzinfo=None)))
+    parts: list[str] = []
+    params: list[object] = []
+
+    def select(table: str, where: str, bounds: list[object]) -> None:
+        sql = f"SELECT symbol, {', '.join(columns)} FROM {table} WHERE {where}"
+        params.extend(bounds)
+        if symbols is not None:
+            sql += " AND list_contains(?, symbol)"
+            params.append(list(symbols))
+        parts.append(sql)
+
+    for level, first, last in cover(start, end):
+        select(level.table, "minute_bucket >= ? AND minute_bucket < ?", [first, last])
+    if tail is not None:
+        select(ROLLUP_LEVELS[0].table, "minute_bucket >= ?", [tail])
+    return " UNION ALL ".join(parts), params
+
+
+def window_totals(
+    con: duckdb.DuckDBPyConnection,
+    start: datetime,
+    end: datetime | None = None,
+    symbols: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """Per-symbol rollup sums over ``[start, end)``, read from as few buckets as possible."""
+
+    rows, params = cover_rows(start, end, symbols=symbols)
+    if not rows:
+        return pd.DataFrame(columns=["symbol", *ROLLUP_SUMS])
+    return con.execute(
+        f"""
+        SELECT symbol, {", ".join(f"SUM({name}) AS {name}" for name in ROLLUP_SUMS)}
+        FROM ({rows})
+        GROUP BY symbol
+        """,
+        params,
+    ).df()
+
+
+def rollup_bars(
+    con: duckdb.DuckDBPyConnection, symbol: str, start: datetime, end: datetime
+) -> pd.DataFrame:
+    """Bars for ``symbol`` over ``[start, end)`` at the coarsest level that tiles it."""
+
+    level = coarsest_level(start, end)
+    return con.execute(
+        f"""
+        SELECT minute_bucket, {", ".join(ROLLUP_SUMS)}
+        FROM {level.table}
+        WHERE symbol = ? AND minute_bucket >= ? AND minute_bucket < ?
+        ORDER BY minute_bucket
+        """,
+        [symbol, start, end],
+    ).df()
+
+
+__all__ = [
+    "ROLLUP_LEVELS",
+    "ROLLUP_SUMS",
+    "ROLLUP_TABLES",
+    "RollupLevel",
+    "cascade_deltas",
+    "cascade_refresh",
+    "coarsest_level",
+    "cover",
+    "cover_rows",
+    "rollup_bars",
+    "window_totals",
+]
@@ -1,65 +1,174 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime
+from functools import partial
 
-from option_flow.storage.duckdb_client import get_connection
+import duckdb
+
+from option_flow.config.settings import get_settings
+from option_flow.services.contract_rollups import rebuild_contract_rollups
+from option_flow.services.flow_rollups import rebuild_flow_rollups
+from option_flow.services.rollup_levels import cascade_refresh
+from option_flow.storage.duckdb_client import UTC_NOW_SQL, get_connection
+from option_flow.storage.writer import DuckDBWriter
+
+WATERMARK_NAME = "rollups_min"
+ROLLUP_METRICS = (
+    "total_premium",
+    "net_premium",
+    "call_premium",
+    "put_premium",
+    "buy_premium",
+    "sell_premium",
+    "zero_dte_premium",
+    "trades_count",
+)
 
 
 class RollupService:
-    """Handles aggregation of trades into minute-level rollups."""
+    """Handles aggregation of trades into minute-level rollups.
+
+    Each refresh folds in only the (symbol, minute) buckets touched by trades
+    ingested since the stored watermark on ``trades_labeled.ingest_ts``,
+    re-aggregates just those buckets and upserts them, so late trades correct
+    older minutes while untouched minutes are never rewritten. Rows ingested
+    within ``grace_ms`` before the watermark are looked at again so a slower
+    concurrent transaction that committed behind it is not skipped. The
+    coarser rollup levels are then re-aggregated from the refreshed minutes,
+    and the contract and flow minutes from the oldest dirty minute onwards.
+
+    The ingest pipeline keeps these tables current with per-batch deltas; the
+    worker runs this refresh every ``rollup_repair_interval_minutes`` as a
+    repair pass, which also folds in trades written by other means.
+
+    With a ``writer`` the refresh runs as one request on the shared write
+    connection instead of opening its own read-write connection.
+    """
+
+    def __init__(self, writer: DuckDBWriter | None = None, *, grace_ms: int | None = None) -> None:
+        self._writer = writer
+        if grace_ms is None:
+            grace_ms = get_settings().rollup_watermark_grace_ms
+        self._grace_ms = grace_ms
+
+    def refresh_recent_minutes(self, minutes: int = 60) -> int:
+        """Fold new trades into ``rollups_min``; returns the buckets upserted.
 
-    def refresh_recent_minutes(self, minutes: int = 60) -> None:
-        cutoff_expr = f"(now() - INTERVAL {minutes} MINUTE)"
+        ``minutes`` only bounds the first refresh of a database without a
+        watermark, which rebuilds that many recent minutes.
+        """
+
+        if self._writer is not None:
+            return self._writer.write(partial(self._refresh, minutes=minutes), label="rollups")
         with get_connection(read_only=False) as con:
-            con.execute(
-                f"DELETE FROM rollups_min WHERE minute_bucket >= {cutoff_expr}"
+            return self._refresh(con, minutes=minutes)
+
+    def write_op(self, con: duckdb.DuckDBPyConnection) -> int:
+        """``DuckDBWriter`` op form of :meth:`refresh_recent_minutes`."""
+
+        return self._refresh(con, minutes=60)
+
+    def _refresh(self, con: duckdb.DuckDBPyConnection, *, minutes: int) -> int:
+        watermark = watermark_of(con, WATERMARK_NAME)
+        if watermark is None:
+            new_rows = f"trade_ts_utc >= {UTC_NOW_SQL} - INTERVAL {int(minutes)} MINUTE"
+            params: list[object] = []
+        else:
+            grace = f"INTERVAL {int(self._grace_ms)} MILLISECOND"
+            new_rows = f"ingest_ts > CAST(? AS TIMESTAMP) - {grace}"
+            params = [watermark]
+        row = con.execute(
+            f"""
+            SELECT max(ingest_ts), min(date_trunc('minute', trade_ts_utc))
+            FROM trades_labeled
+            WHERE {new_rows}
+            """,
+            params,
+        ).fetchone()
+        high, low = row if row else (None, None)
+        if high is None:
+            return 0
+        upserted = con.execute(
+            f"""
+            INSERT INTO rollups_min (
+                symbol,
+                minute_bucket,
+                total_premium,
+                net_premium,
+                call_premium,
+                put_premium,
+                buy_premium,
+                sell_premium,
+                zero_dte_premium,
+                trades_count,
+                updated_at
             )
-            con.execute(
-                f"""
-                WITH agg AS (
-                    SELECT
-                        symbol,
-                        date_trunc('minute', trade_ts_utc) AS minute_bucket,
-                        SUM(premium) AS total_premium,
-                        SUM(CASE WHEN side = 'BUY' THEN premium ELSE 0 END) AS buy_premium,
-                        SUM(CASE WHEN side = 'SELL' THEN premium ELSE 0 END) AS sell_premium,
-                        SUM(CASE WHEN call_put = 'C' THEN premium ELSE 0 END) AS call_premium,
-                        SUM(CASE WHEN call_put = 'P' THEN premium ELSE 0 END) AS put_premium,
-                        SUM(CASE WHEN is_0dte THEN premium ELSE 0 END) AS zero_dte_premium,
-                        COUNT(*) AS trades_count
-                    FROM trades_labeled
-                    WHERE trade_ts_utc >= {cutoff_expr}
-                    GROUP BY 1,2
-                )
-                INSERT INTO rollups_min (
-                    symbol,
-                    minute_bucket,
-                    total_premium,
-                    net_premium,
-                    call_premium,
-                    put_premium,
-                    buy_premium,
-                    sell_premium,
-                    zero_dte_premium,
-                    trades_count,
-                    updated_at
-                )
+            WITH dirty AS (
+                SELECT DISTINCT symbol, date_trunc('minute', trade_ts_utc) AS minute_bucket
+                FROM trades_labeled
+                WHERE {new_rows}
+            ),
+            agg AS (
                 SELECT
-                    symbol,
-                    minute_bucket,
-                    total_premium,
-                    buy_premium - sell_premium AS net_premium,
-                    call_premium,
-                    put_premium,
-                    buy_premium,
-                    sell_premium,
-                    zero_dte_premium,
-                    trades_count,
-                    now()
-                FROM agg
-                """
+                    t.symbol,
+                    date_trunc('minute', t.trade_ts_utc) AS minute_bucket,
+                    SUM(premium) AS total_premium,
+                    SUM(CASE WHEN side = 'BUY' THEN premium ELSE 0 END) AS buy_premium,
+                    SUM(CASE WHEN side = 'SELL' THEN premium ELSE 0 END) AS sell_premium,
+                    SUM(CASE WHEN call_put = 'C' THEN premium ELSE 0 END) AS call_premium,
+                    SUM(CASE WHEN call_put = 'P' THEN premium ELSE 0 END) AS put_premium,
+                    SUM(CASE WHEN is_0dte THEN premium ELSE 0 END) AS zero_dte_premium,
+                    COUNT(*) AS trades_count
+                FROM trades_labeled AS t
+                SEMI JOIN dirty AS d
+                    ON t.symbol = d.symbol
+                    AND date_trunc('minute', t.trade_ts_utc) = d.minute_bucket
+                WHERE t.trade_ts_utc >= CAST(? AS TIMESTAMP)
+                GROUP BY 1, 2
             )
+            SELECT
+                symbol,
+                minute_bucket,
+                total_premium,
+                buy_premium - sell_premium AS net_premium,
+                call_premium,
+                put_premium,
+                buy_premium,
+                sell_premium,
+                zero_dte_premium,
+                trades_count,
+                {UTC_NOW_SQL}
+            FROM agg
+            ON CONFLICT (symbol, minute_bucket) DO UPDATE SET
+                {", ".join(f"{name} = excluded.{name}" for name in ROLLUP_METRICS)},
+                updated_at = excluded.updated_at
+            RETURNING symbol
+            """,
+            [*params, low],
+        ).fetchall()
+        cascade_refresh(con, since=low)
+        rebuild_contract_rollups(con, since=low)
+        rebuild_flow_rollups(con, since=low)
+        set_watermark(con, WATERMARK_NAME, high)
+        return len(upserted)
+
+
+def watermark_of(con: duckdb.DuckDBPyConnection, name: str) -> datetime | None:
+    row = con.execute(
+        "SELECT watermark FROM rollup_watermarks WHERE name = ?", [name]
+    ).fetchone()
+    return row[0] if row else None
+
 
+def set_watermark(con: duckdb.DuckDBPyConnection, name: str, watermark: datetime) -> None:
+    con.execute(
+        f"""
+        INSERT INTO rollup_watermarks (name, watermark, updated_at) VALUES (?, ?, {UTC_NOW_SQL})
+        ON CONFLICT (name) DO UPDATE SET
+            watermark = excluded.watermark, updated_at = excluded.updated_at
+        """,
+        [name, watermark],
+    )
 
-__all__ = ["RollupService"]
 
+__all__ = ["RollupService", "set_watermark", "watermark_of"]
@@ -2,6 +2,8 @@
 
 from dataclasses import dataclass
 
+import numpy as np
+
 from option_flow.ingest.nbbo_cache import NBBOQuote
 
 
@@ -28,4 +30,60 @@ def infer_side(price: float, quote: NBBOQuote | None) -> SideInferenceResult:
     return SideInferenceResult(side="MID", epsilon=epsilon)
 
 
-__all__ = ["SideInferenceResult", "infer_side", "calculate_epsilon"]
+SIDE_MID = 0
+SIDE_BUY = 1
+SIDE_SELL = 2
+SIDE_LABELS = np.array(["MID", "BUY", "SELL"], dtype=object)
+
+
+def calculate_epsilons(bids: np.ndarray, asks: np.ndarray) -> np.ndarray:
+    """Vectorized ``calculate_epsilon``; mirrors ``max`` argument order so NaNs match too."""
+
+    diff = np.asarray(asks, dtype=np.float64) - np.asarray(bids, dtype=np.float64)
+    spread = np.where(0.0 > diff, 0.0, diff)
+    scaled = 0.05 * spread
+    return np.where(scaled > 0.01, scaled, 0.01)
+
+
+def infer_sides(
+    prices: np.ndarray,
+    bids: np.ndarray,
+    asks: np.ndarray,
+    missing: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Classify a batch of trades in one pass, matching ``infer_side`` row for row.
+
+    ``missing`` flags trades without a usable quote. Returns ``int8`` side codes
+    (``SIDE_MID``/``SIDE_BUY``/``SIDE_SELL``, see ``SIDE_LABELS``) and epsilons.
+    """
+
+    prices = np.asarray(prices, dtype=np.float64)
+    bids = np.asarray(bids, dtype=np.float64)
+    asks = np.asarray(asks, dtype=np.float64)
+    epsilons = calculate_epsilons(bids, asks)
+    buy = prices >= asks - epsilons
+    sell = ~buy & (prices <= bids + epsilons)
+    codes = np.where(buy, SIDE_BUY, np.where(sell, SIDE_SELL, SIDE_MID)).astype(np.int8)
+    if missing is not None:
+        missing = np.asarray(missing, dtype=np.bool_)
+        codes[missing] = SIDE_MID
+        epsilons = np.where(missing, 0.0, epsilons)
+    return codes, epsilons
+
+
+def side_labels(codes: np.ndarray) -> np.ndarray:
+    return SIDE_LABELS[codes]
+
+
+__all__ = [
+    "SIDE_BUY",
+    "SIDE_LABELS",
+    "SIDE_MID",
+    "SIDE_SELL",
+    "SideInferenceResult",
+    "calculate_epsilon",
+    "calculate_epsilons",
+    "infer_side",
+    "infer_sides",
+    "side_labels",
+]
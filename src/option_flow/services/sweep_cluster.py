@@ -1,33 +1,186 @@
 ﻿from __future__ import annotations
 
+import uuid
+from collections.abc import Hashable
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import numpy as np
+
+from option_flow.ingest.nbbo_cache import to_ns
 
 
 @dataclass
 class SweepState:
+    """Running totals of one sweep; timestamps are epoch nanoseconds."""
+
     sweep_id: str
-    timestamp: datetime
+    contract: Hashable
+    side: Hashable
+    first_ns: int
+    last_ns: int
+    fills: int = 0
+    contracts: int = 0
+    notional: float = 0.0
+
+    def extend(self, other: SweepState) -> SweepState:
+        """Fold another segment of the same sweep into these totals."""
+
+        self.first_ns = min(self.first_ns, other.first_ns)
+        self.last_ns = max(self.last_ns, other.last_ns)
+        self.fills += other.fills
+        self.contracts += other.contracts
+        self.notional += other.notional
+        return self
+
+
+@dataclass
+class SweepAssignment:
+    """Result of ``assign_batch``: per-row sweep ids and totals of every sweep touched."""
+
+    sweep_ids: np.ndarray
+    sweeps: list[SweepState]
 
 
 class SweepClusterer:
-    """Cluster trades into sweeps using a fixed time threshold."""
+    """Cluster trades into sweeps using a fixed time threshold.
 
-    def __init__(self, *, window_ms: int = 200) -> None:
-        self._window = timedelta(milliseconds=window_ms)
-        self._state: dict[tuple[str, str], SweepState] = {}
+    Sweep ids carry a random per-instance prefix so they stay unique across
+    restarts and processes. Keys idle for longer than the window are evicted,
+    which bounds memory to the contracts that traded recently.
+
+    A fill joins the open sweep of its key only if it lies within the window
+    of that sweep's span; an older, out-of-order fill (such as a backfilled
+    trade) opens a sweep of its own and leaves the open one in place.
+    """
+
+    def __init__(self, *, window_ms: int = 200, id_prefix: str | None = None) -> None:
+        self._window_ns = window_ms * 1_000_000
+        self._state: dict[tuple[Hashable, Hashable], SweepState] = {}
+        self._prefix = id_prefix or uuid.uuid4().hex[:12]
         self._counter = 0
+        self._evicted_through = 0
+
+    def __len__(self) -> int:
+        return len(self._state)
 
-    def assign(self, contract: str, side: str, timestamp: datetime) -> str:
+    def assign(
+        self,
+        contract: Hashable,
+        side: str,
+        timestamp: datetime,
+        *,
+        size: int = 0,
+        notional: float = 0.0,
+    ) -> str:
+        ts_ns = to_ns(timestamp)
         key = (contract, side)
         state = self._state.get(key)
-        if state and timestamp - state.timestamp <= self._window:
-            sweep_id = state.sweep_id
+        fill = SweepState("", contract, side, ts_ns, ts_ns, 1, size, notional)
+        if state and self._continues(state, fill):
+            fill = state.extend(fill)
         else:
-            self._counter += 1
-            sweep_id = f"sweep-{self._counter}"
-        self._state[key] = SweepState(sweep_id=sweep_id, timestamp=timestamp)
-        return sweep_id
+            fill.sweep_id = self._next_id()
+            if state is None or fill.last_ns >= state.last_ns:
+                self._state[key] = fill
+        self._maybe_evict(ts_ns)
+        return fill.sweep_id
+
+    def assign_batch(
+        self,
+        contracts: np.ndarray,
+        sides: np.ndarray,
+        timestamps_ns: np.ndarray,
+        *,
+        sizes: np.ndarray | None = None,
+        notional: np.ndarray | None = None,
+    ) -> SweepAssignment:
+        """Cluster a time-ordered micro-batch in one vectorized pass.
+
+        ``contracts`` and ``sides`` must be integer arrays (registry ids and side
+        codes); they key a separate state space from ``assign``. Rows are grouped
+        by ``(contract, side)`` and split wherever consecutive fills are more than
+        the window apart; the first segment of a group continues the open sweep
+        for that key when it starts within the window of that sweep's span.
+        """
+
+        contracts = np.asarray(contracts, dtype=np.int64)
+        count = len(contracts)
+        if not count:
+            return SweepAssignment(np.empty(0, dtype=object), [])
+        sides = np.asarray(sides, dtype=np.int64)
+        timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        sizes = np.zeros(count, np.int64) if sizes is None else np.asarray(sizes, np.int64)
+        notional = (
+            np.zeros(count, np.float64) if notional is None else np.asarray(notional, np.float64)
+        )
+
+        order = np.lexsort((timestamps_ns, sides, contracts))
+        c, s, t = contracts[order], sides[order], timestamps_ns[order]
+        new_group = np.ones(count, dtype=np.bool_)
+        new_group[1:] = (c[1:] != c[:-1]) | (s[1:] != s[:-1])
+        boundary = new_group.copy()
+        boundary[1:] |= (t[1:] - t[:-1]) > self._window_ns
+        seg_starts = np.flatnonzero(boundary)
+        seg_ends = np.append(seg_starts[1:], count) - 1
+        seg_fills = np.diff(np.append(seg_starts, count))
+        seg_sizes = np.add.reduceat(sizes[order], seg_starts)
+        seg_notional = np.add.reduceat(notional[order], seg_starts)
+        last_of_group = np.append(new_group[seg_starts][1:], True)
+
+        sweeps: list[SweepState] = []
+        for start, end, fills, size, value, closes in zip(
+            seg_starts.tolist(),
+            seg_ends.tolist(),
+            seg_fills.tolist(),
+            seg_sizes.tolist(),
+            seg_notional.tolist(),
+            last_of_group.tolist(),
+            strict=True,
+        ):
+            key = (int(c[start]), int(s[start]))
+            segment = SweepState(
+                "", key[0], key[1], int(t[start]), int(t[end]), fills, size, value
+            )
+            state = self._state.get(key) if new_group[start] else None
+            if state and self._continues(state, segment):
+                segment = state.extend(segment)
+            else:
+                segment.sweep_id = self._next_id()
+            if closes:
+                current = self._state.get(key)
+                if current is None or segment.last_ns >= current.last_ns:
+                    self._state[key] = segment
+            sweeps.append(segment)
+
+        seg_ids = np.array([sweep.sweep_id for sweep in sweeps], dtype=object)
+        sweep_ids = np.empty(count, dtype=object)
+        sweep_ids[order] = seg_ids[np.cumsum(boundary) - 1]
+        self._maybe_evict(int(t.max()))
+        return SweepAssignment(sweep_ids, sweeps)
+
+    def evict_idle(self, now_ns: int) -> list[SweepState]:
+        """Close sweeps whose last fill is more than one window before ``now_ns``."""
+
+        cutoff = now_ns - self._window_ns
+        idle = [key for key, state in self._state.items() if state.last_ns < cutoff]
+        self._evicted_through = now_ns
+        return [self._state.pop(key) for key in idle]
+
+    def _continues(self, state: SweepState, segment: SweepState) -> bool:
+        return (
+            state.first_ns - self._window_ns
+            <= segment.first_ns
+            <= state.last_ns + self._window_ns
+        )
+
+    def _maybe_evict(self, now_ns: int) -> None:
+        if now_ns - self._evicted_through > self._window_ns:
+            self.evict_idle(now_ns)
+
+    def _next_id(self) -> str:
+        self._counter += 1
+        return f"sweep-{self._prefix}-{self._counter}"
 
 
-__all__ = ["SweepClusterer", "SweepState"]
+__all__ = ["SweepAssignment", "SweepClusterer", "SweepState"]
@@ -0,0 +1,219 @@
+﻿from __future__ import annotations
+
+from datetime import datetime
+
+import pandas as pd
+
+from option_flow.services.contract_rollups import CONTRACT_ROLLUP_TABLE
+from option_flow.services.flow_rollups import FLOW_ROLLUP_TABLE, WindowPlan, plan_window
+from option_flow.services.rollup_levels import cover_rows
+from option_flow.storage.duckdb_client import get_pool, query_df
+from option_flow.storage.tiering import tiered_relation
+
+TOP_STRIKES = 3
+LEVEL_TOTALS = ("total_premium", "call_premium", "put_premium", "net_premium", "zero_dte_premium")
+
+
+def _flow_totals(
+    plan: WindowPlan, trades: str, call_put: str | None, zero_dte_only: bool
+) -> tuple[str, list[object]]:
+    """Filtered per-symbol totals from the call/put, 0DTE and notional flow minutes."""
+
+    flow_rows, params = plan.parts(
+        f"""
+        SELECT symbol, call_put, is_0dte, total_premium AS premium, buy_premium, sell_premium
+        FROM {FLOW_ROLLUP_TABLE}
+        """,
+        f"""
+        SELECT
+            symbol,
+            call_put,
+            is_0dte,
+            premium,
+            CASE WHEN side = 'BUY' THEN premium ELSE 0 END AS buy_premium,
+            CASE WHEN side = 'SELL' THEN premium ELSE 0 END AS sell_premium
+        FROM {trades}
+        """,
+    )
+    return (
+        f"""
+        SELECT
+            symbol,
+            SUM(premium) AS total_premium,
+            COALESCE(SUM(premium) FILTER (WHERE call_put = 'C'), 0) AS call_premium,
+            COALESCE(SUM(premium) FILTER (WHERE call_put = 'P'), 0) AS put_premium,
+            SUM(buy_premium) - SUM(sell_premium) AS net_premium,
+            COALESCE(SUM(premium) FILTER (WHERE is_0dte), 0) AS zero_dte_premium
+        FROM ({flow_rows})
+        WHERE COALESCE(call_put = ?, true) AND (is_0dte OR NOT ?)
+        GROUP BY symbol
+        """,
+        [*params, call_put, zero_dte_only],
+    )
+
+
+def _summed_totals(rows: str, params: list[object], trades: str) -> tuple[str, list[object]]:
+    """Per-symbol sums of ``rows`` (``LEVEL_TOTALS`` columns) plus trades in a bound range."""
+
+    return (
+        f"""
+        SELECT symbol, {", ".join(f"SUM({name}) AS {name}" for name in LEVEL_TOTALS)}
+        FROM (
+            {rows}
+            UNION ALL
+            SELECT
+                symbol,
+                premium,
+                CASE WHEN call_put = 'C' THEN premium ELSE 0 END,
+                CASE WHEN call_put = 'P' THEN premium ELSE 0 END,
+                CASE side WHEN 'BUY' THEN premium WHEN 'SELL' THEN -premium ELSE 0 END,
+                CASE WHEN is_0dte THEN premium ELSE 0 END
+            FROM {trades}
+            WHERE trade_ts_utc >= ? AND trade_ts_utc < ?
+        )
+        GROUP BY symbol
+        """,
+        params,
+    )
+
+
+def _level_totals(plan: WindowPlan, trades: str) -> tuple[str, list[object]]:
+    """Unfiltered per-symbol totals from the cascaded rollup levels.
+
+    Whole minutes come from the coarsest buckets that cover them, so a long
+    window reads hourly rows instead of every flow minute; the partial first
+    minute still comes from trades.
+    """
+
+    assert plan.rollup_from is not None
+    rows, params = cover_rows(plan.rollup_from, columns=LEVEL_TOTALS)
+    return _summed_totals(rows, [*params, plan.start, plan.rollup_from], trades)
+
+
+def top_flows(
+    start: datetime,
+    *,
+    call_put: str | None = None,
+    zero_dte_only: bool = False,
+    min_notional: float = 0.0,
+    strikes: int = TOP_STRIKES,
+) -> pd.DataFrame:
+    """``/top`` rows since ``start`` in one statement, ordered by absolute net premium.
+
+    Per-symbol totals and the ``strikes`` best contracts per symbol are both
+    aggregated in DuckDB; the filters are bound parameters, and only the
+    rollups-or-trades plan changes the statement. Without any filter the
+    totals are read from the cascaded rollup levels.
+    """
+
+    plan = plan_window(start, min_notional)
+    trades = tiered_relation("trades_labeled", since=start)
+    if call_put is None and not zero_dte_only and not min_notional:
+        totals = _level_totals(plan, trades)
+    else:
+        totals = _flow_totals(plan, trades, call_put, zero_dte_only)
+    return _top_rows(plan, trades, totals, call_put, zero_dte_only, strikes)
+
+
+def top_flows_from_totals(
+    start: datetime,
+    totals: pd.DataFrame,
+    totals_from: datetime,
+    *,
+    strikes: int = TOP_STRIKES,
+) -> pd.DataFrame:
+    """Unfiltered ``/top`` rows since ``start`` around per-symbol totals from ``totals_from`` on.
+
+    ``totals`` holds ``symbol`` and the ``LEVEL_TOTALS`` columns, e.g. from
+    :class:`~option_flow.services.window_engine.WindowEngine`, and is scanned
+    in place; the same statement adds the trades between ``start`` and
+    ``totals_from`` and ranks the strikes.
+    """
+
+    plan = plan_window(start)
+    trades = tiered_relation("trades_labeled", since=start)
+    summed = _summed_totals(
+        f"SELECT symbol, {', '.join(LEVEL_TOTALS)} FROM window_totals",
+        [start, totals_from],
+        trades,
+    )
+    frame = totals[["symbol", *LEVEL_TOTALS]]
+    return _top_rows(plan, trades, summed, None, False, strikes, window_totals=frame)
+
+
+def _top_rows(
+    plan: WindowPlan,
+    trades: str,
+    totals: tuple[str, list[object]],
+    call_put: str | None,
+    zero_dte_only: bool,
+    strikes: int,
+    **frames: pd.DataFrame,
+) -> pd.DataFrame:
+    totals_sql, totals_params = totals
+    strike_rows, strike_params = plan.parts(
+        f"""
+        SELECT symbol, contract_id, total_premium, zero_dte_premium
+        FROM {CONTRACT_ROLLUP_TABLE}
+        """,
+        f"""
+        SELECT
+            symbol,
+            contract_id,
+            premium AS total_premium,
+            CASE WHEN is_0dte THEN premium ELSE 0 END AS zero_dte_premium
+        FROM {trades}
+        """,
+    )
+    sql = f"""
+        WITH totals AS ({totals_sql}),
+        strike_rows AS ({strike_rows}),
+        ranked AS (
+            SELECT
+                s.symbol,
+                printf('%.2f%s (%s)', c.strike, c.call_put, c.expiry) AS label,
+                row_number() OVER (
+                    PARTITION BY s.symbol
+                    ORDER BY SUM(CASE WHEN ? THEN zero_dte_premium ELSE total_premium END) DESC,
+                        c.strike,
+                        c.expiry
+                ) AS rank
+            FROM strike_rows AS s
+            JOIN contracts AS c USING (contract_id)
+            WHERE COALESCE(c.call_put = ?, true)
+            GROUP BY s.symbol, c.expiry, c.strike, c.call_put
+            HAVING SUM(CASE WHEN ? THEN zero_dte_premium ELSE total_premium END) > 0
+            QUALIFY rank <= ?
+        ),
+        labels AS (
+            SELECT symbol, list(label ORDER BY rank) AS top_strikes FROM ranked GROUP BY symbol
+        )
+        SELECT
+            t.symbol,
+            t.net_premium,
+            t.total_premium,
+            t.call_premium,
+            t.put_premium,
+            CASE
+                WHEN t.total_premium <> 0 THEN t.zero_dte_premium / t.total_premium * 100.0
+                ELSE 0.0
+            END AS zero_dte_percent,
+            COALESCE(l.top_strikes, []) AS top_strikes
+        FROM totals AS t
+        LEFT JOIN labels AS l USING (symbol)
+        ORDER BY abs(t.net_premium) DESC, t.symbol
+        """
+    params = [*totals_params, *strike_params, zero_dte_only, call_put, zero_dte_only, strikes]
+    if not frames:
+        return query_df(sql, params)
+    with get_pool().cursor() as cur:
+        for name, frame in frames.items():
+            cur.register(name, frame)
+        try:
+            return cur.execute(sql, params).df()
+        finally:
+            for name in frames:
+                cur.unregister(name)
+
+
+__all__ = ["LEVEL_TOTALS", "TOP_STRIKES", "top_flows", "top_flows_from_totals"]
@@ -0,0 +1,200 @@
+﻿from __future__ import annotations
+
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from option_flow.services.minute_rollups import NS_PER_MINUTE, PREMIUM_METRICS
+
+WINDOW_MEASURES = (*PREMIUM_METRICS, "trades_count")
+
+
+def _utc_now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _minute_of(moment: datetime) -> int:
+    return int(pd.Timestamp(moment).as_unit("ns").value // NS_PER_MINUTE)
+
+
+class WindowEngine:
+    """Trailing-window totals per symbol from in-memory minute ring buffers.
+
+    Every symbol owns ``slots`` minute buckets of the ``rollups_min`` measures
+    and an exclusive running prefix over them, so the last ``n`` minutes of
+    every symbol are ``prefix[head] + values[head] - prefix[head - n + 1]``:
+    one vectorised step whatever the window. Buckets are set to the absolute
+    totals read from ``rollups_min``, so reading a row twice is harmless and
+    ``sync`` only has to fetch the rows upserted since the previous read.
+    """
+
+    def __init__(
+        self, slots: int, *, sync_interval_ms: int = 1_000, grace_ms: int = 5_000
+    ) -> None:
+        self._slots = slots
+        self._sync_interval = sync_interval_ms / 1_000
+        self._grace = timedelta(milliseconds=grace_ms)
+        self._index: dict[str, int] = {}
+        self._symbols: list[str] = []
+        self._values = np.zeros((0, slots, len(WINDOW_MEASURES)), dtype=np.float64)
+        self._prefix = np.zeros_like(self._values)
+        self._head: int | None = None
+        self._synced_to: datetime | None = None
+        self._synced_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    @property
+    def due(self) -> bool:
+        """Whether ``sync_interval_ms`` has passed since the last ``rebuild``/``sync``."""
+
+        return time.monotonic() - self._synced_at >= self._sync_interval
+
+    def rebuild(self, con: duckdb.DuckDBPyConnection, now: datetime | None = None) -> int:
+        """Reload the last ``slots`` minutes from ``rollups_min``; returns the buckets."""
+
+        now = now or _utc_now()
+        with self._lock:
+            self._index.clear()
+            self._symbols.clear()
+            self._values = np.zeros((0, self._slots, len(WINDOW_MEASURES)), dtype=np.float64)
+            self._prefix = np.zeros_like(self._values)
+            self._head = _minute_of(now)
+            self._synced_to = None
+            return self._read(con, "TRUE", [])
+
+    def sync(self, con: duckdb.DuckDBPyConnection) -> int:
+        """Apply ``rollups_min`` rows updated since the last read; returns the buckets.
+
+        Rows updated within ``grace_ms`` before the newest one seen are read
+        again, so a writer that committed behind it is not missed. ``updated_at``
+        is naive UTC; a row stamped ahead of the UTC clock does not move the
+        mark past it. The first sync of an engine that was never rebuilt loads
+        the whole ring.
+        """
+
+        with self._lock:
+            if self._head is None:
+                self._head = _minute_of(_utc_now())
+            if self._synced_to is None:
+                return self._read(con, "TRUE", [])
+            return self._read(con, "updated_at >= ?", [self._synced_to - self._grace])
+
+    def load(self, rows: pd.DataFrame) -> None:
+        """Set buckets to the totals of ``rollups_min`` rows within the ring."""
+
+        with self._lock:
+            self._load(rows)
+
+    def totals(self, minutes: int, now: datetime | None = None) -> pd.DataFrame:
+        """Per-symbol totals of the last ``minutes`` minute buckets, the current one included.
+
+        Symbols without trades in the window are left out.
+        """
+
+        if not 0 < minutes <= self._slots:
+            raise ValueError(f"window of {minutes} minutes outside 1..{self._slots}")
+        with self._lock:
+            self._advance(_minute_of(now or _utc_now()))
+            assert self._head is not None
+            head = self._head % self._slots
+            first = (head - minutes + 1) % self._slots
+            sums = self._prefix[:, head] + self._values[:, head] - self._prefix[:, first]
+            symbols = list(self._symbols)
+        frame = pd.DataFrame(sums, columns=list(WINDOW_MEASURES))
+        frame.insert(0, "symbol", symbols)
+        frame["trades_count"] = frame["trades_count"].round().astype(np.int64)
+        frame["net_premium"] = frame["buy_premium"] - frame["sell_premium"]
+        return frame[frame["trades_count"] > 0].reset_index(drop=True)
+
+    @staticmethod
+    def first_bucket(minutes: int, now: datetime | None = None) -> datetime:
+        """Start of the oldest minute bucket ``totals(minutes, now)`` sums."""
+
+        first = _minute_of(now or _utc_now()) - minutes + 1
+        return pd.Timestamp(first * NS_PER_MINUTE).to_pydatetime()
+
+    def _read(self, con: duckdb.DuckDBPyConnection, where: str, params: list[object]) -> int:
+        assert self._head is not None
+        oldest = (self._head - self._slots + 1) * NS_PER_MINUTE
+        rows = con.execute(
+            f"""
+            SELECT symbol, minute_bucket, {", ".join(WINDOW_MEASURES)}, updated_at
+            FROM rollups_min
+            WHERE minute_bucket >= ? AND {where}
+            """,
+            [pd.Timestamp(oldest).to_pydatetime(), *params],
+        ).df()
+        self._synced_at = time.monotonic()
+        if rows.empty:
+            return 0
+        self._load(rows)
+        newest = pd.Timestamp(rows["updated_at"].max()).to_pydatetime()
+        self._synced_to = min(max(self._synced_to or newest, newest), _utc_now())
+        return len(rows)
+
+    def _load(self, rows: pd.DataFrame) -> None:
+        if rows.empty:
+            return
+        minutes = pd.DatetimeIndex(rows["minute_bucket"]).as_unit("ns").asi8 // NS_PER_MINUTE
+        self._advance(int(minutes.max()))
+        assert self._head is not None
+        keep = self._head - minutes < self._slots
+        symbols = rows["symbol"].to_numpy()[keep]
+        totals = rows[list(WINDOW_MEASURES)].to_numpy(dtype=np.float64)[keep]
+        indices = np.fromiter((self._row(symbol) for symbol in symbols), np.int64, len(symbols))
+        slots = (minutes[keep] % self._slots).astype(np.int64)
+        self._values[indices, slots] = totals
+        # Recompute the exclusive prefix of every touched symbol, oldest slot first.
+        touched = np.unique(indices)
+        order = (self._head + 1 + np.arange(self._slots)) % self._slots
+        values = self._values[touched][:, order]
+        self._prefix[touched[:, None], order] = np.cumsum(values, axis=1) - values
+
+    def _advance(self, minute: int) -> None:
+        """Move the head to ``minute``, clearing the buckets it passes and rebasing the prefix."""
+
+        if self._head is None:
+            self._head = minute
+            return
+        steps = minute - self._head
+        if steps <= 0:
+            return
+        if steps >= self._slots:
+            self._values[:] = 0.0
+            self._prefix[:] = 0.0
+            self._head = minute
+            return
+        previous = self._head % self._slots
+        carry = self._prefix[:, previous] + self._values[:, previous]
+        cleared = (self._head + np.arange(1, steps + 1)) % self._slots
+        self._values[:, cleared] = 0.0
+        self._prefix[:, cleared] = carry[:, None]
+        self._head = minute
+        oldest = (minute + 1) % self._slots
+        self._prefix -= self._prefix[:, oldest][:, None]
+
+    def _row(self, symbol: str) -> int:
+        index = self._index.get(symbol)
+        if index is not None:
+            return index
+        index = len(self._symbols)
+        self._index[symbol] = index
+        self._symbols.append(symbol)
+        blank = np.zeros((1, self._slots, len(WINDOW_MEASURES)), dtype=np.float64)
+        self._values = np.concatenate((self._values, blank))
+        self._prefix = np.concatenate((self._prefix, blank))
+        return index
+
+
+__all__ = ["WINDOW_MEASURES", "WindowEngine"]
@@ -1,18 +1,192 @@
 ﻿from __future__ import annotations
 
-from collections.abc import Mapping, Sequence
+import os
+import threading
+from collections.abc import Callable, Mapping, Sequence
 from contextlib import contextmanager
+from pathlib import Path
 from typing import Any, Iterator
 
 import duckdb
 import pandas as pd
+import pyarrow as pa
 
 from option_flow.config.settings import get_settings
 
+RECONNECT_ERRORS = (duckdb.ConnectionException, duckdb.IOException)
+# Naive UTC, like the timestamps the ingest writes; a bare now() is session-local time.
+UTC_NOW_SQL = "(now() AT TIME ZONE 'UTC')"
+
+
+def _file_identity(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class ConnectionPool:
+    """Long-lived read connection handing out up to ``size`` cursors at a time.
+
+    Every thread reuses its own cursor on one shared database instance, so
+    reads skip connection setup and catalog loading (a fresh connect costs
+    about 25 ms against about 1 ms for a small rollup query on a held
+    handle). Even a read-only handle holds DuckDB's file lock, which keeps
+    any other process from opening the file read-write; serve a snapshot
+    copy (``read_snapshot_path``) while ingest runs, or pass
+    ``hold_open=False`` to close the handle whenever the last cursor is
+    returned. Before each checkout the pool checks that the database file is
+    still the one it opened and reconnects if it was swapped.
+    """
+
+    def __init__(
+        self,
+        database: Path | str,
+        *,
+        size: int = 4,
+        read_only: bool = True,
+        hold_open: bool = True,
+    ) -> None:
+        if size <= 0:
+            raise ValueError("size must be positive")
+        self.database = Path(database)
+        self.size = size
+        self._read_only = read_only
+        self._hold_open = hold_open
+        self._active = 0
+        self._lock = threading.Lock()
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._cursors: list[duckdb.DuckDBPyConnection] = []
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(size)
+        self._generation = 0
+        self._identity: tuple[int, int] | None = None
+        self.reconnects = 0
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        with self._slots:
+            cur, generation, owned = self._checkout()
+            broken = False
+            try:
+                yield cur
+            except RECONNECT_ERRORS:
+                broken = True
+                raise
+            finally:
+                if broken:
+                    cur.close()
+                    self.reset()
+                self._checkin(cur, generation, owned=owned, reuse=not broken)
+
+    def healthy(self) -> bool:
+        try:
+            with self.cursor() as cur:
+                cur.execute("SELECT 1").fetchone()
+        except duckdb.Error:
+            return False
+        return True
+
+    def reset(self) -> None:
+        """Drop the current connection; the next checkout reconnects."""
+
+        with self._lock:
+            self._close_locked()
+            self.reconnects += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _checkout(self) -> tuple[duckdb.DuckDBPyConnection, int, bool]:
+        """Return this thread's cursor, or a one-off cursor for a nested checkout."""
+
+        with self._lock:
+            if self._con is not None and _file_identity(self.database) != self._identity:
+                self._close_locked()
+                self.reconnects += 1
+            if self._con is None:
+                self._con = duckdb.connect(str(self.database), read_only=self._read_only)
+                self._identity = _file_identity(self.database)
+            local = self._local
+            self._active += 1
+            if getattr(local, "generation", None) != self._generation:
+                local.cursor = self._con.cursor()
+                local.generation = self._generation
+                local.busy = False
+                self._cursors.append(local.cursor)
+            if local.busy:
+                return self._con.cursor(), self._generation, False
+            local.busy = True
+            return local.cursor, self._generation, True
+
+    def _checkin(
+        self, cur: duckdb.DuckDBPyConnection, generation: int, *, owned: bool, reuse: bool
+    ) -> None:
+        with self._lock:
+            self._active -= 1
+            if owned:
+                self._local.busy = False
+            current = generation == self._generation and self._con is not None
+            if current and self._active == 0 and not self._hold_open:
+                self._close_locked()
+            elif current and owned and reuse:
+                return
+        if reuse:
+            cur.close()
+
+    def _close_locked(self) -> None:
+        for cur in self._cursors:
+            cur.close()
+        self._cursors.clear()
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+        self._identity = None
+        self._generation += 1
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide read pool (rebuilt if the path changes).
+
+    Reads ``read_snapshot_path`` when it is set, otherwise the live database.
+    """
+
+    global _pool
+    settings = get_settings()
+    database = Path(settings.read_snapshot_path or settings.duckdb_path)
+    with _pool_lock:
+        if _pool is None or _pool.database != database:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(
+                database,
+                size=settings.read_pool_size,
+                hold_open=settings.read_pool_hold_open,
+            )
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 
 @contextmanager
 def get_connection(read_only: bool = True) -> Iterator[duckdb.DuckDBPyConnection]:
     settings = get_settings()
+    if not read_only:
+        # DuckDB refuses a read-write connection while this process holds the
+        # file open read-only, so release the pool first; it reopens lazily.
+        close_pool()
     con = duckdb.connect(str(settings.duckdb_path), read_only=read_only)
     try:
         yield con
@@ -20,12 +194,114 @@ def get_connection(read_only: bool = True) -> Iterator[duckdb.DuckDBPyConnection
         con.close()
 
 
+def _pooled_query(
+    sql: str,
+    params: Mapping[str, Any] | Sequence[Any] | None,
+    fetch: Callable[[duckdb.DuckDBPyConnection], Any],
+) -> Any:
+    if params is not None and not isinstance(params, Mapping):
+        params = list(params)
+    pool = get_pool()
+
+    def run() -> Any:
+        with pool.cursor() as cur:
+            return fetch(cur.execute(sql) if params is None else cur.execute(sql, params))
+
+    try:
+        return run()
+    except RECONNECT_ERRORS:
+        # The pool has dropped the broken connection; retry once on a fresh one.
+        return run()
+
+
+def _fetch_arrow(result: duckdb.DuckDBPyConnection) -> pa.Table:
+    table = result.arrow()
+    return table.read_all() if isinstance(table, pa.RecordBatchReader) else table
+
+
 def query_df(sql: str, params: Mapping[str, Any] | Sequence[Any] | None = None) -> pd.DataFrame:
-    with get_connection(read_only=True) as con:
-        if params is None:
-            result = con.execute(sql)
-        elif isinstance(params, Mapping):
-            result = con.execute(sql, params)
-        else:
-            result = con.execute(sql, list(params))
-        return result.df()
+    return _pooled_query(sql, params, lambda result: result.df())
+
+
+def query_arrow(sql: str, params: Mapping[str, Any] | Sequence[Any] | None = None) -> pa.Table:
+    """Like ``query_df`` but returns an Arrow table, skipping pandas conversion."""
+
+    return _pooled_query(sql, params, _fetch_arrow)
+
+
+def append_df(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    df: pd.DataFrame,
+    *,
+    ignore_conflicts: bool = True,
+    order_by: str | None = None,
+) -> int:
+    """Append a DataFrame in one set-based INSERT instead of row-by-row statements.
+
+    ``order_by`` sorts the batch on the way in so that appended row groups
+    cover narrow ranges of that column.
+    """
+
+    if df.empty:
+        return 0
+    view = f"_append_{table}"
+    columns = ", ".join(df.columns)
+    verb = "INSERT OR IGNORE INTO" if ignore_conflicts else "INSERT INTO"
+    order = f" ORDER BY {order_by}" if order_by else ""
+    con.register(view, df)
+    try:
+        con.execute(f"{verb} {table} ({columns}) SELECT {columns} FROM {view}{order}")
+    finally:
+        con.unregister(view)
+    return len(df)
+
+
+def accumulate_df(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    df: pd.DataFrame,
+    *,
+    keys: Sequence[str],
+    replace: Sequence[str] = ("updated_at",),
+) -> int:
+    """Add delta rows onto existing rows by primary key (insert new keys as they are).
+
+    Columns in ``replace`` are overwritten instead of summed.
+    """
+
+    if df.empty:
+        return 0
+    view = f"_accumulate_{table}"
+    columns = ", ".join(df.columns)
+    updates = ", ".join(
+        f"{column} = excluded.{column}"
+        if column in replace
+        else f"{column} = {table}.{column} + excluded.{column}"
+        for column in df.columns
+        if column not in keys
+    )
+    con.register(view, df)
+    try:
+        con.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {view} "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+        )
+    finally:
+        con.unregister(view)
+    return len(df)
+
+
+def upsert_df(con: duckdb.DuckDBPyConnection, table: str, df: pd.DataFrame) -> int:
+    """Insert or replace rows by primary key, for tables holding running aggregates."""
+
+    if df.empty:
+        return 0
+    view = f"_upsert_{table}"
+    columns = ", ".join(df.columns)
+    con.register(view, df)
+    try:
+        con.execute(f"INSERT OR REPLACE INTO {table} ({columns}) SELECT {columns} FROM {view}")
+    finally:
+        con.unregister(view)
+    return len(df)
@@ -0,0 +1,216 @@
+﻿from __future__ import annotations
+
+import json
+import re
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import duckdb
+
+from option_flow.config.settings import get_settings
+
+CLUSTERED_TABLES = ("trades_raw", "trades_labeled")
+CLUSTER_ORDER = ("trade_ts_utc", "symbol")
+BENCH_WINDOWS = (5, 15, 30, 60, 560)
+
+
+def disorder(con: duckdb.DuckDBPyConnection, table: str, column: str = CLUSTER_ORDER[0]) -> float:
+    """Fraction of physically adjacent rows whose ``column`` goes backwards."""
+
+    row = con.execute(
+        f"""
+        SELECT COALESCE(avg(CASE WHEN {column} < previous THEN 1.0 ELSE 0.0 END), 0.0)
+        FROM (SELECT {column}, lag({column}) OVER (ORDER BY rowid) AS previous FROM {table})
+        """
+    ).fetchone()
+    return float(row[0]) if row else 0.0
+
+
+def late_floor(con: duckdb.DuckDBPyConnection, table: str, column: str = CLUSTER_ORDER[0]) -> Any:
+    """Lowest ``column`` among rows that go backwards from the row stored before them.
+
+    Rows below it are already in physical order, so re-sorting the rows from
+    it onwards orders the whole table. ``None`` when nothing goes backwards.
+    """
+
+    row = con.execute(
+        f"""
+        SELECT min({column})
+        FROM (SELECT {column}, lag({column}) OVER (ORDER BY rowid) AS previous FROM {table})
+        WHERE {column} < previous
+        """
+    ).fetchone()
+    return row[0] if row else None
+
+
+def recluster(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    order_by: Sequence[str] = CLUSTER_ORDER,
+    *,
+    since: Any = None,
+) -> int:
+    """Rewrite ``table`` sorted by ``order_by``; returns the rows rewritten.
+
+    With ``since`` only the rows whose first ``order_by`` column is at least
+    ``since`` are deleted and appended back in order, which sorts the table
+    when ``since`` is its :func:`late_floor`. When that tail is most of the
+    table, or without ``since``, the sorted copy is built in a fresh table with
+    the same DDL and swapped in, which is far cheaper than deleting and
+    reinserting every key in place. Call it inside a transaction (a writer op)
+    so readers never see the rewrite.
+    """
+
+    order = ", ".join(order_by)
+    if since is not None:
+        row = con.execute(
+            f"SELECT COUNT(*), count_if({order_by[0]} >= ?) FROM {table}", [since]
+        ).fetchone()
+        total, tail = row if row else (0, 0)
+        if tail * 2 <= total:
+            tail_table = f"{table}__tail"
+            con.execute(
+                f"CREATE OR REPLACE TEMP TABLE {tail_table} AS "
+                f"SELECT * FROM {table} WHERE {order_by[0]} >= ?",
+                [since],
+            )
+            con.execute(f"DELETE FROM {table} WHERE {order_by[0]} >= ?", [since])
+            con.execute(f"INSERT INTO {table} SELECT * FROM {tail_table} ORDER BY {order}")
+            con.execute(f"DROP TABLE {tail_table}")
+            return int(tail)
+
+    row = con.execute(
+        "SELECT sql FROM duckdb_tables() WHERE table_name = ? AND schema_name = 'main'", [table]
+    ).fetchone()
+    if row is None:
+        raise ValueError(f"unknown table {table!r}")
+    ddl = row[0]
+    staging = f"{table}__recluster"
+    con.execute(f"DROP TABLE IF EXISTS {staging}")
+    con.execute(re.sub(rf"^CREATE TABLE {table}\b", f"CREATE TABLE {staging}", ddl, count=1))
+    con.execute(f"INSERT INTO {staging} SELECT * FROM {table} ORDER BY {order}")
+    con.execute(f"DROP TABLE {table}")
+    con.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+    row = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    return int(row[0]) if row else 0
+
+
+class ReclusterJob:
+    """Re-sort the hot trade tables by (time, symbol) once they drift out of order.
+
+    Appends are sorted per batch, so drift only comes from late or backfilled
+    trades; a table is re-sorted when more than ``min_disorder`` of its
+    adjacent rows are out of time order. Only the rows from its
+    :func:`late_floor` on are rewritten, and closed days have already been
+    tiered out of the hot tables, so a pass touches the recent tail rather
+    than the whole table.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_disorder: float | None = None,
+        tables: tuple[str, ...] = CLUSTERED_TABLES,
+    ) -> None:
+        if min_disorder is None:
+            min_disorder = get_settings().recluster_min_disorder
+        self.min_disorder = min_disorder
+        self.tables = tables
+
+    def write_op(self, con: duckdb.DuckDBPyConnection) -> int:
+        """``DuckDBWriter`` op: recluster every drifted table; returns the rows rewritten."""
+
+        return sum(
+            recluster(con, table, since=late_floor(con, table))
+            for table in self.tables
+            if disorder(con, table) > self.min_disorder
+        )
+
+
+def rows_scanned(
+    con: duckdb.DuckDBPyConnection, sql: str, params: Sequence[Any] | None = None
+) -> int:
+    """Rows the table scans of ``sql`` actually read, after zonemap pruning."""
+
+    con.execute("PRAGMA enable_profiling = 'no_output'")
+    con.execute("""SET custom_profiling_settings = '{"OPERATOR_ROWS_SCANNED": "true"}'""")
+    try:
+        con.execute(sql, list(params or [])).fetchall()
+        profile = json.loads(con.get_profiling_information(format="json"))
+    finally:
+        con.execute("PRAGMA disable_profiling")
+
+    def scanned(node: dict[str, Any]) -> int:
+        is_scan = node.get("operator_type") == "TABLE_SCAN"
+        own = node.get("operator_rows_scanned", 0) if is_scan else 0
+        return own + sum(scanned(child) for child in node.get("children", []))
+
+    return scanned(profile)
+
+
+@dataclass
+class PruningResult:
+    window_minutes: int
+    matched: int
+    scanned: int
+    total: int
+    elapsed_ms: float
+
+
+def pruning_report(
+    con: duckdb.DuckDBPyConnection,
+    table: str = "trades_labeled",
+    windows: Sequence[int] = BENCH_WINDOWS,
+) -> list[PruningResult]:
+    """Run the API's window filter for each window, anchored at the newest trade."""
+
+    row = con.execute(f"SELECT COUNT(*), max(trade_ts_utc) FROM {table}").fetchone()
+    total, newest = row if row else (0, None)
+    results = []
+    for minutes in windows:
+        sql = (
+            f"SELECT COUNT(*) FROM {table} "
+            f"WHERE trade_ts_utc >= CAST(? AS TIMESTAMP) - INTERVAL {int(minutes)} MINUTE"
+        )
+        started = time.perf_counter()
+        row = con.execute(sql, [newest]).fetchone()
+        matched = row[0] if row else 0
+        elapsed = (time.perf_counter() - started) * 1000
+        scanned = rows_scanned(con, sql, [newest])
+        results.append(PruningResult(minutes, int(matched), scanned, int(total), elapsed))
+    return results
+
+
+def main() -> None:
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path), read_only=True)
+    try:
+        for table in CLUSTERED_TABLES:
+            print(f"{table}: disorder {disorder(con, table):.2%}")
+        for result in pruning_report(con):
+            print(
+                f"{result.window_minutes:>4}m window: {result.matched:>10} matched, "
+                f"{result.scanned:>10} scanned of {result.total} rows "
+                f"in {result.elapsed_ms:.1f} ms"
+            )
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "CLUSTERED_TABLES",
+    "CLUSTER_ORDER",
+    "PruningResult",
+    "ReclusterJob",
+    "disorder",
+    "late_floor",
+    "pruning_report",
+    "recluster",
+    "rows_scanned",
+]
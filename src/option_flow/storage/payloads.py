@@ -0,0 +1,70 @@
+﻿from __future__ import annotations
+
+import json
+import uuid
+import zlib
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+PAYLOAD_TABLE = "raw_payloads"
+COMPRESSION_LEVEL = 6
+
+
+def compress_payloads(payloads: Sequence[str]) -> bytes:
+    """Pack JSON payloads into one zlib block; shared keys compress far better per batch."""
+
+    return zlib.compress("\n".join(payloads).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress_payloads(blob: bytes) -> list[str]:
+    text = zlib.decompress(blob).decode("utf-8")
+    return text.split("\n") if text else []
+
+
+def payload_frame(payloads: Sequence[str], timestamps: pd.Series | np.ndarray) -> pd.DataFrame:
+    """One ``raw_payloads`` row holding a whole batch of vendor payloads."""
+
+    if not len(payloads):
+        return pd.DataFrame(
+            columns=["batch_id", "first_ts_utc", "last_ts_utc", "trades", "payload"]
+        )
+    stamps = pd.DatetimeIndex(timestamps)
+    return pd.DataFrame(
+        {
+            "batch_id": [uuid.uuid4().hex],
+            "first_ts_utc": [stamps.min()],
+            "last_ts_utc": [stamps.max()],
+            "trades": [len(payloads)],
+            "payload": [compress_payloads(payloads)],
+        }
+    )
+
+
+def load_payloads(
+    con: duckdb.DuckDBPyConnection, start: datetime, end: datetime
+) -> list[dict[str, Any]]:
+    """Decoded vendor payloads of every batch overlapping ``[start, end)``."""
+
+    rows = con.execute(
+        f"""
+        SELECT payload FROM {PAYLOAD_TABLE}
+        WHERE last_ts_utc >= ? AND first_ts_utc < ?
+        ORDER BY first_ts_utc
+        """,
+        [start, end],
+    ).fetchall()
+    return [json.loads(line) for (blob,) in rows for line in decompress_payloads(blob)]
+
+
+__all__ = [
+    "PAYLOAD_TABLE",
+    "compress_payloads",
+    "decompress_payloads",
+    "load_payloads",
+    "payload_frame",
+]
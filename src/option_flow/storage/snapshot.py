@@ -0,0 +1,48 @@
+﻿from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import duckdb
+
+from option_flow.config.settings import get_settings
+
+
+class SnapshotJob:
+    """Publish a read-only copy of the live database for the API to read.
+
+    DuckDB lets one process hold a file read-write or any number hold it
+    read-only, so while the ingest writer runs the API reads this copy with
+    a long-lived handle instead. Each run copies every table into a fresh file
+    next to ``path`` and renames it into place; the API's read pool notices
+    the new file and reconnects. The copy must run outside the writer's group
+    transaction (``DuckDBWriter.submit(..., transaction=False)``) because it
+    writes to a second, attached database.
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        path = path or get_settings().read_snapshot_path
+        if path is None:
+            raise ValueError("no snapshot path configured (OPTION_FLOW_READ_SNAPSHOT_PATH)")
+        self.path = Path(path)
+
+    def write_op(self, con: duckdb.DuckDBPyConnection) -> int:
+        """``DuckDBWriter`` op: copy the database and swap the snapshot in; returns 1."""
+
+        staging = self.path.with_name(f".{self.path.name}.staging")
+        for leftover in (staging, staging.with_name(f"{staging.name}.wal")):
+            leftover.unlink(missing_ok=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        row = con.execute("SELECT current_database()").fetchone()
+        assert row is not None
+        quoted = str(staging).replace("'", "''")
+        con.execute(f"ATTACH '{quoted}' AS read_snapshot")
+        try:
+            con.execute(f'COPY FROM DATABASE "{row[0]}" TO read_snapshot')
+        finally:
+            con.execute("DETACH read_snapshot")
+        os.replace(staging, self.path)
+        return 1
+
+
+__all__ = ["SnapshotJob"]
@@ -0,0 +1,290 @@
+﻿from __future__ import annotations
+
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from pathlib import Path
+
+import duckdb
+
+from option_flow.config.settings import get_settings
+
+
+@dataclass(frozen=True)
+class TierSpec:
+    """How a hot table splits into daily cold partitions.
+
+    ``time_column`` assigns rows to a UTC day, ``key`` deduplicates a day's
+    hot and cold rows (keeping the first in ``keep_first`` order), and
+    ``by_symbol`` adds a ``symbol=`` level below each day.
+    """
+
+    time_column: str
+    key: str
+    keep_first: str
+    by_symbol: bool = True
+
+    @property
+    def files(self) -> str:
+        return "symbol=*/*.parquet" if self.by_symbol else "*.parquet"
+
+
+TIER_SPECS = {
+    "trades_raw": TierSpec("trade_ts_utc", "vendor_trade_id", "ingest_ts"),
+    "trades_labeled": TierSpec("trade_ts_utc", "vendor_trade_id", "ingest_ts"),
+    "nbbo_at_trade": TierSpec("nbbo_ts", "vendor_trade_id", "nbbo_ts", by_symbol=False),
+    "raw_payloads": TierSpec("first_ts_utc", "batch_id", "first_ts_utc", by_symbol=False),
+    # Sweep rows are running totals, so the latest upsert wins.
+    "sweeps": TierSpec("first_ts_utc", "sweep_id", "updated_at DESC"),
+}
+TIERED_TABLES = tuple(TIER_SPECS)
+
+
+def _utc_today() -> date:
+    return datetime.now(UTC).date()
+
+
+def _sql_path(path: Path) -> str:
+    return path.as_posix().replace("'", "''")
+
+
+def cold_glob(table: str, cold_path: Path | None = None) -> Path:
+    root = cold_path or get_settings().cold_storage_path
+    return root / table / "trade_date=*" / TIER_SPECS[table].files
+
+
+def has_cold_data(table: str, cold_path: Path | None = None) -> bool:
+    root = (cold_path or get_settings().cold_storage_path) / table
+    return root.exists() and any(root.glob(f"trade_date=*/{TIER_SPECS[table].files}"))
+
+
+def tiered_relation(
+    table: str, *, since: datetime | None = None, cold_path: Path | None = None
+) -> str:
+    """SQL relation over the hot table plus its cold Parquet partitions.
+
+    Cold partitions are only read when ``since`` reaches back before today
+    (UTC) and are pruned to ``trade_date >= since``; intraday windows therefore
+    touch the hot table alone.
+    """
+
+    if not has_cold_data(table, cold_path):
+        return table
+    if since is not None and since.date() >= _utc_today():
+        return table
+    source = (
+        f"read_parquet('{_sql_path(cold_glob(table, cold_path))}', hive_partitioning = true)"
+    )
+    cold = f"SELECT * EXCLUDE (trade_date) FROM {source}"
+    if since is not None:
+        cold += f" WHERE trade_date >= DATE '{since.date().isoformat()}'"
+    return f"(SELECT * FROM {table} UNION ALL BY NAME {cold}) AS {table}"
+
+
+@dataclass
+class TieringReport:
+    moved_days: list[date] = field(default_factory=list)
+    moved_rows: int = 0
+    dropped_partitions: int = 0
+
+
+class TieringJob:
+    """Move closed trading days from the hot DuckDB tables into daily Parquet.
+
+    Partitions are hive-style ``<table>/trade_date=YYYY-MM-DD/symbol=XYZ``
+    (without the symbol level for ``nbbo_at_trade`` and ``raw_payloads``; see
+    :data:`TIER_SPECS`). A day is closed once its UTC date is before today; US
+    option sessions fall within a single UTC date. Each move rewrites the
+    whole day partition from the hot rows plus anything already cold for that
+    day, deduplicated and time-ordered, so late rows are merged and partitions
+    stay compacted to one file per underlying.
+
+    :meth:`run` only stages the rewrite: it writes the Parquet under
+    ``.staging``, deletes the hot rows and records the day in
+    ``tiering_pending``, all inside the caller's transaction. :meth:`publish`
+    swaps staged partitions in once that transaction has committed, so a
+    rolled-back run never leaves a day both hot and cold. A crash between the
+    two is finished by the next :meth:`run`, which publishes what is pending
+    and discards staging left by runs that never committed.
+    """
+
+    def __init__(
+        self,
+        *,
+        cold_path: Path | None = None,
+        retention_days: int | None = None,
+        tables: tuple[str, ...] = TIERED_TABLES,
+    ) -> None:
+        settings = get_settings()
+        self.cold_path = Path(cold_path or settings.cold_storage_path)
+        self.retention_days = (
+            retention_days if retention_days is not None else settings.cold_retention_days
+        )
+        self.tables = tables
+
+    def closed_days(self, con: duckdb.DuckDBPyConnection, today: date | None = None) -> list[date]:
+        today = today or _utc_today()
+        days: set[date] = set()
+        for table in self.tables:
+            column = TIER_SPECS[table].time_column
+            rows = con.execute(
+                f"SELECT DISTINCT CAST({column} AS DATE) FROM {table} "
+                f"WHERE {column} < CAST(? AS TIMESTAMP)",
+                [today],
+            ).fetchall()
+            days.update(row[0] for row in rows)
+        return sorted(days)
+
+    def run(self, con: duckdb.DuckDBPyConnection, today: date | None = None) -> TieringReport:
+        """Stage every closed day and enforce retention; usable as a writer op.
+
+        Days already past retention are deleted from the hot tables without
+        being written cold. Call :meth:`publish` after the transaction commits.
+        """
+
+        today = today or _utc_today()
+        report = TieringReport()
+        self.publish(con)
+        shutil.rmtree(self.cold_path / ".staging", ignore_errors=True)
+        cutoff = today - timedelta(days=self.retention_days) if self.retention_days else None
+        for day in self.closed_days(con, today):
+            expired = cutoff is not None and day < cutoff
+            moved = [self.move_day(con, table, day, expired=expired) for table in self.tables]
+            report.moved_rows += sum(moved)
+            report.moved_days.append(day)
+            if expired:
+                report.dropped_partitions += sum(1 for rows in moved if rows)
+        report.dropped_partitions += self.enforce_retention(today)
+        return report
+
+    def write_op(self, con: duckdb.DuckDBPyConnection) -> int:
+        """``DuckDBWriter`` op form of :meth:`run`; returns the rows moved."""
+
+        return self.run(con).moved_rows
+
+    def publish(self, con: duckdb.DuckDBPyConnection) -> int:
+        """Swap committed staged partitions into place; returns the partitions published.
+
+        Idempotent: a marker whose staging is already gone was published before.
+        """
+
+        pending = con.execute(
+            "SELECT table_name, trade_date, staging FROM tiering_pending"
+        ).fetchall()
+        for table, day, name in pending:
+            partition = self.cold_path / table / f"trade_date={day.isoformat()}"
+            staging = self.cold_path / ".staging" / name
+            if staging.exists():
+                if partition.exists():
+                    shutil.rmtree(partition)
+                partition.parent.mkdir(parents=True, exist_ok=True)
+                staging.rename(partition)
+            con.execute(
+                "DELETE FROM tiering_pending WHERE table_name = ? AND trade_date = ?",
+                [table, day],
+            )
+        return len(pending)
+
+    def move_day(
+        self, con: duckdb.DuckDBPyConnection, table: str, day: date, *, expired: bool = False
+    ) -> int:
+        spec = TIER_SPECS[table]
+        start = datetime.combine(day, datetime.min.time())
+        window = (
+            f"{spec.time_column} >= TIMESTAMP '{start.isoformat(sep=' ')}' AND "
+            f"{spec.time_column} < TIMESTAMP '{(start + timedelta(days=1)).isoformat(sep=' ')}'"
+        )
+        row = con.execute(f"SELECT COUNT(*) FROM {table} WHERE {window}").fetchone()
+        count = row[0] if row else 0
+        if not count:
+            return 0
+        if expired:
+            con.execute(f"DELETE FROM {table} WHERE {window}")
+            return int(count)
+        partition = self.cold_path / table / f"trade_date={day.isoformat()}"
+        staging = self.cold_path / ".staging" / f"{table}-{day.isoformat()}-{uuid.uuid4().hex}"
+        staging.parent.mkdir(parents=True, exist_ok=True)
+        rows = f"SELECT * FROM {table} WHERE {window}"
+        if any(partition.glob(spec.files)):
+            existing = _sql_path(partition / spec.files)
+            rows += (
+                " UNION ALL BY NAME SELECT * EXCLUDE (trade_date) "
+                f"FROM read_parquet('{existing}', hive_partitioning = true)"
+            )
+        if spec.by_symbol:
+            order, target = f"symbol, {spec.time_column}", staging
+            options = "FORMAT PARQUET, PARTITION_BY (symbol)"
+        else:
+            order, target = spec.time_column, staging / "data_0.parquet"
+            options = "FORMAT PARQUET"
+            staging.mkdir()
+        con.execute(
+            f"""
+            COPY (
+                SELECT * FROM ({rows})
+                QUALIFY row_number() OVER (
+                    PARTITION BY {spec.key} ORDER BY {spec.keep_first}
+                ) = 1
+                ORDER BY {order}
+            ) TO '{_sql_path(target)}' ({options})
+            """
+        )
+        con.execute(f"DELETE FROM {table} WHERE {window}")
+        con.execute(
+            "INSERT OR REPLACE INTO tiering_pending VALUES (?, ?, ?)",
+            [table, day, staging.name],
+        )
+        return int(count)
+
+    def enforce_retention(self, today: date | None = None) -> int:
+        """Delete cold day partitions older than the retention period (0 keeps everything)."""
+
+        if not self.retention_days:
+            return 0
+        cutoff = (today or _utc_today()) - timedelta(days=self.retention_days)
+        dropped = 0
+        for table in self.tables:
+            for partition in (self.cold_path / table).glob("trade_date=*"):
+                if date.fromisoformat(partition.name.split("=", 1)[1]) < cutoff:
+                    shutil.rmtree(partition)
+                    dropped += 1
+        return dropped
+
+
+def main() -> None:
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path), read_only=False)
+    try:
+        job = TieringJob()
+        con.execute("BEGIN TRANSACTION")
+        try:
+            report = job.run(con)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        job.publish(con)
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+    print(
+        f"Tiered {len(report.moved_days)} day(s), {report.moved_rows} row(s); "
+        f"dropped {report.dropped_partitions} expired partition(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
+
+
+__all__ = [
+    "TIERED_TABLES",
+    "TIER_SPECS",
+    "TierSpec",
+    "TieringJob",
+    "TieringReport",
+    "cold_glob",
+    "has_cold_data",
+    "tiered_relation",
+]
@@ -0,0 +1,275 @@
+﻿from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from option_flow.config.settings import get_settings
+from option_flow.storage.duckdb_client import accumulate_df, append_df, close_pool, upsert_df
+
+WriteOp = Callable[[duckdb.DuckDBPyConnection], int]
+
+# Trade rows are appended in time order so each row group's min/max zonemap on
+# the timestamp stays narrow and window filters can skip whole row groups.
+TIME_COLUMN = "trade_ts_utc"
+
+
+def _time_order(df: pd.DataFrame) -> str | None:
+    return TIME_COLUMN if TIME_COLUMN in df.columns else None
+
+
+def append_op(table: str, df: pd.DataFrame) -> WriteOp:
+    return lambda con: append_df(con, table, df, order_by=_time_order(df))
+
+
+def upsert_op(table: str, df: pd.DataFrame) -> WriteOp:
+    return lambda con: upsert_df(con, table, df)
+
+
+def frames_op(
+    frames: Mapping[str, pd.DataFrame],
+    *,
+    upsert: frozenset[str] = frozenset(),
+    accumulate: Mapping[str, tuple[str, ...]] | None = None,
+) -> WriteOp:
+    """One op writing several tables.
+
+    Tables named in ``upsert`` replace by primary key; tables in ``accumulate``
+    (mapped to their key columns) add their rows onto the existing ones.
+    """
+
+    accumulate = accumulate or {}
+
+    def write(con: duckdb.DuckDBPyConnection) -> int:
+        rows = 0
+        for table, df in frames.items():
+            if table in accumulate:
+                rows += accumulate_df(con, table, df, keys=accumulate[table])
+            elif table in upsert:
+                rows += upsert_df(con, table, df)
+            else:
+                rows += append_df(con, table, df, order_by=_time_order(df))
+        return rows
+
+    return write
+
+
+def sql_op(sql: str, params: list[object] | None = None) -> WriteOp:
+    def execute(con: duckdb.DuckDBPyConnection) -> int:
+        con.execute(sql, params or [])
+        return 0
+
+    return execute
+
+
+@dataclass
+class WriteRequest:
+    op: WriteOp
+    label: str
+    transaction: bool = True
+    future: Future[int] = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class WriterStats:
+    commits: int = 0
+    requests: int = 0
+    rows: int = 0
+    errors: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    last_commit_ms: float = 0.0
+    last_batch_requests: int = 0
+    last_batch_rows: int = 0
+    last_wait_ms: float = 0.0
+
+
+_STOP = object()
+
+
+class DuckDBWriter:
+    """Owns the process's only read-write DuckDB connection.
+
+    Producers ``submit`` write ops from any thread or event loop and get a
+    ``Future`` with the rows written. A background thread collects requests for
+    up to one flush interval and group-commits them in a single transaction; if
+    that transaction fails, each request is retried in its own so one bad
+    request only fails its own future. Requests submitted with
+    ``transaction=False`` run on their own after the group commits, for ops
+    that cannot share a transaction (e.g. writing to an attached database).
+    """
+
+    def __init__(
+        self,
+        database: Path | str | None = None,
+        *,
+        flush_interval_ms: int | None = None,
+        max_queue: int | None = None,
+    ) -> None:
+        settings = get_settings()
+        self._database = str(database or settings.duckdb_path)
+        if flush_interval_ms is None:
+            flush_interval_ms = settings.writer_flush_interval_ms
+        self._interval = flush_interval_ms / 1000
+        self._queue: queue.Queue[WriteRequest | object] = queue.Queue(
+            maxsize=max_queue or settings.writer_queue_max
+        )
+        self._thread: threading.Thread | None = None
+        self.stats = WriterStats()
+
+    def __enter__(self) -> DuckDBWriter:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> DuckDBWriter:
+        if not self.running:
+            self._thread = threading.Thread(target=self._run, name="duckdb-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(
+        self, op: WriteOp, *, label: str = "write", transaction: bool = True
+    ) -> Future[int]:
+        """Queue a write; blocks while the queue is full, which backpressures producers."""
+
+        if not self.running:
+            raise RuntimeError("writer is not running")
+        request = WriteRequest(op, label, transaction)
+        self._queue.put(request)
+        self._update_depth()
+        return request.future
+
+    def write(self, op: WriteOp, *, label: str = "write", transaction: bool = True) -> int:
+        """Submit and wait for the group commit that includes this request."""
+
+        return self.submit(op, label=label, transaction=transaction).result()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Flush everything already queued, then close the connection."""
+
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        # DuckDB refuses a read-write connection while this process holds the
+        # file open read-only, so release the read pool first.
+        close_pool()
+        con = duckdb.connect(self._database, read_only=False)
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is _STOP:
+                    break
+                batch: list[WriteRequest] = [first]  # type: ignore[list-item]
+                deadline = time.perf_counter() + self._interval
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        if remaining > 0:
+                            item = self._queue.get(timeout=remaining)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)  # type: ignore[arg-type]
+                self._commit(con, batch)
+        finally:
+            con.close()
+
+    def _commit(self, con: duckdb.DuckDBPyConnection, batch: list[WriteRequest]) -> None:
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        self._commit_group(con, [request for request in batch if request.transaction])
+        for request in batch:
+            if not request.transaction:
+                self._run_alone(con, request)
+
+    def _commit_group(self, con: duckdb.DuckDBPyConnection, batch: list[WriteRequest]) -> None:
+        if not batch:
+            return
+        started = time.perf_counter()
+        results: list[int | None]
+        try:
+            results = list(self._transaction(con, batch))
+        except Exception:
+            results = []
+            for request in batch:
+                try:
+                    results.append(self._transaction(con, [request])[0])
+                except Exception as exc:  # noqa: BLE001 - surfaced through the future
+                    self.stats.errors += 1
+                    request.future.set_exception(exc)
+                    results.append(None)
+        committed = time.perf_counter()
+        rows = sum(result for result in results if result is not None)
+        self.stats.commits += 1
+        self.stats.requests += len(batch)
+        self.stats.rows += rows
+        self.stats.last_commit_ms = (committed - started) * 1000
+        self.stats.last_batch_requests = len(batch)
+        self.stats.last_batch_rows = rows
+        self.stats.last_wait_ms = (started - batch[0].submitted_at) * 1000
+        self._update_depth()
+        for request, result in zip(batch, results, strict=True):
+            if result is not None:
+                request.future.set_result(result)
+
+    def _run_alone(self, con: duckdb.DuckDBPyConnection, request: WriteRequest) -> None:
+        self.stats.requests += 1
+        try:
+            result = request.op(con)
+        except Exception as exc:  # noqa: BLE001 - surfaced through the future
+            self.stats.errors += 1
+            request.future.set_exception(exc)
+            return
+        self.stats.rows += result
+        request.future.set_result(result)
+
+    @staticmethod
+    def _transaction(con: duckdb.DuckDBPyConnection, batch: list[WriteRequest]) -> list[int]:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            results = [request.op(con) for request in batch]
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return results
+
+    def _update_depth(self) -> None:
+        depth = self._queue.qsize()
+        self.stats.queue_depth = depth
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+
+
+__all__ = [
+    "DuckDBWriter",
+    "TIME_COLUMN",
+    "WriteOp",
+    "WriteRequest",
+    "WriterStats",
+    "append_op",
+    "frames_op",
+    "sql_op",
+    "upsert_op",
+]
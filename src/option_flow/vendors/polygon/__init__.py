@@ -1,4 +1,43 @@
-﻿from .client import PolygonClient, OptionContract, parse_option_symbol
+﻿from .buffer import BufferStats, FrameBuffer, OverflowPolicy
+from .client import OptionContract, PolygonClient, parse_option_symbol, rest_trade_event
+from .contracts import ContractRegistry, contract_key, occ_symbol, parse_option_symbols
+from .decoder import (
+    Decoder,
+    Event,
+    QuoteEvent,
+    TradeEvent,
+    available_decoders,
+    events_from_dicts,
+    get_decoder,
+    trade_payload,
+)
+from .filters import ContractFilter, FrameFilter
+from .reconnect import AuthenticationError, Backoff, StreamGap, StreamStats
 
-__all__ = ["PolygonClient", "OptionContract", "parse_option_symbol"]
-
+__all__ = [
+    "AuthenticationError",
+    "Backoff",
+    "BufferStats",
+    "ContractFilter",
+    "ContractRegistry",
+    "Decoder",
+    "Event",
+    "FrameBuffer",
+    "FrameFilter",
+    "OverflowPolicy",
+    "PolygonClient",
+    "QuoteEvent",
+    "OptionContract",
+    "parse_option_symbol",
+    "parse_option_symbols",
+    "rest_trade_event",
+    "StreamGap",
+    "StreamStats",
+    "TradeEvent",
+    "available_decoders",
+    "contract_key",
+    "events_from_dicts",
+    "get_decoder",
+    "occ_symbol",
+    "trade_payload",
+]
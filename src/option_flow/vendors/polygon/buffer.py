@@ -0,0 +1,214 @@
+﻿from __future__ import annotations
+
+import asyncio
+import struct
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import StrEnum
+from pathlib import Path
+from typing import BinaryIO
+
+Frame = str | bytes
+
+_LENGTH = struct.Struct("<I")
+_TRADE_MARKERS = (b'"ev":"T"', b'"ev": "T"')
+
+
+class OverflowPolicy(StrEnum):
+    BLOCK = "block"
+    DROP_OLDEST_QUOTES = "drop_oldest_quotes"
+    SPILL = "spill"
+
+
+@dataclass
+class BufferStats:
+    depth: int = 0
+    max_depth: int = 0
+    enqueued: int = 0
+    dropped: int = 0
+    spilled: int = 0
+    stall_seconds: float = 0.0
+
+
+def _as_bytes(frame: Frame) -> bytes:
+    return frame.encode("utf-8") if isinstance(frame, str) else frame
+
+
+def is_quote_only(frame: Frame) -> bool:
+    """True when a raw Polygon frame carries no trade events and can be dropped safely."""
+
+    data = _as_bytes(frame)
+    return not any(marker in data for marker in _TRADE_MARKERS)
+
+
+class FrameBuffer:
+    """Bounded FIFO between the socket reader and the processing stages.
+
+    When full, ``put`` applies the configured overflow policy: wait for the
+    consumer, evict the oldest quote-only frame, or spill to a length-prefixed
+    file that is replayed in order once memory drains. Under the eviction
+    policy quote-only frames wait in their own queue, tagged with their arrival
+    number, so evicting one is a ``popleft`` and ``get`` merges the two queue
+    heads back into arrival order.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        *,
+        policy: OverflowPolicy | str = OverflowPolicy.BLOCK,
+        spill_path: Path | None = None,
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self._maxsize = maxsize
+        self._policy = OverflowPolicy(policy)
+        self._frames: deque[tuple[int, Frame]] = deque()
+        self._quotes: deque[tuple[int, Frame]] = deque()
+        self._arrivals = 0
+        self._spill_path = spill_path
+        self._spill: BinaryIO | None = None
+        self._spill_read = 0
+        self._spill_write = 0
+        self._spill_pending = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._closed = False
+        self.stats = BufferStats()
+
+    def __len__(self) -> int:
+        return self._in_memory() + self._spill_pending
+
+    @property
+    def policy(self) -> OverflowPolicy:
+        return self._policy
+
+    async def put(self, frame: Frame) -> None:
+        if self._closed:
+            raise RuntimeError("buffer is closed")
+        if self._spill_pending:
+            self._spill_frame(frame)
+        elif self._in_memory() < self._maxsize:
+            self._append(frame)
+        elif self._policy is OverflowPolicy.SPILL:
+            self._spill_frame(frame)
+        elif self._policy is OverflowPolicy.DROP_OLDEST_QUOTES and self._drop_oldest_quote():
+            self._append(frame)
+        else:
+            await self._wait_for_room()
+            self._append(frame)
+        self.stats.enqueued += 1
+        self._update_depth()
+        self._not_empty.set()
+
+    async def get(self) -> Frame | None:
+        """Return the next frame, or ``None`` once the buffer is closed and drained."""
+
+        while True:
+            if self._frames or self._quotes:
+                frame: Frame | None = self._popleft()
+            elif self._spill_pending:
+                frame = self._read_spilled()
+            elif self._closed:
+                if self._spill is not None:
+                    self._spill.close()
+                    self._spill = None
+                return None
+            else:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+                continue
+            if self._in_memory() < self._maxsize:
+                self._not_full.set()
+            self._update_depth()
+            return frame
+
+    def close(self) -> None:
+        self._closed = True
+        self._not_empty.set()
+
+    def __aiter__(self) -> FrameBuffer:
+        return self
+
+    async def __anext__(self) -> Frame:
+        frame = await self.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+    async def _wait_for_room(self) -> None:
+        started = time.perf_counter()
+        while self._in_memory() >= self._maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.stats.stall_seconds += time.perf_counter() - started
+
+    def _in_memory(self) -> int:
+        return len(self._frames) + len(self._quotes)
+
+    def _append(self, frame: Frame) -> None:
+        self._arrivals += 1
+        droppable = self._policy is OverflowPolicy.DROP_OLDEST_QUOTES and is_quote_only(frame)
+        (self._quotes if droppable else self._frames).append((self._arrivals, frame))
+
+    def _popleft(self) -> Frame:
+        if self._quotes and (not self._frames or self._quotes[0][0] < self._frames[0][0]):
+            return self._quotes.popleft()[1]
+        return self._frames.popleft()[1]
+
+    def _drop_oldest_quote(self) -> bool:
+        if not self._quotes:
+            return False
+        self._quotes.popleft()
+        self.stats.dropped += 1
+        return True
+
+    def _spill_file(self) -> BinaryIO:
+        if self._spill is None:
+            if self._spill_path is not None:
+                self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self._spill = open(self._spill_path, "w+b")
+            else:
+                self._spill = tempfile.TemporaryFile()
+        return self._spill
+
+    def _spill_frame(self, frame: Frame) -> None:
+        data = _as_bytes(frame)
+        spill = self._spill_file()
+        spill.seek(self._spill_write)
+        spill.write(_LENGTH.pack(len(data)))
+        spill.write(data)
+        self._spill_write = spill.tell()
+        self._spill_pending += 1
+        self.stats.spilled += 1
+
+    def _read_spilled(self) -> bytes:
+        spill = self._spill_file()
+        spill.flush()
+        spill.seek(self._spill_read)
+        (length,) = _LENGTH.unpack(spill.read(_LENGTH.size))
+        data = spill.read(length)
+        self._spill_read = spill.tell()
+        self._spill_pending -= 1
+        if not self._spill_pending:
+            self._reset_spill()
+        return data
+
+    def _reset_spill(self) -> None:
+        if self._spill is not None:
+            self._spill.seek(0)
+            self._spill.truncate()
+        self._spill_read = 0
+        self._spill_write = 0
+        self._spill_pending = 0
+
+    def _update_depth(self) -> None:
+        depth = len(self)
+        self.stats.depth = depth
+        self.stats.max_depth = max(self.stats.max_depth, depth)
+
+
+__all__ = ["BufferStats", "FrameBuffer", "OverflowPolicy", "is_quote_only"]
@@ -1,6 +1,8 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import json
+import time
 from collections.abc import AsyncIterator, Callable
 from dataclasses import dataclass
 from datetime import date
@@ -10,8 +12,22 @@ import httpx
 import websockets
 
 from option_flow.config.settings import get_settings
+from option_flow.vendors.polygon.buffer import Frame, FrameBuffer, is_quote_only
+from option_flow.vendors.polygon.decoder import TradeEvent
+from option_flow.vendors.polygon.reconnect import (
+    AuthenticationError,
+    BackfillHook,
+    Backoff,
+    StreamGap,
+    StreamStats,
+    authenticated,
+    first_event_ms,
+    last_event_ms,
+    within_session,
+)
 
 OPTION_TYPE = Literal["C", "P"]
+SUBSCRIBE_CHUNK = 500
 
 
 @dataclass
@@ -72,27 +88,149 @@ class PolygonClient:
         ws_url: str | None = None,
         rest_base_url: str | None = None,
         session_factory: Callable[[], httpx.AsyncClient] | None = None,
+        reconnect: bool = True,
+        backoff: Backoff | None = None,
+        backfill: BackfillHook | None = None,
     ) -> None:
         settings = get_settings()
         self._api_key = api_key or getattr(settings, "polygon_api_key", None)
         self._ws_url = ws_url or settings.polygon_ws_url
         self._rest_base_url = rest_base_url or settings.polygon_rest_base_url
         self._session_factory = session_factory or (lambda: httpx.AsyncClient(timeout=10.0))
+        self._queue_max_frames = settings.stream_queue_max_frames
+        self._overflow_policy = settings.stream_overflow_policy
+        self._spill_path = settings.stream_spill_path
+        self._gap_threshold_ms = settings.stream_gap_threshold_ms
+        self._reconnect = reconnect
+        self._backoff = backoff or Backoff()
+        self._backfill = backfill
+        self._backfill_tasks: set[asyncio.Task[object]] = set()
+        self.buffer: FrameBuffer | None = None
+        self.stream_stats = StreamStats()
 
-    async def stream_trades(self, symbols: list[str]) -> AsyncIterator[dict[str, Any]]:
-        """Yield Polygon trade/quote messages for the provided option symbols."""
+    def new_buffer(self) -> FrameBuffer:
+        return FrameBuffer(
+            self._queue_max_frames,
+            policy=self._overflow_policy,
+            spill_path=self._spill_path,
+        )
+
+    async def stream_frames(
+        self, symbols: list[str], *, buffer: FrameBuffer | None = None
+    ) -> AsyncIterator[Frame]:
+        """Yield raw frames that a background reader task drains from the socket.
+
+        The reader never waits on downstream processing except under the
+        ``block`` overflow policy, so slow stages do not stall the socket.
+        """
 
         if not self._api_key:
             raise RuntimeError("Polygon API key not configured")
 
+        self.buffer = buffer or self.new_buffer()
+        reader = asyncio.create_task(self._read_socket(symbols, self.buffer))
+        try:
+            async for frame in self.buffer:
+                yield frame
+            await reader
+        finally:
+            reader.cancel()
+
+    async def stream_trades(
+        self, symbols: list[str], *, buffer: FrameBuffer | None = None
+    ) -> AsyncIterator[Any]:
+        """Yield Polygon trade/quote messages for the provided option symbols."""
+
+        async for frame in self.stream_frames(symbols, buffer=buffer):
+            yield json.loads(frame)
+
+    async def _read_socket(self, symbols: list[str], buffer: FrameBuffer) -> None:
+        """Pump the socket into ``buffer``, reconnecting until told to stop.
+
+        A gap is reported from the last event seen to the first event after a
+        reconnect, or between consecutive frames when vendor time jumps by more
+        than ``stream_gap_threshold_ms`` inside one regular trading session.
+        The backoff only resets once a connection delivers events, so a server
+        that accepts the login and then drops us keeps backing off. A rejected
+        API key is fatal.
+        """
+
         channel_params = self._build_channel_params(symbols)
-        async with websockets.connect(self._ws_url, ping_interval=20, ping_timeout=20) as ws:
-            await ws.send(json.dumps({"action": "auth", "params": self._api_key}))
-            await ws.send(json.dumps({"action": "subscribe", "params": channel_params}))
+        handshake = self._handshake_messages(channel_params)
+        stats = self.stream_stats
+        attempt = 0
+        last_ts: int | None = None
+        disconnected_at: float | None = None
+        gap_open = False
+        try:
+            while True:
+                try:
+                    async with websockets.connect(
+                        self._ws_url, ping_interval=20, ping_timeout=20
+                    ) as ws:
+                        for message in handshake:
+                            await ws.send(message)
+                        stats.connects += 1
+                        logged_in = False
+
+                        async for frame in ws:
+                            if not logged_in:
+                                logged_in = authenticated(frame)
+                            first_ts = first_event_ms(frame)
+                            if first_ts is not None:
+                                if last_ts is not None and (
+                                    gap_open or self._silent_too_long(last_ts, first_ts)
+                                ):
+                                    self._report_gap(StreamGap(last_ts, first_ts, channel_params))
+                                gap_open = False
+                                attempt = 0
+                                last_ts = max(last_ts or 0, last_event_ms(frame) or first_ts)
+                            if disconnected_at is not None and not is_quote_only(frame):
+                                stats.last_reconnect_to_first_trade_s = (
+                                    time.monotonic() - disconnected_at
+                                )
+                                disconnected_at = None
+                            await buffer.put(frame)
+                except AuthenticationError as exc:
+                    stats.last_error = repr(exc)
+                    raise
+                except (OSError, websockets.WebSocketException) as exc:
+                    stats.last_error = repr(exc)
+
+                if not self._reconnect:
+                    return
+                stats.reconnects += 1
+                gap_open = True
+                if disconnected_at is None:
+                    disconnected_at = time.monotonic()
+                await asyncio.sleep(self._backoff.delay(attempt))
+                attempt += 1
+        finally:
+            buffer.close()
+
+    def _handshake_messages(self, channel_params: str) -> list[str]:
+        """Auth plus chunked subscribe messages, sent back-to-back on every (re)connect."""
+
+        channels = channel_params.split(",")
+        messages = [json.dumps({"action": "auth", "params": self._api_key})]
+        for start in range(0, len(channels), SUBSCRIBE_CHUNK):
+            chunk = ",".join(channels[start : start + SUBSCRIBE_CHUNK])
+            messages.append(json.dumps({"action": "subscribe", "params": chunk}))
+        return messages
 
-            async for message in ws:
-                payload = json.loads(message)
-                yield payload
+    def _silent_too_long(self, last_ts: int, first_ts: int) -> bool:
+        return 0 < self._gap_threshold_ms < first_ts - last_ts and within_session(
+            last_ts, first_ts
+        )
+
+    def _report_gap(self, gap: StreamGap) -> None:
+        self.stream_stats.gaps += 1
+        self.stream_stats.last_gap = gap
+        if self._backfill is None:
+            return
+        task: asyncio.Task[object] = asyncio.ensure_future(self._backfill(gap))
+        self._backfill_tasks.add(task)
+        task.add_done_callback(self._backfill_tasks.discard)
 
     def _build_channel_params(self, symbols: list[str]) -> str:
         if not symbols:
@@ -121,5 +259,47 @@ class PolygonClient:
             data = response.json()
             return data.get("results", [])
 
+    async def fetch_trades(
+        self, option_ticker: str, *, start_ms: int, end_ms: int
+    ) -> list[dict[str, Any]]:
+        """Fetch historical trades for one contract between two epoch-ms timestamps."""
+
+        if not self._api_key:
+            raise RuntimeError("Polygon API key not configured")
+
+        url: str | None = f"{self._rest_base_url}/v3/trades/{option_ticker}"
+        params: dict[str, Any] = {
+            "timestamp.gte": start_ms * 1_000_000,
+            "timestamp.lte": end_ms * 1_000_000,
+            "order": "asc",
+            "sort": "timestamp",
+            "limit": 50_000,
+            "apiKey": self._api_key,
+        }
+        results: list[dict[str, Any]] = []
+        async with self._session_factory() as session:
+            while url:
+                response = await session.get(url, params=params)
+                response.raise_for_status()
+                data = response.json()
+                results.extend(data.get("results", []))
+                url = data.get("next_url")
+                params = {"apiKey": self._api_key}
+        return results
+
+
+def rest_trade_event(option_ticker: str, trade: dict[str, Any]) -> TradeEvent:
+    """Convert a REST v3 trade into the streaming trade event."""
+
+    return TradeEvent(
+        sym=option_ticker,
+        price=trade["price"],
+        size=trade["size"],
+        timestamp_ms=trade["sip_timestamp"] // 1_000_000,
+        sequence=trade.get("sequence_number", 0),
+        exchange=trade.get("exchange", 0),
+        conditions=trade.get("conditions"),
+    )
+
 
-__all__ = ["PolygonClient", "OptionContract", "parse_option_symbol"]
+__all__ = ["PolygonClient", "OptionContract", "parse_option_symbol", "rest_trade_event"]
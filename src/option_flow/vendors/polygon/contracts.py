@@ -0,0 +1,195 @@
+﻿from __future__ import annotations
+
+import hashlib
+from collections.abc import Hashable, Sequence
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from option_flow.vendors.polygon.client import OptionContract, parse_option_symbol
+
+_OCC_PATTERN = r"^O:([A-Za-z]+)(\d{6})([CPcp])(\d+)$"
+
+
+def parse_option_symbols(symbols: Sequence[str]) -> pd.DataFrame:
+    """Vectorized ``parse_option_symbol`` for backfills.
+
+    Returns one row per input with ``underlying``, ``expiry`` (datetime64[D]),
+    ``strike``, ``call_put`` and a ``valid`` flag; invalid rows hold nulls.
+    """
+
+    parts = pd.Series(list(symbols), dtype="object").str.extract(_OCC_PATTERN)
+    valid = parts[0].notna()
+    expiry = pd.to_datetime("20" + parts[1], format="%Y%m%d", errors="coerce")
+    valid &= expiry.notna()
+    return pd.DataFrame(
+        {
+            "underlying": parts[0].where(valid),
+            "expiry": expiry.where(valid).to_numpy(dtype="datetime64[D]"),
+            "strike": pd.to_numeric(parts[3].where(valid)) / 1000.0,
+            "call_put": parts[2].str.upper().where(valid),
+            "valid": valid.to_numpy(),
+        }
+    )
+
+
+def occ_symbol(underlying: str, expiry: date, call_put: str, strike: float) -> str:
+    """Canonical Polygon OCC symbol for parsed contract fields."""
+
+    return (
+        f"O:{underlying.upper()}{expiry:%y%m%d}{call_put.upper()}{round(strike * 1000):08d}"
+    )
+
+
+def contract_key(symbol: str) -> int:
+    """Stable signed 64-bit id of a canonical OCC symbol.
+
+    Unlike registry ids, which are dense but per process, keys are identical
+    across shards, restarts and migrations, so they can be stored as
+    ``contract_id`` in the database.
+    """
+
+    digest = hashlib.blake2b(symbol.encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class ContractRegistry:
+    """Interns option symbols to dense integer ids with parsed fields kept column-wise.
+
+    Each symbol is parsed once; afterwards hot paths key NBBO, sweep and writer
+    state on the integer id and gather contract fields for whole batches by
+    fancy-indexing the columns.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self._ids: dict[str, int] = {}
+        self.symbols: list[str] = []
+        self.underlyings: list[str] = []
+        self._underlying_ids: dict[str, int] = {}
+        self._underlying = np.zeros(capacity, dtype=np.int32)
+        self._expiry = np.zeros(capacity, dtype="datetime64[D]")
+        self._strike = np.zeros(capacity, dtype=np.float64)
+        self._is_call = np.zeros(capacity, dtype=np.bool_)
+        self._key = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self._ids
+
+    def lookup(self, symbol: str) -> int | None:
+        return self._ids.get(symbol)
+
+    def intern(self, symbol: str) -> int:
+        """Return the id for ``symbol``, parsing it on first sight (raises ``ValueError``)."""
+
+        contract_id = self._ids.get(symbol)
+        if contract_id is not None:
+            return contract_id
+        contract = parse_option_symbol(symbol)
+        return self._add(
+            symbol,
+            contract.underlying,
+            np.datetime64(contract.expiry, "D"),
+            contract.strike,
+            contract.option_type == "C",
+        )
+
+    def intern_many(self, symbols: Sequence[str]) -> np.ndarray:
+        """Intern a batch of symbols; unknown ones are parsed in one vectorized pass.
+
+        Invalid symbols map to ``-1``.
+        """
+
+        ids = np.fromiter(
+            (self._ids.get(symbol, -1) for symbol in symbols), dtype=np.int64, count=len(symbols)
+        )
+        missing = np.flatnonzero(ids < 0).tolist()
+        if missing:
+            new_symbols = list(dict.fromkeys(symbols[i] for i in missing))
+            parsed = parse_option_symbols(new_symbols)
+            for symbol, row in zip(new_symbols, parsed.itertuples(index=False), strict=True):
+                if row.valid:
+                    self._add(
+                        symbol, row.underlying, row.expiry, row.strike, row.call_put == "C"
+                    )
+            ids[missing] = [self._ids.get(symbols[i], -1) for i in missing]
+        return ids
+
+    def contract(self, contract_id: int) -> OptionContract:
+        return OptionContract(
+            underlying=self.underlyings[self._underlying[contract_id]],
+            expiry=self._expiry[contract_id].astype(object),
+            strike=float(self._strike[contract_id]),
+            option_type="C" if self._is_call[contract_id] else "P",
+        )
+
+    def underlying(self, ids: np.ndarray) -> np.ndarray:
+        names = np.asarray(self.underlyings, dtype=object)
+        return names[self._underlying[ids]]
+
+    def expiry(self, ids: np.ndarray) -> np.ndarray:
+        return self._expiry[ids]
+
+    def expiry_of(self, contract_id: Hashable) -> np.datetime64 | None:
+        """Expiry of one interned id, or ``None`` for keys the registry never issued."""
+
+        if isinstance(contract_id, int | np.integer) and 0 <= contract_id < len(self):
+            return self._expiry[contract_id]
+        return None
+
+    def strike(self, ids: np.ndarray) -> np.ndarray:
+        return self._strike[ids]
+
+    def call_put(self, ids: np.ndarray) -> np.ndarray:
+        return np.where(self._is_call[ids], "C", "P").astype(object)
+
+    def key(self, ids: np.ndarray) -> np.ndarray:
+        """Stable database ``contract_id`` (see ``contract_key``) for registry ids."""
+
+        return self._key[ids]
+
+    def _add(
+        self,
+        symbol: str,
+        underlying: str,
+        expiry: np.datetime64,
+        strike: float,
+        is_call: bool,
+    ) -> int:
+        contract_id = len(self.symbols)
+        if contract_id == len(self._strike):
+            self._grow()
+        underlying_id = self._underlying_ids.get(underlying)
+        if underlying_id is None:
+            underlying_id = len(self.underlyings)
+            self._underlying_ids[underlying] = underlying_id
+            self.underlyings.append(underlying)
+        self._underlying[contract_id] = underlying_id
+        self._expiry[contract_id] = expiry
+        self._strike[contract_id] = strike
+        self._is_call[contract_id] = is_call
+        self._key[contract_id] = contract_key(
+            occ_symbol(
+                underlying,
+                self._expiry[contract_id].astype(object),
+                "C" if is_call else "P",
+                strike,
+            )
+        )
+        self._ids[symbol] = contract_id
+        self.symbols.append(symbol)
+        return contract_id
+
+    def _grow(self) -> None:
+        size = max(1, len(self._strike) * 2)
+        self._underlying = np.resize(self._underlying, size)
+        self._expiry = np.resize(self._expiry, size)
+        self._strike = np.resize(self._strike, size)
+        self._is_call = np.resize(self._is_call, size)
+        self._key = np.resize(self._key, size)
+
+
+__all__ = ["ContractRegistry", "contract_key", "occ_symbol", "parse_option_symbols"]
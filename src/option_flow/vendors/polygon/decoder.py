@@ -0,0 +1,235 @@
+﻿from __future__ import annotations
+
+import json
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any, ClassVar, Protocol, cast
+
+from option_flow.vendors.polygon.buffer import Frame
+
+try:  # optional fast paths
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depends on environment
+    msgspec = None  # type: ignore[assignment]
+
+
+@dataclass(slots=True)
+class TradeEvent:
+    kind: ClassVar[str] = "T"
+
+    sym: str
+    price: float
+    size: int
+    timestamp_ms: int
+    sequence: int = 0
+    exchange: int = 0
+    conditions: list[int] | None = None
+
+
+@dataclass(slots=True)
+class QuoteEvent:
+    kind: ClassVar[str] = "Q"
+
+    sym: str
+    bid: float
+    ask: float
+    bid_size: int
+    ask_size: int
+    timestamp_ms: int
+    sequence: int = 0
+
+
+Event = TradeEvent | QuoteEvent
+
+
+def events_from_dicts(items: Iterable[dict[str, Any]]) -> list[Event]:
+    """Build typed events from already-parsed Polygon dicts, skipping status messages."""
+
+    events: list[Event] = []
+    for item in items:
+        ev = item.get("ev")
+        if ev == "T":
+            events.append(
+                TradeEvent(
+                    item["sym"],
+                    item["p"],
+                    item["s"],
+                    item["t"],
+                    item.get("q", 0),
+                    item.get("x", 0),
+                    item.get("c"),
+                )
+            )
+        elif ev == "Q":
+            events.append(
+                QuoteEvent(
+                    item["sym"],
+                    item["bp"],
+                    item["ap"],
+                    item.get("bs", 0),
+                    item.get("as", 0),
+                    item["t"],
+                    item.get("q", 0),
+                )
+            )
+    return events
+
+
+def trade_payload(event: TradeEvent) -> str:
+    """Serialize a trade back to the Polygon wire shape for ``trades_raw.raw_payload``."""
+
+    return json.dumps(
+        {
+            "ev": "T",
+            "sym": event.sym,
+            "x": event.exchange,
+            "p": event.price,
+            "s": event.size,
+            "c": event.conditions,
+            "t": event.timestamp_ms,
+            "q": event.sequence,
+        }
+    )
+
+
+class Decoder(Protocol):
+    name: str
+
+    def decode(self, frame: Frame) -> list[Event]: ...
+
+
+class JsonDecoder:
+    """Parse frames with a dict-producing JSON library, then build typed events."""
+
+    name = "json"
+
+    def __init__(self, loads: Callable[[Frame], Any] = json.loads) -> None:
+        self._loads = loads
+
+    def decode(self, frame: Frame) -> list[Event]:
+        payload = self._loads(frame)
+        if isinstance(payload, dict):
+            payload = [payload]
+        return events_from_dicts(payload)
+
+
+class OrjsonDecoder(JsonDecoder):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise RuntimeError("orjson is not installed")
+        super().__init__(orjson.loads)
+
+
+if msgspec is not None:
+
+    class _MsTrade(msgspec.Struct, tag_field="ev", tag="T", rename={  # type: ignore[call-arg]
+        "price": "p",
+        "size": "s",
+        "timestamp_ms": "t",
+        "sequence": "q",
+        "exchange": "x",
+        "conditions": "c",
+    }):
+        kind: ClassVar[str] = "T"
+
+        sym: str
+        price: float
+        size: int
+        timestamp_ms: int
+        sequence: int = 0
+        exchange: int = 0
+        conditions: list[int] | None = None
+
+    class _MsQuote(msgspec.Struct, tag_field="ev", tag="Q", rename={  # type: ignore[call-arg]
+        "bid": "bp",
+        "ask": "ap",
+        "bid_size": "bs",
+        "ask_size": "as",
+        "timestamp_ms": "t",
+        "sequence": "q",
+    }):
+        kind: ClassVar[str] = "Q"
+
+        sym: str
+        bid: float
+        ask: float
+        timestamp_ms: int
+        bid_size: int = 0
+        ask_size: int = 0
+        sequence: int = 0
+
+    class _MsStatus(msgspec.Struct, tag_field="ev", tag="status"):
+        kind: ClassVar[str] = "status"
+
+        status: str = ""
+        message: str = ""
+
+
+class MsgspecDecoder:
+    """Decode frames straight into slotted structs with a tagged union on ``ev``.
+
+    Frames containing event types the union does not know fall back to the
+    dict-based path so unexpected messages never break the stream.
+    """
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise RuntimeError("msgspec is not installed")
+        self._decoder = msgspec.json.Decoder(list[_MsTrade | _MsQuote | _MsStatus])
+        self._fallback = JsonDecoder()
+
+    def decode(self, frame: Frame) -> list[Event]:
+        try:
+            events = self._decoder.decode(frame)
+        except msgspec.ValidationError:
+            return self._fallback.decode(frame)
+        # The structs mirror TradeEvent/QuoteEvent field for field and callers
+        # dispatch on ``kind``, never on the concrete class.
+        return cast(list[Event], [event for event in events if event.kind != "status"])
+
+
+def available_decoders() -> list[str]:
+    names = ["json"]
+    if orjson is not None:
+        names.insert(0, "orjson")
+    if msgspec is not None:
+        names.insert(0, "msgspec")
+    return names
+
+
+def get_decoder(name: str = "auto") -> Decoder:
+    """Return the requested decoder; ``auto`` picks the fastest one installed."""
+
+    if name == "auto":
+        name = available_decoders()[0]
+    if name == "msgspec":
+        return MsgspecDecoder()
+    if name == "orjson":
+        return OrjsonDecoder()
+    if name == "json":
+        return JsonDecoder()
+    raise ValueError(f"unknown decoder '{name}'")
+
+
+__all__ = [
+    "Decoder",
+    "Event",
+    "JsonDecoder",
+    "MsgspecDecoder",
+    "OrjsonDecoder",
+    "QuoteEvent",
+    "TradeEvent",
+    "available_decoders",
+    "events_from_dicts",
+    "get_decoder",
+    "trade_payload",
+]
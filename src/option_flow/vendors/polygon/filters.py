@@ -0,0 +1,90 @@
+﻿from __future__ import annotations
+
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+
+from option_flow.vendors.polygon.buffer import Frame
+
+_ROOT = re.compile(rb'"sym"\s*:\s*"O:([A-Za-z]+)\d')
+_OBJECT = re.compile(rb"\{[^{}]*\}")
+
+
+class FrameFilter:
+    """Drop events for unwanted underlyings from raw frames before they are decoded.
+
+    OCC roots end at the first digit, so the bytes after ``"sym":"O:`` are matched
+    against a set of wanted roots with one regex scan of the whole frame. Frames
+    whose events are all wanted pass through untouched; mixed frames are rebuilt
+    from the wanted event objects only. Events without an option symbol (status
+    messages) are kept.
+    """
+
+    def __init__(self, underlyings: Iterable[str]) -> None:
+        self._roots = frozenset(item.strip().upper().encode("ascii") for item in underlyings)
+        self.dropped = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._roots)
+
+    def filter(self, frame: Frame) -> Frame | None:
+        """Return the frame with unwanted events removed, or ``None`` if none remain."""
+
+        data = frame.encode("utf-8") if isinstance(frame, str) else frame
+        roots = _ROOT.findall(data)
+        unwanted = sum(root.upper() not in self._roots for root in roots)
+        if not unwanted:
+            return frame
+        self.dropped += unwanted
+        if unwanted == len(roots) and data.count(b"{") == len(roots):
+            return None
+        kept = [
+            match.group()
+            for match in _OBJECT.finditer(data)
+            if (root := _ROOT.search(match.group())) is None
+            or root.group(1).upper() in self._roots
+        ]
+        if not kept:
+            return None
+        return b"[" + b",".join(kept) + b"]"
+
+
+@dataclass
+class ContractFilter:
+    """Expiry (days to expiry) and strike bounds applied to parsed OCC fields.
+
+    Bounds left as ``None`` are open.
+    """
+
+    min_dte: int | None = None
+    max_dte: int | None = None
+    min_strike: float | None = None
+    max_strike: float | None = None
+
+    def __bool__(self) -> bool:
+        return any(
+            bound is not None
+            for bound in (self.min_dte, self.max_dte, self.min_strike, self.max_strike)
+        )
+
+    def accepts(
+        self, expiries: np.ndarray, strikes: np.ndarray, today: np.datetime64
+    ) -> np.ndarray:
+        day = np.asarray(today, dtype="datetime64[D]")
+        dte = (np.asarray(expiries, dtype="datetime64[D]") - day).astype(np.int64)
+        strikes = np.asarray(strikes, dtype=np.float64)
+        keep = np.ones(len(dte), dtype=np.bool_)
+        if self.min_dte is not None:
+            keep &= dte >= self.min_dte
+        if self.max_dte is not None:
+            keep &= dte <= self.max_dte
+        if self.min_strike is not None:
+            keep &= strikes >= self.min_strike
+        if self.max_strike is not None:
+            keep &= strikes <= self.max_strike
+        return keep
+
+
+__all__ = ["ContractFilter", "FrameFilter"]
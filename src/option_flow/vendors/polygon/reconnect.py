@@ -0,0 +1,120 @@
+﻿from __future__ import annotations
+
+import random
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+
+from option_flow.vendors.polygon.buffer import Frame
+
+_TS_KEY = b'"t":'
+_AUTH_SUCCESS = b'"auth_success"'
+_AUTH_FAILED = b'"auth_failed"'
+_MARKET_TZ = ZoneInfo("America/New_York")
+_MARKET_OPEN = time(9, 30)
+_MARKET_CLOSE = time(16, 0)
+
+
+@dataclass
+class Backoff:
+    """Exponential backoff with full jitter."""
+
+    initial: float = 0.5
+    maximum: float = 30.0
+    factor: float = 2.0
+
+    def delay(self, attempt: int) -> float:
+        cap = min(self.maximum, self.initial * self.factor**attempt)
+        return random.uniform(0.0, cap)
+
+
+@dataclass
+class StreamGap:
+    """Vendor-time window (epoch ms) in which stream events may have been missed."""
+
+    start_ms: int
+    end_ms: int
+    channels: str
+
+
+@dataclass
+class StreamStats:
+    connects: int = 0
+    reconnects: int = 0
+    gaps: int = 0
+    last_gap: StreamGap | None = None
+    last_reconnect_to_first_trade_s: float | None = None
+    last_error: str | None = None
+
+
+BackfillHook = Callable[[StreamGap], Awaitable[object]]
+
+
+class AuthenticationError(RuntimeError):
+    """Polygon rejected the API key; reconnecting would only be rejected again."""
+
+
+def authenticated(frame: Frame) -> bool:
+    """Whether a frame confirms the login; raises ``AuthenticationError`` on rejection."""
+
+    data = frame.encode("utf-8") if isinstance(frame, str) else frame
+    if _AUTH_FAILED in data:
+        raise AuthenticationError(f"Polygon authentication failed: {data[:200]!r}")
+    return _AUTH_SUCCESS in data
+
+
+def first_event_ms(frame: Frame) -> int | None:
+    """Timestamp of the first event in a raw frame, found without decoding the JSON."""
+
+    data = frame.encode("utf-8") if isinstance(frame, str) else frame
+    return _timestamp_at(data, data.find(_TS_KEY))
+
+
+def last_event_ms(frame: Frame) -> int | None:
+    """Timestamp of the last event in a raw frame, found without decoding the JSON."""
+
+    data = frame.encode("utf-8") if isinstance(frame, str) else frame
+    return _timestamp_at(data, data.rfind(_TS_KEY))
+
+
+def within_session(start_ms: int, end_ms: int) -> bool:
+    """Whether both instants fall in the same regular New York trading session.
+
+    Silence across the close, overnight or over a weekend is the market being
+    shut, not the stream dropping events, so it is never worth a backfill.
+    """
+
+    start = datetime.fromtimestamp(start_ms / 1000, _MARKET_TZ)
+    end = datetime.fromtimestamp(end_ms / 1000, _MARKET_TZ)
+    return (
+        start.date() == end.date()
+        and start.weekday() < 5
+        and _MARKET_OPEN <= start.time()
+        and end.time() < _MARKET_CLOSE
+    )
+
+
+def _timestamp_at(data: bytes, idx: int) -> int | None:
+    if idx < 0:
+        return None
+    start = idx + len(_TS_KEY)
+    while start < len(data) and data[start] == 0x20:
+        start += 1
+    end = start
+    while end < len(data) and 0x30 <= data[end] <= 0x39:
+        end += 1
+    return int(data[start:end]) if end > start else None
+
+
+__all__ = [
+    "AuthenticationError",
+    "Backoff",
+    "BackfillHook",
+    "StreamGap",
+    "StreamStats",
+    "authenticated",
+    "first_event_ms",
+    "last_event_ms",
+    "within_session",
+]
@@ -1,8 +1,15 @@
 ﻿from __future__ import annotations
 
+import duckdb
+import pyarrow as pa
+import pytest
 from fastapi.testclient import TestClient
 
-from option_flow.api.main import app
+from option_flow.api import main as api_main
+from option_flow.api.main import PrintRow, app
+from option_flow.api.serialization import ARROW_STREAM_MEDIA_TYPE
+from option_flow.config.settings import get_settings
+from option_flow.storage.duckdb_client import close_pool
 
 
 def test_top_endpoint_returns_rows():
@@ -14,9 +21,104 @@ def test_top_endpoint_returns_rows():
     assert data, 'expected at least one row in demo dataset'
 
 
+def test_top_endpoint_ranks_strikes_from_rollups():
+    client = TestClient(app)
+    rows = {row['symbol']: row for row in client.get('/top').json()}
+    filtered = {
+        row['symbol']: row for row in client.get('/top', params={'min_notional': 1}).json()
+    }
+    assert rows.keys() == filtered.keys()
+    for symbol, row in rows.items():
+        assert len(row['top_strikes']) == 3
+        assert row['top_strikes'] == filtered[symbol]['top_strikes']
+
+
+def test_ticker_detail_returns_minutes_and_strikes():
+    client = TestClient(app)
+    response = client.get('/ticker/spy', params={'window': '560m'})
+    assert response.status_code == 200
+    detail = response.json()
+    assert detail['symbol'] == 'SPY'
+    assert len(detail['by_minute']) == 30
+    bar = detail['by_minute'][0]
+    assert bar['buy_premium'] + bar['sell_premium'] == bar['total_premium']
+    assert len(detail['top_strikes']) == 5
+    assert len(detail['largest_prints']) == 10
+
+
 def test_export_csv_returns_payload():
     client = TestClient(app)
     response = client.get('/export.csv')
     assert response.status_code == 200
     assert response.headers['content-type'].startswith('text/csv')
-    assert 'symbol' in response.text
+    assert 'symbol' in response.text
+
+
+def test_sweeps_feed_filters_on_notional_and_legs():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    con.execute(
+        """
+        INSERT INTO sweeps VALUES
+            ('sweep-a-1', NULL, 'SPY', DATE '2099-12-31', 450.0, 'C', 'BUY', false,
+             now()::TIMESTAMP, now()::TIMESTAMP, 120.0, 4, 2000, 300000.0, 1.5, now()::TIMESTAMP),
+            ('sweep-a-2', NULL, 'SPY', DATE '2099-12-31', 450.0, 'C', 'BUY', false,
+             now()::TIMESTAMP, now()::TIMESTAMP, 0.0, 1, 5000, 900000.0, 1.8, now()::TIMESTAMP),
+            ('sweep-a-3', NULL, 'QQQ', DATE '2099-12-31', 400.0, 'P', 'SELL', false,
+             now()::TIMESTAMP, now()::TIMESTAMP, 80.0, 3, 100, 15000.0, 1.5, now()::TIMESTAMP)
+        """
+    )
+    con.close()
+
+    client = TestClient(app)
+    response = client.get('/sweeps')
+    assert response.status_code == 200
+    data = response.json()
+    assert [row['sweep_id'] for row in data] == ['sweep-a-1']
+    assert data[0]['legs'] == 4
+
+
+def test_prints_feed_serializes_rows_from_arrow():
+    client = TestClient(app)
+    response = client.get('/prints', params={'min_notional': 0, 'limit': 500})
+    assert response.status_code == 200
+    rows = [PrintRow.model_validate(row) for row in response.json()]
+    assert len(rows) == 90
+    assert rows[0].trade_ts_utc >= rows[-1].trade_ts_utc
+    assert rows[0].sweep_id is None
+    assert rows[0].option.startswith(f'{rows[0].symbol} ')
+
+
+def test_prints_feed_returns_arrow_ipc_when_requested():
+    client = TestClient(app)
+    response = client.get(
+        '/prints', params={'min_notional': 0}, headers={'accept': ARROW_STREAM_MEDIA_TYPE}
+    )
+    assert response.headers['content-type'] == ARROW_STREAM_MEDIA_TYPE
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 50
+    assert 'trade_id' in table.column_names
+
+
+def test_unfiltered_top_is_served_from_the_window_engine(monkeypatch):
+    client = TestClient(app)
+    expected = client.get('/top', params={'window': '560m', 'min_notional': 1}).json()
+    calls = []
+    monkeypatch.setattr(
+        api_main, 'top_flows', lambda *args, **kwargs: calls.append(args) or []
+    )
+    rows = client.get('/top', params={'window': '560m'}).json()
+    assert not calls
+    assert [row['symbol'] for row in rows] == [row['symbol'] for row in expected]
+    for row, want in zip(rows, expected, strict=True):
+        for field in ('net_premium', 'total_premium', 'call_premium', 'put_premium'):
+            assert row[field] == pytest.approx(want[field])
+        assert row['top_strikes'] == want['top_strikes']
+
+
+def test_window_engine_tolerates_a_missing_database(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPTION_FLOW_DUCKDB_PATH', str(tmp_path / 'missing.duckdb'))
+    get_settings.cache_clear()
+    api_main.get_window_engine.cache_clear()
+    close_pool()
+    assert api_main.current_window_engine() is None
+    assert not (tmp_path / 'missing.duckdb').exists()
@@ -0,0 +1,55 @@
+﻿from __future__ import annotations
+
+import json
+import math
+from datetime import date, datetime
+
+import pyarrow as pa
+
+from option_flow.api.serialization import arrow_to_json
+
+
+def _strict_loads(payload: bytes):
+    def reject(constant: str):
+        raise ValueError(f'invalid JSON constant {constant}')
+
+    return json.loads(payload, parse_constant=reject)
+
+
+def test_arrow_to_json_renders_columns_as_json_rows():
+    table = pa.table(
+        {
+            'trade_id': ['a"1', 'b\\2\n', None],
+            'side': pa.array(['BUY', 'SELL', 'BUY']).dictionary_encode(),
+            'size': pa.array([1, None, 3], pa.int64()),
+            'vwap': [1.25, math.nan, math.inf],
+            'is_0dte': [True, False, None],
+            'trade_ts_utc': pa.array(
+                [datetime(2024, 9, 20, 14, 30, 5, 250_000), datetime(2024, 9, 20), None],
+                pa.timestamp('us'),
+            ),
+            'expiry': [date(2024, 9, 20), None, date(2024, 12, 20)],
+            'strikes': [[1.0], [], None],
+        }
+    )
+    rows = _strict_loads(arrow_to_json(table))
+    assert rows[0] == {
+        'trade_id': 'a"1',
+        'side': 'BUY',
+        'size': 1,
+        'vwap': 1.25,
+        'is_0dte': True,
+        'trade_ts_utc': '2024-09-20T14:30:05.250000',
+        'expiry': '2024-09-20',
+        'strikes': [1.0],
+    }
+    assert rows[1]['trade_id'] == 'b\\2\n'
+    assert rows[1]['size'] is None
+    assert rows[1]['vwap'] is None and rows[2]['vwap'] is None
+    assert datetime.fromisoformat(rows[1]['trade_ts_utc']) == datetime(2024, 9, 20)
+    assert rows[2]['trade_id'] is None
+    assert rows[2]['strikes'] is None
+
+
+def test_arrow_to_json_handles_empty_tables():
+    assert arrow_to_json(pa.table({'symbol': pa.array([], pa.string())})) == b'[]'
@@ -2,8 +2,15 @@
 
 from datetime import datetime
 
+import numpy as np
+
 from option_flow.ingest.nbbo_cache import NBBOQuote
-from option_flow.services.side_classifier import calculate_epsilon, infer_side
+from option_flow.services.side_classifier import (
+    calculate_epsilon,
+    infer_side,
+    infer_sides,
+    side_labels,
+)
 
 
 def test_calculate_epsilon_respects_floor():
@@ -24,4 +31,23 @@ def test_infer_sell_side():
 
 def test_infer_mid_when_no_nbbo():
     result = infer_side(1.1, None)
-    assert result.side == 'MID'
+    assert result.side == 'MID'
+
+
+def test_infer_sides_matches_scalar_including_crossed_and_locked():
+    rng = np.random.default_rng(7)
+    bids = np.round(rng.uniform(0.5, 2.0, 500), 2)
+    asks = np.round(bids + rng.uniform(-0.2, 0.4, 500), 2)
+    asks[:50] = bids[:50]
+    prices = np.round(bids + rng.uniform(-0.3, 0.6, 500), 2)
+    bids[60] = np.nan
+    missing = rng.random(500) < 0.1
+    now = datetime.utcnow()
+
+    codes, epsilons = infer_sides(prices, bids, asks, missing)
+    labels = side_labels(codes)
+    for i in range(500):
+        quote = None if missing[i] else NBBOQuote(bid=bids[i], ask=asks[i], timestamp=now)
+        expected = infer_side(float(prices[i]), quote)
+        assert labels[i] == expected.side
+        assert epsilons[i] == expected.epsilon
@@ -10,7 +10,9 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 import scripts.init_db as init_db  # noqa: E402
+from option_flow.api import main as api_main  # noqa: E402
 from option_flow.config import settings as settings_module
+from option_flow.storage.duckdb_client import close_pool  # noqa: E402
 
 
 @pytest.fixture(autouse=True)
@@ -25,7 +27,10 @@ def seeded_database(tmp_path, monkeypatch):
     con.close()
 
     monkeypatch.setenv("OPTION_FLOW_DUCKDB_PATH", str(db_path))
+    monkeypatch.setenv("OPTION_FLOW_COLD_STORAGE_PATH", str(tmp_path / "cold"))
     monkeypatch.setenv("OPTION_FLOW_DEMO_MODE", "true")
     settings_module.get_settings.cache_clear()
     yield
+    api_main.get_window_engine.cache_clear()
+    close_pool()
     settings_module.get_settings.cache_clear()
@@ -0,0 +1,53 @@
+﻿from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+from option_flow.ingest.pipeline import IngestPipeline
+from option_flow.storage.duckdb_client import query_df
+from option_flow.storage.payloads import decompress_payloads
+
+
+async def _frames(frames):
+    for frame in frames:
+        yield frame
+
+
+def test_pipeline_writes_labeled_trades():
+    now_ms = int(time.time() * 1000)
+    symbol = 'O:SPY991231C00450000'
+    frames = [
+        [{'ev': 'Q', 'sym': symbol, 'bp': 1.0, 'ap': 1.2, 'bs': 10, 'as': 12, 't': now_ms, 'q': 1}],
+        [
+            {'ev': 'T', 'sym': symbol, 'p': 1.2, 's': 5, 't': now_ms + 10, 'q': 2},
+            {'ev': 'T', 'sym': symbol, 'p': 1.19, 's': 7, 't': now_ms + 50, 'q': 3},
+            {'ev': 'status', 'message': 'authenticated'},
+        ],
+    ]
+    pipeline = IngestPipeline(max_batch_rows=1)
+    asyncio.run(pipeline.run(_frames(frames)))
+
+    df = query_df(
+        "SELECT side, sweep_id, bid AS nbbo_bid, premium, contracts.occ_symbol "
+        "FROM trades_labeled JOIN contracts USING (contract_id) "
+        "LEFT JOIN nbbo_at_trade USING (vendor_trade_id) "
+        "WHERE trades_labeled.symbol = 'SPY' AND trades_labeled.expiry = DATE '2099-12-31' "
+        "ORDER BY trade_ts_utc"
+    )
+    assert list(df['side']) == ['BUY', 'BUY']
+    assert df['sweep_id'].nunique() == 1
+    assert df['premium'].iloc[0] == 1.2 * 5 * 100
+    assert set(df['occ_symbol']) == {symbol}
+    blobs = query_df('SELECT payload FROM raw_payloads')['payload']
+    lines = [line for blob in blobs for line in decompress_payloads(blob)]
+    assert sum(json.loads(line).get('sym') == symbol for line in lines) == 2
+    nbbo = query_df('SELECT COUNT(*) AS cnt FROM nbbo_at_trade WHERE bid_size = 10')
+    assert int(nbbo.iloc[0]['cnt']) == 2
+    assert pipeline.stats.rows_written == 2
+
+    sweeps = query_df('SELECT legs, total_size, notional, vwap, side FROM sweeps')
+    assert len(sweeps) == 1
+    sweep = sweeps.iloc[0]
+    assert (sweep['legs'], sweep['total_size'], sweep['side']) == (2, 12, 'BUY')
+    assert abs(sweep['vwap'] - (1.2 * 5 + 1.19 * 7) / 12) < 1e-9
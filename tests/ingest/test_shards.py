@@ -0,0 +1,60 @@
+﻿from __future__ import annotations
+
+import asyncio
+import time
+
+import pandas as pd
+
+from option_flow.ingest.shards import (
+    ShardSupervisor,
+    load_symbols,
+    partition_symbols,
+    shard_for,
+    underlying_of,
+)
+from option_flow.storage.duckdb_client import query_df
+
+
+def _fake_shard(index, symbols, frames):
+    trades = pd.DataFrame(
+        {
+            'vendor_trade_id': [f'shard-{index}-{symbol}' for symbol in symbols],
+            'symbol': symbols,
+            'trade_ts_utc': pd.Timestamp.now('UTC').tz_localize(None),
+            'premium': 1_000.0,
+        }
+    )
+    frames.put({'trades_labeled': trades})
+
+
+def test_partition_is_stable_and_groups_underlyings():
+    symbols = ['SPY', 'QQQ', 'AAPL', 'TSLA', 'NVDA', 'O:SPY991231C00450000']
+    parts = partition_symbols(symbols, 3)
+    assert sorted(sum(parts, [])) == sorted(symbols)
+    assert parts == partition_symbols(symbols, 3)
+    assert underlying_of('O:SPY991231C00450000') == 'SPY'
+    assert shard_for('O:SPY991231C00450000', 3) == shard_for('SPY', 3)
+
+
+def test_load_symbols_reads_list_file(tmp_path):
+    path = tmp_path / 'symbols.txt'
+    path.write_text('spy, qqq\n# index products\nIWM\nSPY\n', encoding='utf-8')
+    assert load_symbols(path) == ['SPY', 'QQQ', 'IWM']
+
+
+def test_supervisor_writes_batches_from_every_shard():
+    symbols = ['SPY', 'QQQ', 'AAPL', 'TSLA']
+    supervisor = ShardSupervisor(symbols, 2, target=_fake_shard)
+
+    async def drive():
+        task = asyncio.create_task(supervisor.run())
+        deadline = time.monotonic() + 30
+        while supervisor.stats.batches_written < len(supervisor.shards):
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        supervisor.stop()
+        await task
+
+    asyncio.run(drive())
+    df = query_df("SELECT symbol FROM trades_labeled WHERE vendor_trade_id LIKE 'shard-%'")
+    assert sorted(df['symbol']) == sorted(symbols)
@@ -1,8 +1,10 @@
 ﻿from __future__ import annotations
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
-from option_flow.ingest.nbbo_cache import NBBOCache
+import numpy as np
+
+from option_flow.ingest.nbbo_cache import NBBOCache, to_ns
 
 
 def test_cache_returns_recent_quote():
@@ -17,4 +19,36 @@ def test_cache_expires_stale_quote():
     cache = NBBOCache()
     now = datetime.utcnow()
     cache.upsert('contract', 1.0, 1.2, now - timedelta(seconds=120))
-    assert cache.get('contract', now=now) is None
+    assert cache.get('contract', now=now) is None
+
+
+def test_get_many_masks_missing_and_stale_quotes():
+    cache = NBBOCache()
+    now = datetime.utcnow()
+    cache.upsert(1, 1.0, 1.2, now, bid_size=5)
+    cache.upsert(2, 2.0, 2.2, now - timedelta(seconds=120))
+    slots = np.array([cache.slot(1), cache.slot(2), -1])
+    snapshot = cache.get_many(slots, to_ns(now))
+    assert list(snapshot.valid) == [True, False, False]
+    assert snapshot.bid[0] == 1.0 and snapshot.bid_size[0] == 5
+
+
+def test_bulk_expire_uses_timer_wheel():
+    cache = NBBOCache()
+    now = datetime.utcnow()
+    cache.upsert('old', 1.0, 1.2, now - timedelta(seconds=120))
+    cache.upsert('fresh', 1.0, 1.2, now)
+    assert cache.bulk_expire(now=now) == 1
+    assert len(cache) == 1
+    assert cache.get('fresh', now=now) is not None
+
+
+def test_evict_expired_contracts_releases_slots():
+    expiries = {'SPY-old': date(2024, 1, 19), 'SPY-new': date(2099, 1, 16)}
+    cache = NBBOCache(expiry_lookup=expiries.get)
+    now = datetime.utcnow()
+    cache.upsert('SPY-old', 1.0, 1.2, now)
+    cache.upsert('SPY-new', 1.0, 1.2, now)
+    assert cache.evict_expired(date(2024, 6, 1)) == 1
+    assert cache.get('SPY-old', now=now) is None
+    assert cache.slot('SPY-other') == 0
@@ -0,0 +1,52 @@
+﻿from __future__ import annotations
+
+import time
+
+import numpy as np
+
+from option_flow.ingest.conflation import QuoteConflator
+from option_flow.ingest.nbbo_cache import NBBOCache
+from option_flow.ingest.pipeline import IngestPipeline
+from option_flow.vendors.polygon import QuoteEvent, TradeEvent
+
+
+def test_conflator_keeps_newest_quote_per_contract():
+    cache = NBBOCache()
+    conflator = QuoteConflator(cache)
+    now_ns = time.time_ns()
+    conflator.add(1, 1.0, 1.2, now_ns)
+    conflator.add(1, 1.1, 1.3, now_ns + 10, bid_size=4)
+    conflator.add(1, 0.9, 1.1, now_ns + 5)
+    conflator.add(2, 2.0, 2.2, now_ns)
+    assert cache.get(1, now=now_ns) is None
+
+    assert conflator.flush_all() == 2
+    quote = cache.get(1, now=now_ns + 10)
+    assert quote is not None
+    assert (quote.bid, quote.ask, quote.bid_size) == (1.1, 1.3, 4)
+    assert conflator.conflated == 2
+    assert len(conflator) == 0
+
+
+def test_pipeline_flushes_pending_quote_before_trade():
+    pipeline = IngestPipeline()
+    symbol = 'O:SPY991231C00450000'
+    now_ms = int(time.time() * 1000)
+    tick = [
+        QuoteEvent(symbol, 1.0, 1.2, 10, 10, now_ms),
+        QuoteEvent(symbol, 1.05, 1.25, 10, 10, now_ms + 1),
+        TradeEvent(symbol, 1.25, 1, now_ms + 2),
+        QuoteEvent(symbol, 1.3, 1.5, 10, 10, now_ms + 3),
+        QuoteEvent(symbol, 1.35, 1.55, 10, 10, now_ms + 4),
+        TradeEvent(symbol, 1.55, 1, now_ms + 5),
+        QuoteEvent(symbol, 2.0, 2.2, 10, 10, now_ms + 6),
+    ]
+    for event in tick:
+        pipeline.enrich(event)
+    pipeline.end_tick()
+
+    nbbo = pipeline._batch.nbbo()
+    assert nbbo.valid.all()
+    np.testing.assert_allclose(nbbo.bid, [1.05, 1.35])
+    assert pipeline._nbbo.get(pipeline.registry.lookup(symbol), now=now_ms * 1_000_000).bid == 2.0
+    assert pipeline.stats.quotes_conflated == 2
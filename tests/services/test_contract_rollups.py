@@ -0,0 +1,91 @@
+﻿from __future__ import annotations
+
+from datetime import timedelta
+
+import duckdb
+import pandas as pd
+
+from option_flow.config.settings import get_settings
+from option_flow.services.contract_rollups import (
+    CONTRACT_ROLLUP_KEYS,
+    CONTRACT_ROLLUP_SUMS,
+    CONTRACT_ROLLUP_TABLE,
+    contract_deltas,
+    top_strikes,
+)
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_MID, SIDE_SELL
+from option_flow.storage.duckdb_client import query_df
+
+SIDE_CODES = {'BUY': SIDE_BUY, 'SELL': SIDE_SELL, 'MID': SIDE_MID}
+
+
+def _ranked_from_trades(start, zero_dte_only=False) -> pd.DataFrame:
+    return query_df(
+        f"""
+        SELECT symbol, expiry, strike, call_put, SUM(premium) AS premium
+        FROM trades_labeled
+        WHERE trade_ts_utc >= ? {'AND is_0dte' if zero_dte_only else ''}
+        GROUP BY ALL
+        ORDER BY symbol, premium DESC, strike, expiry
+        """,
+        [start],
+    )
+
+
+def test_contract_deltas_match_stored_rollups():
+    trades = query_df('SELECT * FROM trades_labeled')
+    deltas = contract_deltas(
+        trades['symbol'].to_numpy(),
+        trades['contract_id'].to_numpy(),
+        pd.DatetimeIndex(trades['trade_ts_utc']).as_unit('ns').asi8,
+        trades['premium'].to_numpy(),
+        trades['notional'].to_numpy(),
+        trades['side'].astype(str).map(SIDE_CODES).to_numpy(),
+        trades['is_0dte'].to_numpy(),
+    )
+    stored = query_df(f'SELECT * FROM {CONTRACT_ROLLUP_TABLE}')
+    columns = [*CONTRACT_ROLLUP_KEYS, *CONTRACT_ROLLUP_SUMS]
+    pd.testing.assert_frame_equal(
+        deltas[columns].sort_values(columns[:4]).reset_index(drop=True),
+        stored[columns].sort_values(columns[:4]).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_top_strikes_match_ranking_over_prints():
+    (tenth,) = query_df(
+        'SELECT trade_ts_utc FROM trades_labeled ORDER BY trade_ts_utc LIMIT 1 OFFSET 9'
+    )['trade_ts_utc']
+    for start in (tenth.to_pydatetime(), tenth.to_pydatetime() + timedelta(microseconds=1)):
+        expected = _ranked_from_trades(start)
+        ranked = top_strikes(start, limit=1_000)
+        pd.testing.assert_frame_equal(ranked, expected, check_dtype=False)
+
+        top = top_strikes(start)
+        assert top.groupby('symbol').size().max() == 3
+        for symbol, sub in top.groupby('symbol'):
+            best = expected[expected['symbol'] == symbol]['premium'].head(3)
+            assert list(sub['premium']) == list(best)
+
+
+def test_top_strikes_filters_and_zero_dte():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    try:
+        start = con.execute('SELECT min(trade_ts_utc) FROM trades_labeled').fetchone()[0]
+        con.execute("UPDATE trades_labeled SET is_0dte = true WHERE symbol = 'QQQ'")
+        con.execute(
+            f"UPDATE {CONTRACT_ROLLUP_TABLE} SET zero_dte_premium = total_premium "
+            "WHERE symbol = 'QQQ'"
+        )
+    finally:
+        con.close()
+
+    zero_dte = top_strikes(start, zero_dte_only=True, limit=1_000)
+    pd.testing.assert_frame_equal(
+        zero_dte, _ranked_from_trades(start, zero_dte_only=True), check_dtype=False
+    )
+    assert set(zero_dte['symbol']) == {'QQQ'}
+    puts = top_strikes(start, symbol='SPY', call_put='P', limit=5)
+    assert len(puts) == 5
+    assert set(puts['call_put'].astype(str)) == {'P'}
+    assert set(puts['symbol']) == {'SPY'}
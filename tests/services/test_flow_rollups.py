@@ -0,0 +1,50 @@
+﻿from __future__ import annotations
+
+from datetime import datetime
+
+import pandas as pd
+
+from option_flow.services.flow_rollups import (
+    FLOW_ROLLUP_KEYS,
+    FLOW_ROLLUP_SUMS,
+    FLOW_ROLLUP_TABLE,
+    flow_deltas,
+    notional_buckets,
+    plan_window,
+)
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_MID, SIDE_SELL
+from option_flow.storage.duckdb_client import query_df
+
+SIDE_CODES = {'BUY': SIDE_BUY, 'SELL': SIDE_SELL, 'MID': SIDE_MID}
+
+
+def test_plan_window_prefers_rollups_for_bucket_edges():
+    start = datetime(2030, 1, 2, 15, 4, 30)
+    plan = plan_window(start, 250_000)
+    assert plan.source == 'rollups'
+    assert plan.rollup_from == datetime(2030, 1, 2, 15, 5)
+    assert plan_window(start.replace(second=0)).rollup_from == start.replace(second=0)
+    assert plan_window(start, 12_345).source == 'trades'
+    assert list(notional_buckets([0, 9_999, 10_000, 260_000, 5e6])) == [
+        0, 0, 10_000, 250_000, 1_000_000
+    ]
+
+
+def test_flow_deltas_match_stored_rollups():
+    trades = query_df('SELECT * FROM trades_labeled')
+    deltas = flow_deltas(
+        trades['symbol'].to_numpy(),
+        pd.DatetimeIndex(trades['trade_ts_utc']).as_unit('ns').asi8,
+        trades['notional'].to_numpy(),
+        trades['side'].astype(str).map(SIDE_CODES).to_numpy(),
+        trades['call_put'].astype(str).to_numpy(),
+        trades['is_0dte'].to_numpy(),
+    )
+    stored = query_df(f'SELECT * FROM {FLOW_ROLLUP_TABLE}')
+    stored['call_put'] = stored['call_put'].astype(str)
+    columns = [*FLOW_ROLLUP_KEYS, *FLOW_ROLLUP_SUMS]
+    pd.testing.assert_frame_equal(
+        deltas[columns].sort_values(columns[:5]).reset_index(drop=True),
+        stored[columns].sort_values(columns[:5]).reset_index(drop=True),
+        check_dtype=False,
+    )
@@ -0,0 +1,106 @@
+﻿from __future__ import annotations
+
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+from option_flow.ingest.pipeline import IngestPipeline
+from option_flow.services.minute_rollups import (
+    NS_PER_MINUTE,
+    PREMIUM_METRICS,
+    MinuteRollupAccumulator,
+)
+from option_flow.services.side_classifier import SIDE_BUY, SIDE_MID, SIDE_SELL
+from option_flow.storage.duckdb_client import query_df
+
+BASE_NS = int(pd.Timestamp('2030-01-02 15:00').value)
+
+
+def _trades(rng: np.random.Generator, rows: int) -> dict[str, np.ndarray]:
+    return {
+        'symbols': rng.choice(np.array(['SPY', 'QQQ', 'TSLA'], dtype=object), rows),
+        'timestamps_ns': BASE_NS + rng.integers(0, 5 * NS_PER_MINUTE, rows),
+        'premium': rng.uniform(100, 10_000, rows),
+        'side_codes': rng.choice([SIDE_BUY, SIDE_SELL, SIDE_MID], rows),
+        'is_call': rng.random(rows) < 0.5,
+        'is_0dte': rng.random(rows) < 0.3,
+    }
+
+
+def _expected(trades: dict[str, np.ndarray]) -> pd.DataFrame:
+    premium = trades['premium']
+    frame = pd.DataFrame(
+        {
+            'symbol': trades['symbols'],
+            'minute_bucket': (
+                trades['timestamps_ns'] // NS_PER_MINUTE * NS_PER_MINUTE
+            ).astype('datetime64[ns]'),
+            'total_premium': premium,
+            'call_premium': np.where(trades['is_call'], premium, 0.0),
+            'put_premium': np.where(trades['is_call'], 0.0, premium),
+            'buy_premium': np.where(trades['side_codes'] == SIDE_BUY, premium, 0.0),
+            'sell_premium': np.where(trades['side_codes'] == SIDE_SELL, premium, 0.0),
+            'zero_dte_premium': np.where(trades['is_0dte'], premium, 0.0),
+            'trades_count': 1,
+        }
+    )
+    return frame.groupby(['symbol', 'minute_bucket'], as_index=False).sum()
+
+
+def _sorted(frame: pd.DataFrame) -> pd.DataFrame:
+    columns = ['symbol', 'minute_bucket', *PREMIUM_METRICS, 'trades_count']
+    return frame[columns].sort_values(['symbol', 'minute_bucket']).reset_index(drop=True)
+
+
+def test_accumulator_matches_grouped_aggregation():
+    rng = np.random.default_rng(7)
+    first, second = _trades(rng, 500), _trades(rng, 300)
+    accumulator = MinuteRollupAccumulator(capacity=4)
+
+    accumulator.add(**first)
+    pd.testing.assert_frame_equal(_sorted(accumulator.flush()), _sorted(_expected(first)))
+    accumulator.add(**second)
+    delta = accumulator.flush()
+    pd.testing.assert_frame_equal(_sorted(delta), _sorted(_expected(second)))
+    assert np.allclose(delta['net_premium'], delta['buy_premium'] - delta['sell_premium'])
+    assert len(accumulator) == 0
+    assert accumulator.flush().empty
+
+
+async def _frames(frames):
+    for frame in frames:
+        yield frame
+
+
+def test_pipeline_adds_rollup_deltas_with_each_batch():
+    now_ms = int(time.time() * 1000) // 60_000 * 60_000 + 1_000
+    symbol = 'O:AMD991231P00150000'
+    trades = [
+        {'ev': 'T', 'sym': symbol, 'p': 2.0, 's': 3, 't': now_ms, 'q': 1},
+        {'ev': 'T', 'sym': symbol, 'p': 2.5, 's': 4, 't': now_ms + 5, 'q': 2},
+    ]
+    pipeline = IngestPipeline(max_batch_rows=1)
+    asyncio.run(pipeline.run(_frames([trades[:1], trades, trades[1:]])))
+
+    assert pipeline.stats.duplicates == 2
+    minute = pd.Timestamp(now_ms // 60_000 * 60_000, unit='ms')
+    rollup = query_df(
+        'SELECT total_premium, put_premium, trades_count FROM rollups_min '
+        "WHERE symbol = 'AMD' AND minute_bucket = ?",
+        [minute.to_pydatetime()],
+    )
+    assert len(rollup) == 1
+    assert rollup.iloc[0]['total_premium'] == 2.0 * 3 * 100 + 2.5 * 4 * 100
+    assert rollup.iloc[0]['put_premium'] == rollup.iloc[0]['total_premium']
+    assert rollup.iloc[0]['trades_count'] == 2
+    daily = query_df(
+        "SELECT SUM(total_premium) AS total FROM rollups_1d WHERE symbol = 'AMD'"
+    )
+    assert daily.iloc[0]['total'] == rollup.iloc[0]['total_premium']
+    flow = query_df(
+        "SELECT call_put, notional_bucket, trades_count FROM flow_rollups_min "
+        "WHERE symbol = 'AMD' ORDER BY notional_bucket"
+    )
+    assert flow.astype({'call_put': str}).values.tolist() == [['P', 0.0, 2]]
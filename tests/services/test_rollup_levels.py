@@ -0,0 +1,100 @@
+﻿from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import duckdb
+import pandas as pd
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.services.rollup_levels import (
+    ROLLUP_LEVELS,
+    ROLLUP_SUMS,
+    cascade_deltas,
+    coarsest_level,
+    cover,
+    rollup_bars,
+    window_totals,
+)
+
+
+def _connect() -> duckdb.DuckDBPyConnection:
+    return duckdb.connect(str(get_settings().duckdb_path))
+
+
+def test_cover_uses_coarsest_buckets_that_fit():
+    start, end = datetime(2030, 1, 2, 9, 37), datetime(2030, 1, 2, 19, 17)
+    segments = [(level.table, first.strftime('%H:%M'), last.strftime('%H:%M'))
+                for level, first, last in cover(start, end)]
+    assert segments == [
+        ('rollups_min', '09:37', '09:40'),
+        ('rollups_5m', '09:40', '09:45'),
+        ('rollups_15m', '09:45', '10:00'),
+        ('rollups_1h', '10:00', '19:00'),
+        ('rollups_15m', '19:00', '19:15'),
+        ('rollups_min', '19:15', '19:17'),
+    ]
+    month = cover(datetime(2030, 1, 1), datetime(2030, 2, 1))
+    assert [(level.table, last - first) for level, first, last in month] == [
+        ('rollups_1d', timedelta(days=31))
+    ]
+    assert coarsest_level(datetime(2030, 1, 2, 10), datetime(2030, 1, 2, 19, 30)).minutes == 15
+    with pytest.raises(ValueError):
+        cover(start + timedelta(seconds=1), end)
+
+
+def test_cascade_deltas_match_cascade_refresh():
+    con = _connect()
+    try:
+        minute = con.execute(
+            f"SELECT symbol, minute_bucket, {', '.join(ROLLUP_SUMS)}, updated_at FROM rollups_min"
+        ).df()
+        deltas = cascade_deltas(minute)
+        for level in ROLLUP_LEVELS[1:]:
+            stored = con.execute(
+                f"SELECT symbol, minute_bucket, {', '.join(ROLLUP_SUMS)} FROM {level.table}"
+            ).df()
+            expected = deltas[level.table][stored.columns]
+            pd.testing.assert_frame_equal(
+                stored.sort_values(['symbol', 'minute_bucket']).reset_index(drop=True),
+                expected.sort_values(['symbol', 'minute_bucket']).reset_index(drop=True),
+                check_dtype=False,
+            )
+    finally:
+        con.close()
+
+
+def test_window_totals_match_minute_rows():
+    con = _connect()
+    try:
+        first, last, symbol = con.execute(
+            'SELECT min(minute_bucket), max(minute_bucket), arg_min(symbol, minute_bucket) '
+            'FROM rollups_min'
+        ).fetchone()
+        start = first - timedelta(minutes=7)
+        end = last + timedelta(hours=3, minutes=1)
+        totals = window_totals(con, start, end).set_index('symbol').sort_index()
+        expected = con.execute(
+            f"""
+            SELECT symbol, {', '.join(f'SUM({name}) AS {name}' for name in ROLLUP_SUMS)}
+            FROM rollups_min GROUP BY symbol ORDER BY symbol
+            """
+        ).df().set_index('symbol')
+        pd.testing.assert_frame_equal(totals, expected, check_dtype=False)
+
+        open_ended = window_totals(con, start).set_index('symbol').sort_index()
+        pd.testing.assert_frame_equal(open_ended, expected, check_dtype=False)
+
+        only = window_totals(con, start, end, symbols=[symbol])
+        assert list(only['symbol']) == [symbol]
+        day = ROLLUP_LEVELS[-1].floor(first)
+        bars = rollup_bars(con, symbol, day, day + timedelta(days=1))
+        (day_total,) = con.execute(
+            'SELECT SUM(total_premium) FROM rollups_min '
+            'WHERE symbol = ? AND minute_bucket >= ? AND minute_bucket < ?',
+            [symbol, day, day + timedelta(days=1)],
+        ).fetchone()
+        assert len(bars) == 1
+        assert bars['total_premium'].iloc[0] == pytest.approx(day_total)
+    finally:
+        con.close()
@@ -1,7 +1,13 @@
 ﻿from __future__ import annotations
 
+from datetime import timedelta
+
+import duckdb
+
+from option_flow.config.settings import get_settings
 from option_flow.services.rollups import RollupService
 from option_flow.storage.duckdb_client import query_df
+from option_flow.storage.writer import DuckDBWriter, sql_op
 
 
 def test_rollup_service_refreshes_data():
@@ -9,3 +15,81 @@ def test_rollup_service_refreshes_data():
     service.refresh_recent_minutes(60)
     df = query_df('SELECT COUNT(*) AS cnt FROM rollups_min')
     assert int(df.iloc[0]['cnt']) > 0
+
+
+def test_refresh_only_touches_dirty_buckets():
+    service = RollupService(grace_ms=0)
+    assert service.refresh_recent_minutes(60) > 0
+    assert service.refresh_recent_minutes(60) == 0
+
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    late, untouched = con.execute(
+        """
+        SELECT minute_bucket FROM rollups_min WHERE symbol = 'SPY'
+        ORDER BY minute_bucket LIMIT 2
+        """
+    ).fetchall()
+    before = dict(
+        con.execute(
+            "SELECT minute_bucket, updated_at FROM rollups_min WHERE symbol = 'SPY'"
+        ).fetchall()
+    )
+    con.execute(
+        """
+        INSERT INTO trades_labeled (
+            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,
+            price, size, notional, premium, epsilon_used, side, is_0dte
+        )
+        VALUES ('late-1', 'SPY', DATE '2099-12-31', 450.0, 'P', ?, 2.0, 10, 2000.0, 2000.0,
+                0.01, 'SELL', false)
+        """,
+        [late[0] + timedelta(seconds=30)],
+    )
+    expected = con.execute(
+        "SELECT SUM(premium), COUNT(*) FROM trades_labeled "
+        "WHERE symbol = 'SPY' AND date_trunc('minute', trade_ts_utc) = ?",
+        [late[0]],
+    ).fetchone()
+    con.close()
+
+    assert service.refresh_recent_minutes(60) == 1
+    rows = query_df(
+        "SELECT minute_bucket, total_premium, trades_count, updated_at FROM rollups_min "
+        "WHERE symbol = 'SPY'"
+    ).set_index('minute_bucket')
+    assert (rows.loc[late[0], 'total_premium'], rows.loc[late[0], 'trades_count']) == expected
+    assert rows.loc[untouched[0], 'updated_at'] == before[untouched[0]]
+    assert rows.loc[late[0], 'updated_at'] > before[late[0]]
+
+
+def test_repair_pass_folds_in_trades_written_elsewhere():
+    service = RollupService(grace_ms=0)
+    service.refresh_recent_minutes(60)
+    (minute,) = query_df(
+        "SELECT max(minute_bucket) AS minute FROM rollups_min WHERE symbol = 'SPY'"
+    )['minute']
+    with DuckDBWriter(flush_interval_ms=0) as writer:
+        writer.write(
+            sql_op(
+                """
+                INSERT INTO trades_labeled (
+                    vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,
+                    price, size, notional, premium, epsilon_used, side, is_0dte
+                )
+                VALUES ('repair-1', 'SPY', DATE '2099-12-31', 450.0, 'C', ?, 1.0, 5, 500.0,
+                        500.0, 0.01, 'BUY', false)
+                """,
+                [minute + timedelta(seconds=10)],
+            )
+        )
+        assert writer.write(service.write_op, label='rollups') == 1
+    rows = query_df(
+        "SELECT trades_count FROM rollups_min WHERE symbol = 'SPY' AND minute_bucket = ?",
+        [minute],
+    )
+    expected = query_df(
+        "SELECT COUNT(*) AS cnt FROM trades_labeled "
+        "WHERE symbol = 'SPY' AND date_trunc('minute', trade_ts_utc) = ?",
+        [minute],
+    )
+    assert rows.iloc[0]['trades_count'] == expected.iloc[0]['cnt']
@@ -2,6 +2,8 @@
 
 from datetime import datetime, timedelta
 
+import numpy as np
+
 from option_flow.services.sweep_cluster import SweepClusterer
 
 
@@ -18,4 +20,80 @@ def test_sweep_new_cluster_after_window():
     ts = datetime.utcnow()
     first = clusterer.assign('SPY-20251024-400C', 'BUY', ts)
     second = clusterer.assign('SPY-20251024-400C', 'BUY', ts + timedelta(milliseconds=300))
-    assert first != second
+    assert first != second
+
+
+def test_sweep_ids_are_unique_across_instances():
+    ts = datetime.utcnow()
+    first = SweepClusterer().assign('SPY-20251024-400C', 'BUY', ts)
+    second = SweepClusterer().assign('SPY-20251024-400C', 'BUY', ts)
+    assert first != second
+
+
+def test_idle_keys_are_evicted():
+    clusterer = SweepClusterer(window_ms=200)
+    ts = datetime.utcnow()
+    clusterer.assign('SPY-20251024-400C', 'BUY', ts)
+    clusterer.assign('SPY-20251024-410C', 'BUY', ts + timedelta(milliseconds=100))
+    clusterer.assign('SPY-20251024-420C', 'SELL', ts + timedelta(seconds=1))
+    assert len(clusterer) == 1
+
+
+def test_assign_batch_matches_scalar_and_keeps_totals():
+    rng = np.random.default_rng(3)
+    contracts = rng.integers(0, 5, 300)
+    sides = rng.integers(0, 3, 300)
+    timestamps = np.sort(rng.integers(0, 60_000, 300)) * 1_000_000 + 1_700_000_000 * 10**9
+    sizes = rng.integers(1, 20, 300)
+
+    split = 150
+    batch = SweepClusterer(window_ms=200)
+    first, second = (
+        batch.assign_batch(contracts[part], sides[part], timestamps[part], sizes=sizes[part])
+        for part in (slice(None, split), slice(split, None))
+    )
+    batch_ids = np.concatenate([first.sweep_ids, second.sweep_ids])
+
+    scalar = SweepClusterer(window_ms=200)
+    epoch = datetime(1970, 1, 1)
+    scalar_ids = [
+        scalar.assign(int(c), int(s), epoch + timedelta(microseconds=int(t) // 1000))
+        for c, s, t in zip(contracts, sides, timestamps, strict=True)
+    ]
+    relabel = dict(zip(scalar_ids, batch_ids, strict=True))
+    assert len(set(relabel.values())) == len(set(scalar_ids))
+    assert [relabel[sweep] for sweep in scalar_ids] == list(batch_ids)
+
+    totals = {sweep.sweep_id: sweep for sweep in first.sweeps + second.sweeps}
+    for sweep_id, sweep in totals.items():
+        rows = batch_ids == sweep_id
+        assert sweep.fills == rows.sum()
+        assert sweep.contracts == sizes[rows].sum()
+        assert sweep.first_ns == timestamps[rows].min()
+        assert sweep.last_ns == timestamps[rows].max()
+
+
+def test_out_of_order_fill_opens_its_own_sweep():
+    base = 1_700_000_000 * 10**9
+    second = 10**9
+    clusterer = SweepClusterer(window_ms=200)
+    open_sweep = clusterer.assign_batch(
+        np.array([1]), np.array([1]), np.array([base + 100 * second])
+    )
+    late = clusterer.assign_batch(np.array([1]), np.array([1]), np.array([base + 70 * second]))
+    assert late.sweep_ids[0] != open_sweep.sweep_ids[0]
+    assert late.sweeps[0].first_ns == base + 70 * second
+
+    # The open sweep keeps its span and still takes the next in-order fill.
+    later = clusterer.assign_batch(
+        np.array([1]), np.array([1]), np.array([base + 100 * second + 150_000_000])
+    )
+    assert later.sweep_ids[0] == open_sweep.sweep_ids[0]
+    assert later.sweeps[0].first_ns == base + 100 * second
+
+    # A fill just before the open sweep's first leg joins it and moves the start back.
+    earlier = clusterer.assign_batch(
+        np.array([1]), np.array([1]), np.array([base + 100 * second - 50_000_000])
+    )
+    assert earlier.sweep_ids[0] == open_sweep.sweep_ids[0]
+    assert earlier.sweeps[0].first_ns == base + 100 * second - 50_000_000
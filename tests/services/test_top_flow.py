@@ -0,0 +1,97 @@
+﻿from __future__ import annotations
+
+from datetime import timedelta
+
+import duckdb
+import pandas as pd
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.services.contract_rollups import CONTRACT_ROLLUP_TABLE, top_strikes
+from option_flow.services.flow_rollups import FLOW_ROLLUP_TABLE
+from option_flow.services.rollup_levels import ROLLUP_TABLES
+from option_flow.services.top_flow import top_flows
+from option_flow.storage.duckdb_client import query_df
+
+
+def _flows_from_trades(start, call_put=None, zero_dte_only=False, min_notional=0.0):
+    trades = query_df(
+        'SELECT * FROM trades_labeled WHERE trade_ts_utc >= ? AND notional >= ?',
+        [start, min_notional],
+    )
+    trades['call_put'] = trades['call_put'].astype(str)
+    if call_put is not None:
+        trades = trades[trades['call_put'] == call_put]
+    if zero_dte_only:
+        trades = trades[trades['is_0dte']]
+    premium = trades['premium']
+    return (
+        pd.DataFrame(
+            {
+                'symbol': trades['symbol'],
+                'total_premium': premium,
+                'call_premium': premium.where(trades['call_put'] == 'C', 0.0),
+                'put_premium': premium.where(trades['call_put'] == 'P', 0.0),
+                'buy_premium': premium.where(trades['side'] == 'BUY', 0.0),
+                'sell_premium': premium.where(trades['side'] == 'SELL', 0.0),
+                'zero_dte_premium': premium.where(trades['is_0dte'], 0.0),
+            }
+        )
+        .groupby('symbol', as_index=False)
+        .sum()
+        .assign(net_premium=lambda df: df['buy_premium'] - df['sell_premium'])
+    )
+
+
+@pytest.fixture
+def start():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    try:
+        con.execute("UPDATE trades_labeled SET is_0dte = true WHERE symbol = 'QQQ'")
+        con.execute(f"UPDATE {FLOW_ROLLUP_TABLE} SET is_0dte = true WHERE symbol = 'QQQ'")
+        con.execute(
+            f"UPDATE {CONTRACT_ROLLUP_TABLE} SET zero_dte_premium = total_premium "
+            "WHERE symbol = 'QQQ'"
+        )
+        for table in ROLLUP_TABLES:
+            con.execute(
+                f"UPDATE {table} SET zero_dte_premium = total_premium WHERE symbol = 'QQQ'"
+            )
+        (first,) = con.execute('SELECT min(trade_ts_utc) FROM trades_labeled').fetchone()
+    finally:
+        con.close()
+    return first + timedelta(minutes=5, seconds=1)
+
+
+@pytest.mark.parametrize(
+    'filters',
+    [
+        {},
+        {'min_notional': 10_000.0},
+        {'min_notional': 12_000.0},
+        {'call_put': 'C'},
+        {'call_put': 'P', 'zero_dte_only': True},
+    ],
+)
+def test_top_flows_match_aggregation_over_prints(start, filters):
+    rows = top_flows(start, **filters)
+    expected = _flows_from_trades(start, **filters).assign(
+        zero_dte_percent=lambda df: df['zero_dte_premium'] / df['total_premium'] * 100.0
+    )
+    order = expected['net_premium'].abs().sort_values(ascending=False, kind='stable').index
+    expected = expected.loc[order].reset_index(drop=True)
+    columns = [column for column in rows.columns if column != 'top_strikes']
+    pd.testing.assert_frame_equal(rows[columns], expected[columns], check_dtype=False)
+
+    strikes = top_strikes(
+        start,
+        call_put=filters.get('call_put'),
+        zero_dte_only=filters.get('zero_dte_only', False),
+        min_notional=filters.get('min_notional', 0.0),
+    )
+    for symbol, labels in zip(rows['symbol'], rows['top_strikes'], strict=True):
+        best = strikes[strikes['symbol'] == symbol]
+        assert list(labels) == [
+            f"{row.strike:.2f}{row.call_put} ({row.expiry:%Y-%m-%d})"
+            for row in best.itertuples()
+        ]
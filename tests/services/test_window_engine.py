@@ -0,0 +1,124 @@
+﻿from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+
+import duckdb
+import pandas as pd
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.services.minute_rollups import ROLLUP_KEYS
+from option_flow.services.rollups import RollupService
+from option_flow.services.window_engine import WINDOW_MEASURES, WindowEngine
+from option_flow.storage.duckdb_client import accumulate_df
+
+NOW = datetime(2030, 1, 2, 15, 4, 30)
+
+
+def _rows(*buckets):
+    return pd.DataFrame(
+        [
+            {
+                'symbol': symbol,
+                'minute_bucket': NOW.replace(second=0) - timedelta(minutes=age),
+                **dict.fromkeys(WINDOW_MEASURES, value),
+            }
+            for symbol, age, value in buckets
+        ]
+    )
+
+
+def _total(engine, minutes, symbol='SPY', now=NOW):
+    totals = engine.totals(minutes, now=now).set_index('symbol')
+    return totals['total_premium'].get(symbol, 0.0)
+
+
+def test_window_totals_from_ring_buffers():
+    engine = WindowEngine(10)
+    engine.load(_rows(('SPY', 0, 1.0), ('SPY', 4, 10.0), ('SPY', 9, 100.0), ('QQQ', 1, 5.0)))
+    assert [_total(engine, minutes) for minutes in (1, 5, 10)] == [1.0, 11.0, 111.0]
+    totals = engine.totals(2, now=NOW)
+    assert list(totals['symbol']) == ['SPY', 'QQQ']
+    assert list(totals['trades_count']) == [1, 5]
+
+    engine.load(_rows(('SPY', 4, 20.0)))
+    assert [_total(engine, minutes) for minutes in (1, 5, 10)] == [1.0, 21.0, 121.0]
+
+    later = NOW + timedelta(minutes=3)
+    assert [_total(engine, minutes, now=later) for minutes in (3, 5, 10)] == [0.0, 1.0, 21.0]
+    assert list(engine.totals(10, now=later)['symbol']) == ['SPY', 'QQQ']
+    assert engine.totals(10, now=later + timedelta(minutes=10)).empty
+    with pytest.raises(ValueError):
+        engine.totals(11, now=later)
+
+
+def test_rebuild_and_sync_match_rollups_min():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    try:
+        (now,) = con.execute('SELECT max(minute_bucket) FROM rollups_min').fetchone()
+        engine = WindowEngine(560, sync_interval_ms=0)
+        assert engine.rebuild(con, now=now) == con.execute(
+            'SELECT count(*) FROM rollups_min'
+        ).fetchone()[0]
+        assert engine.due
+        for minutes in (5, 15, 30, 60, 560):
+            expected = con.execute(
+                f"""
+                SELECT symbol, {', '.join(WINDOW_MEASURES)}
+                FROM (
+                    SELECT symbol, {', '.join(f'SUM({name}) AS {name}' for name in WINDOW_MEASURES)}
+                    FROM rollups_min
+                    WHERE minute_bucket > CAST(? AS TIMESTAMP) - INTERVAL {minutes} MINUTE
+                    GROUP BY symbol
+                )
+                ORDER BY symbol
+                """,
+                [now],
+            ).df()
+            totals = engine.totals(minutes, now=now).sort_values('symbol')
+            pd.testing.assert_frame_equal(
+                totals[expected.columns].reset_index(drop=True), expected, check_dtype=False
+            )
+
+        before = _total(engine, 5, 'SPY', now)
+        con.execute(
+            """
+            UPDATE rollups_min
+            SET total_premium = total_premium + 1000, updated_at = updated_at + INTERVAL 1 SECOND
+            WHERE symbol = 'SPY' AND minute_bucket = ?
+            """,
+            [now - timedelta(minutes=2)],
+        )
+        assert engine.sync(con) >= 1
+        assert _total(engine, 5, 'SPY', now) == pytest.approx(before + 1000)
+    finally:
+        con.close()
+
+
+def test_sync_picks_up_deltas_after_a_repair_on_a_non_utc_session():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    try:
+        con.execute("SET TimeZone = 'Asia/Tokyo'")
+        (now,) = con.execute('SELECT max(minute_bucket) FROM rollups_min').fetchone()
+        engine = WindowEngine(560, sync_interval_ms=0)
+        engine.rebuild(con, now=now)
+        # The repair pass stamps rows from SQL; the ingest stamps its deltas in Python.
+        assert RollupService().write_op(con)
+        engine.sync(con)
+        before = _total(engine, 5, 'QQQ', now)
+        delta = pd.DataFrame(
+            [
+                {
+                    'symbol': 'QQQ',
+                    'minute_bucket': now,
+                    **dict.fromkeys(WINDOW_MEASURES, 0.0),
+                    'total_premium': 1000.0,
+                    'updated_at': datetime.now(UTC).replace(tzinfo=None),
+                }
+            ]
+        )
+        accumulate_df(con, 'rollups_min', delta, keys=ROLLUP_KEYS)
+        assert engine.sync(con) >= 1
+        assert _total(engine, 5, 'QQQ', now) == pytest.approx(before + 1000)
+    finally:
+        con.close()
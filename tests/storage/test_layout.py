@@ -0,0 +1,122 @@
+﻿from __future__ import annotations
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.storage.layout import ReclusterJob, disorder, late_floor, pruning_report
+from option_flow.storage.writer import frames_op
+
+
+def _fill_shuffled(con: duckdb.DuckDBPyConnection, rows: int) -> None:
+    con.execute('DELETE FROM trades_labeled')
+    con.execute(
+        """
+        INSERT INTO trades_labeled (
+            vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc,
+            price, size, notional, premium, epsilon_used, side, is_0dte
+        )
+        SELECT
+            'bench-' || i,
+            ['SPY', 'QQQ', 'AAPL'][1 + i % 3],
+            DATE '2026-06-19',
+            500.0,
+            'C',
+            TIMESTAMP '2026-06-18 13:30:00' + to_milliseconds(hash(i) % 23400000),
+            1.0,
+            1,
+            100.0,
+            100.0,
+            0.01,
+            'BUY',
+            FALSE
+        FROM range(?) AS r(i)
+        """,
+        [rows],
+    )
+
+
+def test_recluster_lets_window_queries_prune_row_groups():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    _fill_shuffled(con, 400_000)
+    assert disorder(con, 'trades_labeled') > 0.4
+    before = {result.window_minutes: result for result in pruning_report(con, windows=(15,))}
+    assert before[15].scanned == before[15].total
+
+    con.execute('BEGIN TRANSACTION')
+    rewritten = ReclusterJob(tables=('trades_labeled',)).write_op(con)
+    con.execute('COMMIT')
+    assert rewritten == 400_000
+    assert disorder(con, 'trades_labeled') == 0.0
+
+    after = {result.window_minutes: result for result in pruning_report(con, windows=(15,))}
+    assert after[15].matched == before[15].matched
+    assert after[15].scanned < after[15].total / 2
+
+    # The swapped-in table keeps its primary key and defaults.
+    with pytest.raises(duckdb.ConstraintException):
+        con.execute("INSERT INTO trades_labeled (vendor_trade_id) VALUES ('bench-1')")
+    assert ReclusterJob(tables=('trades_labeled',)).write_op(con) == 0
+    con.close()
+
+
+def test_time_ordered_batches_prune_without_reclustering():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    con.execute('DELETE FROM trades_raw')
+    rng = np.random.default_rng(7)
+    # After the seeded trades: deleted rows still count in their row group's zonemap.
+    start = pd.Timestamp('2030-06-18 13:30:00')
+    for batch in range(40):
+        offsets = rng.permutation(5_000)
+        df = pd.DataFrame(
+            {
+                'vendor_trade_id': [f'{batch}-{offset}' for offset in offsets],
+                'symbol': 'SPY',
+                'trade_ts_utc': start + pd.to_timedelta(batch * 5_000 + offsets, unit='s'),
+                'price': 1.0,
+                'size': 1,
+                'notional': 100.0,
+            }
+        )
+        frames_op({'trades_raw': df})(con)
+
+    con.execute('CHECKPOINT')
+    assert disorder(con, 'trades_raw') < get_settings().recluster_min_disorder
+    (result,) = pruning_report(con, table='trades_raw', windows=(60,))
+    assert result.matched == 3_601
+    assert result.scanned < result.total / 2
+    con.close()
+
+
+def test_recluster_rewrites_only_the_tail_behind_late_rows():
+    con = duckdb.connect(str(get_settings().duckdb_path))
+    con.execute('DELETE FROM trades_raw')
+    start = pd.Timestamp('2030-06-18 13:30:00')
+
+    def batch(name: str, seconds: np.ndarray) -> None:
+        df = pd.DataFrame(
+            {
+                'vendor_trade_id': [f'{name}-{second}' for second in seconds],
+                'symbol': 'SPY',
+                'trade_ts_utc': start + pd.to_timedelta(seconds, unit='s'),
+                'price': 1.0,
+                'size': 1,
+                'notional': 100.0,
+            }
+        )
+        frames_op({'trades_raw': df})(con)
+
+    batch('on-time', np.arange(0, 20_000, 2))
+    batch('late', np.arange(19_001, 20_000, 2))
+    assert late_floor(con, 'trades_raw') == (start + pd.Timedelta(seconds=19_001)).to_pydatetime()
+
+    con.execute('BEGIN TRANSACTION')
+    rewritten = ReclusterJob(min_disorder=0.0, tables=('trades_raw',)).write_op(con)
+    con.execute('COMMIT')
+    assert rewritten == 999
+    assert disorder(con, 'trades_raw') == 0.0
+    assert late_floor(con, 'trades_raw') is None
+    assert con.execute('SELECT COUNT(*) FROM trades_raw').fetchone()[0] == 10_500
+    con.close()
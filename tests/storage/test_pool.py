@@ -0,0 +1,101 @@
+﻿from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.storage.duckdb_client import close_pool, get_pool, query_df
+
+WRITER_PROBE = (
+    'import sys, duckdb; '
+    "duckdb.connect(sys.argv[1]).execute('CREATE TABLE writer_probe AS SELECT 1 AS x')"
+)
+
+
+@pytest.fixture
+def release(monkeypatch):
+    monkeypatch.setenv('OPTION_FLOW_READ_POOL_HOLD_OPEN', 'false')
+    get_settings.cache_clear()
+    close_pool()
+    yield
+    close_pool()
+
+
+def _write_from_other_process() -> subprocess.CompletedProcess[str]:
+    return subprocess.run(
+        [sys.executable, '-c', WRITER_PROBE, str(get_settings().duckdb_path)],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+def test_query_df_reuses_pooled_connection():
+    pool = get_pool()
+    first = query_df('SELECT COUNT(*) AS cnt FROM trades_labeled')
+    second = query_df('SELECT COUNT(*) AS cnt FROM trades_labeled WHERE symbol = ?', ['SPY'])
+    assert int(first.iloc[0]['cnt']) > int(second.iloc[0]['cnt']) > 0
+    assert get_pool() is pool
+    assert pool.reconnects == 0
+    assert pool.healthy()
+
+
+def test_pool_serves_concurrent_readers():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        counts = list(
+            executor.map(
+                lambda _: int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt']),
+                range(32),
+            )
+        )
+    assert len(set(counts)) == 1
+
+
+def test_each_thread_reuses_its_cursor():
+    pool = get_pool()
+    with pool.cursor() as first:
+        with pool.cursor() as nested:
+            assert nested is not first
+    with pool.cursor() as again:
+        assert again is first
+    def checkout():
+        with pool.cursor() as cur:
+            return cur
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(checkout).result() is not first
+
+
+def test_released_pool_lets_another_process_write(release):
+    assert int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt']) > 0
+    probe = _write_from_other_process()
+    assert probe.returncode == 0, probe.stderr
+    assert int(query_df('SELECT x FROM writer_probe').iloc[0]['x']) == 1
+
+
+def test_held_pool_keeps_the_file_lock():
+    assert int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt']) > 0
+    probe = _write_from_other_process()
+    assert probe.returncode != 0
+    assert 'lock' in probe.stderr
+
+
+def test_pool_reconnects_when_file_is_swapped(tmp_path):
+    path = get_settings().duckdb_path
+    pool = get_pool()
+    assert int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt']) > 0
+
+    replacement = tmp_path / 'replacement.duckdb'
+    shutil.copy(path, replacement)
+    con = duckdb.connect(str(replacement))
+    con.execute('DELETE FROM trades_raw')
+    con.close()
+    replacement.replace(path)
+
+    assert int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt']) == 0
+    assert pool.reconnects == 1
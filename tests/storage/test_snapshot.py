@@ -0,0 +1,44 @@
+﻿from __future__ import annotations
+
+import pytest
+
+from option_flow.config.settings import get_settings
+from option_flow.storage.duckdb_client import close_pool, get_pool, query_df
+from option_flow.storage.snapshot import SnapshotJob
+from option_flow.storage.writer import DuckDBWriter, sql_op
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    path = tmp_path / 'snapshot' / 'read.duckdb'
+    monkeypatch.setenv('OPTION_FLOW_READ_SNAPSHOT_PATH', str(path))
+    get_settings.cache_clear()
+    close_pool()
+    yield path
+    close_pool()
+
+
+def _count() -> int:
+    return int(query_df('SELECT COUNT(*) AS cnt FROM trades_raw').iloc[0]['cnt'])
+
+
+def test_snapshot_serves_reads_while_the_writer_holds_the_database(snapshot_path):
+    job = SnapshotJob()
+    with DuckDBWriter(flush_interval_ms=200) as writer:
+        assert writer.write(job.write_op, label='snapshot', transaction=False) == 1
+        assert get_pool().database == snapshot_path
+        before = _count()
+        assert before > 0
+
+        grouped = writer.submit(sql_op("DELETE FROM trades_raw WHERE symbol = 'SPY'"))
+        published = writer.submit(job.write_op, label='snapshot', transaction=False)
+        assert published.result(timeout=30) == 1
+        grouped.result(timeout=30)
+        assert _count() < before
+    assert get_pool().reconnects == 1
+    assert not list(snapshot_path.parent.glob('.*'))
+
+
+def test_snapshot_requires_a_path():
+    with pytest.raises(ValueError):
+        SnapshotJob()
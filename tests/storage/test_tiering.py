@@ -0,0 +1,202 @@
+﻿from __future__ import annotations
+
+from datetime import UTC, date, datetime, timedelta
+
+import duckdb
+
+from option_flow.config.settings import get_settings
+from option_flow.storage.duckdb_client import query_df
+from option_flow.storage.tiering import (
+    TIERED_TABLES,
+    TieringJob,
+    TieringReport,
+    has_cold_data,
+    tiered_relation,
+)
+
+
+def _age_trades(con: duckdb.DuckDBPyConnection, days: int, count: int) -> list[str]:
+    ids = [
+        row[0]
+        for row in con.execute(
+            "SELECT vendor_trade_id FROM trades_labeled ORDER BY vendor_trade_id LIMIT ?", [count]
+        ).fetchall()
+    ]
+    for table in ('trades_raw', 'trades_labeled'):
+        con.execute(
+            f"UPDATE {table} SET trade_ts_utc = trade_ts_utc - INTERVAL {days} DAY "
+            "WHERE vendor_trade_id IN (SELECT unnest(?))",
+            [ids],
+        )
+    return ids
+
+
+def _today() -> date:
+    return datetime.now(UTC).date()
+
+
+def _tier(con: duckdb.DuckDBPyConnection, job: TieringJob | None = None) -> TieringReport:
+    job = job or TieringJob()
+    con.execute('BEGIN TRANSACTION')
+    report = job.run(con)
+    con.execute('COMMIT')
+    job.publish(con)
+    return report
+
+
+def test_tiering_moves_closed_days_to_partitioned_parquet():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    total = con.execute('SELECT COUNT(*) FROM trades_labeled').fetchone()[0]
+    ids = _age_trades(con, 3, 20)
+    report = _tier(con)
+    assert report.moved_rows == 40
+    assert report.moved_days
+    remaining = con.execute('SELECT COUNT(*) FROM trades_labeled').fetchone()[0]
+    assert remaining == total - 20
+    assert not con.execute(
+        "SELECT COUNT(*) FROM trades_raw WHERE vendor_trade_id IN (SELECT unnest(?))", [ids]
+    ).fetchone()[0]
+    con.close()
+
+    day = report.moved_days[0].isoformat()
+    root = settings.cold_storage_path / 'trades_labeled'
+    assert list(root.glob(f'trade_date={day}/symbol=*'))
+    assert has_cold_data('trades_labeled')
+
+    since = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=7)
+    df = query_df(f"SELECT * FROM {tiered_relation('trades_labeled', since=since)}")
+    assert len(df) == total
+    assert set(ids) <= set(df['vendor_trade_id'])
+    assert 'trade_date' not in df.columns
+    assert tiered_relation('trades_labeled', since=datetime.now(UTC)) == 'trades_labeled'
+
+
+def test_tiering_merges_late_rows_and_is_idempotent():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    first = _age_trades(con, 2, 10)
+    job = TieringJob()
+    _tier(con, job)
+    assert _tier(con, job).moved_rows == 0
+
+    rows = con.execute(
+        "SELECT vendor_trade_id FROM trades_labeled "
+        "WHERE vendor_trade_id NOT IN (SELECT unnest(?)) ORDER BY vendor_trade_id LIMIT 5",
+        [first],
+    ).fetchall()
+    late = [row[0] for row in rows]
+    for table in ('trades_raw', 'trades_labeled'):
+        con.execute(
+            f"UPDATE {table} SET trade_ts_utc = trade_ts_utc - INTERVAL 2 DAY "
+            "WHERE vendor_trade_id IN (SELECT unnest(?))",
+            [late],
+        )
+    assert _tier(con, job).moved_rows == 10
+    con.close()
+
+    cold = query_df(
+        f"SELECT vendor_trade_id FROM {tiered_relation('trades_labeled')} "
+        "WHERE vendor_trade_id IN (SELECT unnest(?))",
+        [first + late],
+    )
+    assert sorted(cold['vendor_trade_id']) == sorted(first + late)
+    root = settings.cold_storage_path / 'trades_labeled'
+    for partition in root.glob('trade_date=*/symbol=*'):
+        assert len(list(partition.glob('*.parquet'))) == 1
+
+
+def test_retention_drops_expired_partitions():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    _age_trades(con, 40, 5)
+    report = _tier(con, TieringJob(retention_days=30))
+    con.close()
+    assert report.moved_rows == 10
+    assert report.dropped_partitions == 2 * len(report.moved_days)
+    assert not list(settings.cold_storage_path.glob('trades_*/trade_date=*'))
+
+
+def test_rolled_back_run_leaves_the_day_hot_only():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    total = con.execute('SELECT COUNT(*) FROM trades_labeled').fetchone()[0]
+    _age_trades(con, 3, 20)
+    job = TieringJob()
+    con.execute('BEGIN TRANSACTION')
+    assert job.run(con).moved_rows == 40
+    con.execute('ROLLBACK')
+    job.publish(con)
+
+    assert con.execute('SELECT COUNT(*) FROM trades_labeled').fetchone()[0] == total
+    assert not list(settings.cold_storage_path.glob('trades_*/trade_date=*'))
+    since = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=7)
+    relation = tiered_relation('trades_labeled', since=since, cold_path=settings.cold_storage_path)
+    assert con.execute(f'SELECT COUNT(*) FROM {relation}').fetchone()[0] == total
+
+    assert _tier(con, job).moved_rows == 40
+    assert not list((settings.cold_storage_path / '.staging').iterdir())
+    relation = tiered_relation('trades_labeled', since=since, cold_path=settings.cold_storage_path)
+    assert con.execute(f'SELECT COUNT(*) FROM {relation}').fetchone()[0] == total
+    con.close()
+
+
+def test_next_run_publishes_a_committed_unpublished_day():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    total = con.execute('SELECT COUNT(*) FROM trades_labeled').fetchone()[0]
+    _age_trades(con, 3, 20)
+    job = TieringJob()
+    con.execute('BEGIN TRANSACTION')
+    job.run(con)
+    con.execute('COMMIT')
+    assert not list(settings.cold_storage_path.glob('trades_labeled/trade_date=*'))
+
+    assert _tier(con, job).moved_rows == 0
+    assert not con.execute('SELECT COUNT(*) FROM tiering_pending').fetchone()[0]
+    since = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=7)
+    relation = tiered_relation('trades_labeled', since=since)
+    assert con.execute(f'SELECT COUNT(*) FROM {relation}').fetchone()[0] == total
+    con.close()
+
+
+def test_quotes_payloads_and_sweeps_are_tiered_and_expire():
+    settings = get_settings()
+    con = duckdb.connect(str(settings.duckdb_path))
+    quotes = con.execute('SELECT COUNT(*) FROM nbbo_at_trade').fetchone()[0]
+    ids = _age_trades(con, 3, 20)
+    con.execute(
+        "UPDATE nbbo_at_trade SET nbbo_ts = nbbo_ts - INTERVAL 3 DAY "
+        "WHERE vendor_trade_id IN (SELECT unnest(?))",
+        [ids],
+    )
+    con.execute(
+        "UPDATE raw_payloads SET first_ts_utc = first_ts_utc - INTERVAL 3 DAY, "
+        "last_ts_utc = last_ts_utc - INTERVAL 3 DAY"
+    )
+    payloads = con.execute('SELECT COUNT(*) FROM raw_payloads').fetchone()[0]
+    opened = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=3)
+    con.execute(
+        """
+        INSERT INTO sweeps (sweep_id, contract_id, symbol, side, first_ts_utc, last_ts_utc, legs)
+        VALUES ('old-sweep', 1, 'SPY', 'BUY', ?, ?, 3)
+        """,
+        [opened, opened],
+    )
+
+    report = _tier(con)
+    assert report.moved_rows == 40 + 20 + payloads + 1
+    assert con.execute('SELECT COUNT(*) FROM nbbo_at_trade').fetchone()[0] == quotes - 20
+    assert not con.execute('SELECT COUNT(*) FROM raw_payloads').fetchone()[0]
+    assert not con.execute('SELECT COUNT(*) FROM sweeps').fetchone()[0]
+    root = settings.cold_storage_path
+    assert list(root.glob('nbbo_at_trade/trade_date=*/*.parquet'))
+    assert list(root.glob('raw_payloads/trade_date=*/*.parquet'))
+    assert list(root.glob('sweeps/trade_date=*/symbol=SPY/*.parquet'))
+    relation = tiered_relation('sweeps', since=opened - timedelta(days=1))
+    assert con.execute(f'SELECT sweep_id, legs FROM {relation}').fetchall() == [('old-sweep', 3)]
+
+    report = _tier(con, TieringJob(retention_days=1))
+    con.close()
+    assert report.dropped_partitions == len(TIERED_TABLES)
+    assert not list(root.glob('*/trade_date=*'))
@@ -0,0 +1,54 @@
+﻿from __future__ import annotations
+
+import duckdb
+import pandas as pd
+import pytest
+
+from option_flow.services.rollups import RollupService
+from option_flow.storage.duckdb_client import query_df
+from option_flow.storage.writer import DuckDBWriter, append_op, sql_op
+
+
+def _trades(*ids):
+    return pd.DataFrame(
+        {
+            'vendor_trade_id': list(ids),
+            'symbol': 'SPY',
+            'trade_ts_utc': pd.Timestamp.now('UTC').tz_localize(None),
+            'premium': 1_000.0,
+        }
+    )
+
+
+def test_writer_group_commits_queued_requests():
+    with DuckDBWriter(flush_interval_ms=200) as writer:
+        futures = [
+            writer.submit(append_op('trades_labeled', _trades(f'w-{i}')), label='trades')
+            for i in range(5)
+        ]
+        assert [future.result(timeout=10) for future in futures] == [1] * 5
+        stats = writer.stats
+    assert stats.commits == 1
+    assert stats.last_batch_requests == 5
+    assert stats.rows == 5
+    df = query_df("SELECT COUNT(*) AS cnt FROM trades_labeled WHERE vendor_trade_id LIKE 'w-%'")
+    assert int(df.iloc[0]['cnt']) == 5
+
+
+def test_failed_request_does_not_fail_the_group():
+    with DuckDBWriter(flush_interval_ms=200) as writer:
+        good = writer.submit(append_op('trades_labeled', _trades('w-good')))
+        bad = writer.submit(sql_op('INSERT INTO missing_table VALUES (1)'))
+        assert good.result(timeout=10) == 1
+        with pytest.raises(duckdb.CatalogException):
+            bad.result(timeout=10)
+        assert writer.stats.errors == 1
+    df = query_df("SELECT COUNT(*) AS cnt FROM trades_labeled WHERE vendor_trade_id = 'w-good'")
+    assert int(df.iloc[0]['cnt']) == 1
+
+
+def test_rollups_refresh_through_writer():
+    with DuckDBWriter(flush_interval_ms=0) as writer:
+        RollupService(writer).refresh_recent_minutes(60)
+    df = query_df('SELECT COUNT(*) AS cnt FROM rollups_min')
+    assert int(df.iloc[0]['cnt']) > 0
@@ -1,9 +1,14 @@
 ﻿from __future__ import annotations
 
+import json
 from pathlib import Path
 
 import duckdb
 
+import scripts.init_db as init_db
+from option_flow.storage.payloads import decompress_payloads
+from option_flow.vendors.polygon import contract_key
+
 SCHEMA_SQL = Path('storage/schema.sql').read_text(encoding='utf-8')
 
 
@@ -11,5 +16,74 @@ def test_schema_creates_tables():
     con = duckdb.connect(database=':memory:')
     con.execute(SCHEMA_SQL)
     tables = {row[0] for row in con.execute('SHOW TABLES').fetchall()}
-    expected = {'trades_raw', 'nbbo_at_trade', 'trades_labeled', 'rollups_min', 'open_interest_eod'}
-    assert expected.issubset(tables)
+    expected = {
+        'trades_raw',
+        'nbbo_at_trade',
+        'trades_labeled',
+        'rollups_min',
+        'open_interest_eod',
+        'sweeps',
+    }
+    assert expected.issubset(tables)
+
+
+LEGACY_SQL = """
+CREATE TABLE trades_raw (
+    vendor_trade_id VARCHAR PRIMARY KEY, symbol VARCHAR, expiry DATE, strike DOUBLE,
+    call_put VARCHAR, trade_ts_utc TIMESTAMP, price DOUBLE, size BIGINT, notional DOUBLE,
+    raw_payload JSON, ingest_ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE trades_labeled (
+    vendor_trade_id VARCHAR PRIMARY KEY, symbol VARCHAR, expiry DATE, strike DOUBLE,
+    call_put VARCHAR, trade_ts_utc TIMESTAMP, price DOUBLE, size BIGINT, notional DOUBLE,
+    premium DOUBLE, epsilon_used DOUBLE, side VARCHAR, is_0dte BOOLEAN, sweep_id VARCHAR,
+    nbbo_bid DOUBLE, nbbo_ask DOUBLE, ingest_ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO trades_raw VALUES
+    ('t1', 'SPY', DATE '2026-06-19', 450.0, 'C', TIMESTAMP '2026-06-18 14:00:00',
+     1.2, 5, 600.0, '{"sym": "O:SPY260619C00450000", "p": 1.2}', now()),
+    ('t2', 'QQQ', DATE '2026-06-19', 400.5, 'P', TIMESTAMP '2026-06-18 14:01:00',
+     2.0, 1, 200.0, '{"sym": "O:QQQ260619P00400500", "p": 2.0}', now());
+INSERT INTO trades_labeled
+SELECT vendor_trade_id, symbol, expiry, strike, call_put, trade_ts_utc, price, size, notional,
+       notional, 0.01, 'BUY', false, NULL, price - 0.05, price + 0.05, ingest_ts
+FROM trades_raw;
+"""
+
+
+def test_migrate_legacy_database():
+    con = duckdb.connect(database=':memory:')
+    con.execute(LEGACY_SQL)
+    assert init_db.migrate_legacy(con)
+    assert not init_db.migrate_legacy(con)
+
+    raw_columns = init_db.table_columns(con, 'trades_raw')
+    assert 'raw_payload' not in raw_columns and 'contract_id' in raw_columns
+    types = dict(
+        con.execute(
+            "SELECT column_name, data_type FROM duckdb_columns() "
+            "WHERE table_name = 'trades_labeled'"
+        ).fetchall()
+    )
+    assert types['side'].startswith('ENUM') and types['call_put'].startswith('ENUM')
+    assert 'nbbo_bid' not in types
+
+    rows = con.execute(
+        """
+        SELECT l.vendor_trade_id, c.occ_symbol, n.bid
+        FROM trades_labeled AS l
+        JOIN contracts AS c USING (contract_id)
+        JOIN nbbo_at_trade AS n USING (vendor_trade_id)
+        ORDER BY 1
+        """
+    ).fetchall()
+    assert rows == [('t1', 'O:SPY260619C00450000', 1.15), ('t2', 'O:QQQ260619P00400500', 1.95)]
+    (blob,) = con.execute('SELECT payload FROM raw_payloads').fetchone()
+    assert [json.loads(line)['sym'] for line in decompress_payloads(blob)] == [
+        'O:SPY260619C00450000',
+        'O:QQQ260619P00400500',
+    ]
+    (key,) = con.execute(
+        "SELECT contract_id FROM trades_raw WHERE vendor_trade_id = 't1'"
+    ).fetchone()
+    assert key == contract_key('O:SPY260619C00450000')
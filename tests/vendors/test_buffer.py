@@ -0,0 +1,80 @@
+﻿from __future__ import annotations
+
+import asyncio
+
+from option_flow.vendors.polygon import FrameBuffer, OverflowPolicy
+
+QUOTE = '[{"ev":"Q","sym":"O:SPY240920C00460000","bp":1.0,"ap":1.1,"t":1}]'
+TRADE = '[{"ev":"T","sym":"O:SPY240920C00460000","p":1.1,"s":1,"t":2}]'
+
+
+async def _drain(buffer: FrameBuffer) -> list:
+    buffer.close()
+    return [frame async for frame in buffer]
+
+
+def test_drop_oldest_quotes_keeps_trades():
+    async def scenario():
+        buffer = FrameBuffer(2, policy=OverflowPolicy.DROP_OLDEST_QUOTES)
+        await buffer.put(QUOTE)
+        await buffer.put(TRADE)
+        await buffer.put(TRADE)
+        return buffer, await _drain(buffer)
+
+    buffer, frames = asyncio.run(scenario())
+    assert frames == [TRADE, TRADE]
+    assert buffer.stats.dropped == 1
+    assert buffer.stats.max_depth == 2
+
+
+def test_drop_oldest_quotes_keeps_arrival_order():
+    quotes = [QUOTE.replace('"t":1', f'"t":{idx}') for idx in range(4)]
+    trades = [TRADE.replace('"t":2', f'"t":{idx}') for idx in range(3)]
+
+    async def scenario():
+        buffer = FrameBuffer(4, policy=OverflowPolicy.DROP_OLDEST_QUOTES)
+        for frame in (quotes[0], trades[0], quotes[1], trades[1], quotes[2]):
+            await buffer.put(frame)
+        first = await buffer.get()
+        for frame in (trades[2], quotes[3]):
+            await buffer.put(frame)
+        return buffer, [first, *await _drain(buffer)]
+
+    buffer, frames = asyncio.run(scenario())
+    assert frames == [trades[0], trades[1], quotes[2], trades[2], quotes[3]]
+    assert buffer.stats.dropped == 2
+
+
+def test_spill_preserves_order(tmp_path):
+    async def scenario():
+        buffer = FrameBuffer(1, policy='spill', spill_path=tmp_path / 'spill.bin')
+        for idx in range(4):
+            await buffer.put(f'frame-{idx}')
+        return buffer, await _drain(buffer)
+
+    buffer, frames = asyncio.run(scenario())
+    assert [f if isinstance(f, str) else f.decode() for f in frames] == [
+        'frame-0',
+        'frame-1',
+        'frame-2',
+        'frame-3',
+    ]
+    assert buffer.stats.spilled == 3
+
+
+def test_block_policy_records_stall_time():
+    async def scenario():
+        buffer = FrameBuffer(1)
+        await buffer.put(QUOTE)
+
+        async def consume():
+            await asyncio.sleep(0.05)
+            return await buffer.get()
+
+        consumer = asyncio.create_task(consume())
+        await buffer.put(TRADE)
+        await consumer
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert buffer.stats.stall_seconds > 0
@@ -0,0 +1,59 @@
+﻿from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+
+from option_flow.vendors.polygon import (
+    ContractRegistry,
+    contract_key,
+    occ_symbol,
+    parse_option_symbol,
+    parse_option_symbols,
+)
+
+
+def test_registry_interns_each_symbol_once() -> None:
+    registry = ContractRegistry(capacity=1)
+    first = registry.intern('O:SPY240920C00460000')
+    second = registry.intern('O:QQQ250117P00295000')
+    assert registry.intern('O:SPY240920C00460000') == first
+    assert (first, second) == (0, 1)
+    assert registry.contract(second) == parse_option_symbol('O:QQQ250117P00295000')
+    ids = np.array([second, first])
+    assert list(registry.underlying(ids)) == ['QQQ', 'SPY']
+    assert list(registry.call_put(ids)) == ['P', 'C']
+    assert registry.expiry(ids)[1] == np.datetime64(date(2024, 9, 20))
+
+
+def test_intern_many_matches_scalar_parser() -> None:
+    registry = ContractRegistry()
+    symbols = [
+        'O:SPY240920C00460000',
+        'O:SPY240920C00460000',
+        'O:SPY240920X00460000',
+        'O:AAPL241018P00227500',
+    ]
+    ids = registry.intern_many(symbols)
+    assert ids[0] == ids[1]
+    assert ids[2] == -1
+    assert registry.contract(int(ids[3])) == parse_option_symbol(symbols[3])
+
+
+def test_bulk_parser_flags_invalid_rows() -> None:
+    parsed = parse_option_symbols(['O:SPY240920C00460000', 'SPY', 'O:SPY241350C00460000'])
+    assert list(parsed['valid']) == [True, False, False]
+    assert parsed['strike'].iloc[0] == 460.0
+
+
+def test_contract_keys_are_stable_across_registries() -> None:
+    first = ContractRegistry()
+    second = ContractRegistry()
+    second.intern('O:QQQ240920P00400000')
+    ids = first.intern_many(['O:SPY240920C00460500', 'O:spy240920c00460500'])
+    other = second.intern('O:SPY240920C00460500')
+    expected = contract_key('O:SPY240920C00460500')
+    assert occ_symbol('spy', date(2024, 9, 20), 'c', 460.5) == 'O:SPY240920C00460500'
+    assert first.key(np.array([ids[0]]))[0] == expected
+    assert second.key(np.array([other]))[0] == expected
+    assert first.key(np.array([ids[1]]))[0] == expected
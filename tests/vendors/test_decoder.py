@@ -0,0 +1,29 @@
+﻿from __future__ import annotations
+
+import pytest
+
+from option_flow.vendors.polygon import available_decoders, get_decoder
+
+FRAME = (
+    b'[{"ev":"status","status":"connected","message":"Connected Successfully"},'
+    b'{"ev":"Q","sym":"O:SPY240920C00460000","bp":1.0,"ap":1.1,"bs":3,"as":4,"t":5,"q":1},'
+    b'{"ev":"T","sym":"O:SPY240920C00460000","x":65,"p":1.1,"s":2,"c":[209],"t":6,"q":2}]'
+)
+
+
+@pytest.mark.parametrize('name', available_decoders())
+def test_decoders_split_trades_and_quotes_in_order(name: str) -> None:
+    quote, trade = get_decoder(name).decode(FRAME)
+    assert (quote.kind, quote.bid, quote.ask, quote.bid_size) == ('Q', 1.0, 1.1, 3)
+    assert (trade.kind, trade.price, trade.size, trade.sequence) == ('T', 1.1, 2, 2)
+    assert trade.conditions == [209]
+
+
+@pytest.mark.parametrize('name', available_decoders())
+def test_decoders_ignore_unknown_events(name: str) -> None:
+    assert get_decoder(name).decode(b'[{"ev":"XQ","sym":"X:BTCUSD"}]') == []
+
+
+def test_unknown_decoder_rejected() -> None:
+    with pytest.raises(ValueError):
+        get_decoder('yaml')
@@ -0,0 +1,52 @@
+﻿from __future__ import annotations
+
+import json
+
+import numpy as np
+
+from option_flow.ingest.pipeline import IngestPipeline
+from option_flow.vendors.polygon import ContractFilter, FrameFilter
+
+
+def _frame(*symbols):
+    events = [
+        {'ev': 'T', 'sym': symbol, 'p': 1.0, 's': 1, 't': 1, 'c': [209, 219]} for symbol in symbols
+    ]
+    return json.dumps(events, separators=(',', ':')).encode()
+
+
+def test_frame_filter_keeps_only_wanted_underlyings():
+    frame_filter = FrameFilter(['SPY', 'qqq'])
+    wanted = _frame('O:SPY991231C00450000', 'O:QQQ991231P00400000')
+    assert frame_filter.filter(wanted) is wanted
+    assert frame_filter.filter(_frame('O:SPYG991231C00050000', 'O:AAPL991231C00150000')) is None
+
+    mixed = frame_filter.filter(_frame('O:AAPL991231C00150000', 'O:SPY991231C00450000'))
+    assert [event['sym'] for event in json.loads(mixed)] == ['O:SPY991231C00450000']
+    assert frame_filter.dropped == 3
+
+
+def test_frame_filter_keeps_status_messages():
+    frame = b'[{"ev":"status","status":"connected"},{"ev":"T","sym":"O:AAPL991231C00150000"}]'
+    kept = FrameFilter(['SPY']).filter(frame)
+    assert json.loads(kept) == [{'ev': 'status', 'status': 'connected'}]
+
+
+def test_contract_filter_bounds_expiry_and_strike():
+    contract_filter = ContractFilter(max_dte=7, min_strike=100.0)
+    expiries = np.array(['2024-01-02', '2024-01-20', '2024-01-05'], dtype='datetime64[D]')
+    strikes = np.array([150.0, 150.0, 50.0])
+    keep = contract_filter.accepts(expiries, strikes, np.datetime64('2024-01-02'))
+    assert keep.tolist() == [True, False, False]
+    assert not ContractFilter()
+
+
+def test_pipeline_drops_filtered_events_before_enrichment():
+    pipeline = IngestPipeline(
+        frame_filter=FrameFilter(['SPY']), contract_filter=ContractFilter(min_strike=440.0)
+    )
+    frame = _frame('O:SPY991231C00450000', 'O:SPY991231C00400000', 'O:QQQ991231C00400000')
+    for event in pipeline.decode(frame):
+        pipeline.enrich(event)
+    assert pipeline.stats.trades == 1
+    assert pipeline.stats.filtered == 2
@@ -0,0 +1,212 @@
+﻿from __future__ import annotations
+
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+
+from option_flow.vendors.polygon import AuthenticationError, Backoff, PolygonClient, StreamGap
+from option_flow.vendors.polygon import client as client_module
+from option_flow.vendors.polygon.reconnect import first_event_ms, last_event_ms, within_session
+
+# 2024-09-20 10:00 New York, inside the regular session.
+SESSION_MS = int(datetime(2024, 9, 20, 14, 0, tzinfo=UTC).timestamp() * 1000)
+
+
+class FakeSocket:
+    def __init__(self, frames: list[str], error: Exception | None) -> None:
+        self.frames = frames
+        self.error = error
+        self.sent: list[str] = []
+
+    async def __aenter__(self) -> FakeSocket:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def send(self, message: str) -> None:
+        self.sent.append(message)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for frame in self.frames:
+            yield frame
+        if self.error:
+            raise self.error
+        await asyncio.Event().wait()
+
+
+def test_last_event_ms_reads_final_timestamp():
+    frame = '[{"ev":"Q","t":100},{"ev":"T","t": 250}]'
+    assert last_event_ms(frame) == 250
+    assert first_event_ms(frame) == 100
+    assert last_event_ms('[{"ev":"status"}]') is None
+
+
+def test_stream_reconnects_and_reports_gap(monkeypatch):
+    sockets = [
+        FakeSocket(['[{"ev":"T","sym":"O:SPY240920C00460000","t":1000}]'], OSError('reset')),
+        FakeSocket(['[{"ev":"T","sym":"O:SPY240920C00460000","t":5000}]'], None),
+    ]
+    opened: list[FakeSocket] = []
+
+    def fake_connect(*args, **kwargs):
+        sock = sockets[len(opened)]
+        opened.append(sock)
+        return sock
+
+    monkeypatch.setattr(client_module.websockets, 'connect', fake_connect)
+    gaps: list[StreamGap] = []
+
+    async def record_gap(gap: StreamGap) -> None:
+        gaps.append(gap)
+
+    client = PolygonClient(api_key='key', backoff=Backoff(initial=0.0), backfill=record_gap)
+
+    async def consume() -> list:
+        frames = []
+        async for frame in client.stream_frames(['SPY']):
+            frames.append(frame)
+            if len(frames) == 2:
+                break
+        await asyncio.sleep(0)
+        return frames
+
+    frames = asyncio.run(consume())
+    assert len(frames) == 2
+    assert all(sock.sent[0].startswith('{"action": "auth"') for sock in opened)
+    assert len(opened[1].sent) == 2
+    assert gaps == [StreamGap(1000, 5000, 'T.O.SPY,Q.O.SPY')]
+    assert client.stream_stats.reconnects == 1
+    assert client.stream_stats.last_reconnect_to_first_trade_s is not None
+
+
+def _serve(monkeypatch, sockets: list[FakeSocket]) -> list[FakeSocket]:
+    opened: list[FakeSocket] = []
+
+    def fake_connect(*args, **kwargs):
+        sock = sockets[len(opened)]
+        opened.append(sock)
+        return sock
+
+    monkeypatch.setattr(client_module.websockets, 'connect', fake_connect)
+    return opened
+
+
+def _events(*offsets_ms: int) -> str:
+    return "[" + ",".join(f'{{"ev":"T","t":{SESSION_MS + ms}}}' for ms in offsets_ms) + "]"
+
+
+def test_gap_within_connection_spans_to_first_event(monkeypatch):
+    _serve(
+        monkeypatch,
+        [
+            FakeSocket(
+                [_events(1000, 2000), _events(4000), _events(30000, 30500), _events(31000)],
+                None,
+            )
+        ],
+    )
+    gaps: list[StreamGap] = []
+
+    async def record_gap(gap: StreamGap) -> None:
+        gaps.append(gap)
+
+    client = PolygonClient(api_key='key', backfill=record_gap)
+
+    async def consume() -> None:
+        count = 0
+        async for _ in client.stream_frames(['SPY']):
+            count += 1
+            if count == 4:
+                break
+        await asyncio.sleep(0)
+
+    asyncio.run(consume())
+    assert gaps == [StreamGap(SESSION_MS + 4000, SESSION_MS + 30000, 'T.O.SPY,Q.O.SPY')]
+    assert client.stream_stats.reconnects == 0
+
+
+def test_silence_outside_the_session_is_not_a_gap(monkeypatch):
+    close = SESSION_MS + 6 * 3_600_000 - 1000  # 15:59:59 New York
+    next_open = SESSION_MS + 3 * 86_400_000 - 1_800_000  # Monday 09:30
+    frames = [f'[{{"ev":"T","t":{ts}}}]' for ts in (close, next_open)]
+    _serve(monkeypatch, [FakeSocket(frames, None)])
+    gaps: list[StreamGap] = []
+
+    async def record_gap(gap: StreamGap) -> None:
+        gaps.append(gap)
+
+    client = PolygonClient(api_key='key', backfill=record_gap)
+
+    async def consume() -> None:
+        count = 0
+        async for _ in client.stream_frames(['SPY']):
+            count += 1
+            if count == 2:
+                break
+
+    asyncio.run(consume())
+    assert gaps == []
+    assert within_session(SESSION_MS, SESSION_MS + 60_000)
+    assert not within_session(close, next_open)
+    assert not within_session(SESSION_MS - 3_600_000, SESSION_MS)
+
+
+def test_backoff_resets_only_after_events(monkeypatch):
+    status = '[{"ev":"status","status":"auth_success","message":"authenticated"}]'
+    _serve(
+        monkeypatch,
+        [
+            FakeSocket([], OSError('refused')),
+            FakeSocket([status], OSError('dropped')),
+            FakeSocket([_events(0)], OSError('reset')),
+            FakeSocket([_events(1000)], None),
+        ],
+    )
+    attempts: list[int] = []
+
+    class RecordingBackoff(Backoff):
+        def delay(self, attempt: int) -> float:
+            attempts.append(attempt)
+            return 0.0
+
+    client = PolygonClient(api_key='key', backoff=RecordingBackoff())
+
+    async def consume() -> None:
+        count = 0
+        async for _ in client.stream_frames(['SPY']):
+            count += 1
+            if count == 3:
+                break
+
+    asyncio.run(consume())
+    assert attempts == [0, 1, 0]
+
+
+def test_rejected_api_key_is_fatal(monkeypatch):
+    rejected = '[{"ev":"status","status":"auth_failed","message":"authentication failed"}]'
+    opened = _serve(
+        monkeypatch,
+        [FakeSocket([rejected], OSError('closed')), FakeSocket([], None)],
+    )
+    client = PolygonClient(api_key='bad', backoff=Backoff(initial=0.0))
+
+    async def consume() -> None:
+        async for _ in client.stream_frames(['SPY']):
+            pass
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(consume())
+    assert len(opened) == 1
+    assert client.stream_stats.reconnects == 0
+
+
+def test_handshake_batches_subscriptions():
+    client = PolygonClient(api_key='key')
+    channels = client._build_channel_params([f'S{i}' for i in range(300)])
+    messages = client._handshake_messages(channels)
+    assert len(messages) == 1 + 2